@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'postify.settings')
+# Settings turn off per-thread persistent DB connections under ASGI.
+os.environ.setdefault('SERVER_INTERFACE', 'asgi')
 
 application = get_asgi_application()
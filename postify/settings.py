@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 import os
 from datetime import timedelta
 
@@ -47,6 +47,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'posts.middleware.RequestMetricsMiddleware',
+    'posts.middleware.RequestRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,6 +80,22 @@ WSGI_APPLICATION = 'postify.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+#
+# DB_POOL=True checks connections out of a psycopg 3 pool (psycopg[pool])
+# for each request. Otherwise each worker thread keeps its connection for
+# DB_CONN_MAX_AGE seconds ('None' for no limit, 0 to close it after every
+# request). Health checks replace a dropped connection on reuse instead of
+# failing the request. Under ASGI (postify/asgi.py) requests don't stick to
+# one thread, so persistent connections would pile up: there connections are
+# closed after each request unless they come from the pool.
+
+SERVER_INTERFACE = config('SERVER_INTERFACE', default='wsgi')
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+if DB_POOL or SERVER_INTERFACE == 'asgi':
+    # Django refuses CONN_MAX_AGE with a pool; the pool keeps connections open.
+    DB_CONN_MAX_AGE = 0
+else:
+    DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=60, cast=lambda value: None if value == 'None' else int(value))
 
 DATABASES = {
     'default': {
@@ -87,18 +105,81 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT'),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        'OPTIONS': {
+            'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+        },
     }
 }
+if DB_POOL:
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        # Seconds a request waits for a free connection before failing
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600, cast=float),
+    }
+
+# Read replicas (posts/routers.py): safe-method requests to the posts views
+# read from one of DB_REPLICA_HOSTS ('host' or 'host:port', same credentials
+# as the primary), except for POSTS_REPLICA_STICKY_SECONDS after the user's
+# last write, which should exceed the replication lag. DB_REPLICA_NAME lets a
+# second database on the same server stand in for a replica locally.
+DB_REPLICA_HOSTS = config('DB_REPLICA_HOSTS', default='', cast=Csv())
+for index, address in enumerate(DB_REPLICA_HOSTS, 1):
+    host, _, port = address.partition(':')
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'NAME': config('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['posts.routers.ReplicaRouter']
+POSTS_REPLICA_STICKY_SECONDS = config('POSTS_REPLICA_STICKY_SECONDS', default=5, cast=int)
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# locmem by default; point CACHE_BACKEND/CACHE_LOCATION at Redis, memcached
+# or a FileBasedCache directory in production.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='postify'),
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+    }
+}
+
+# Response cache for anonymous post detail and feed reads (posts/cache.py)
+POSTS_CACHE_ALIAS = config('POSTS_CACHE_ALIAS', default='default')
+POSTS_CACHE_TIMEOUT = config('POSTS_CACHE_TIMEOUT', default=60, cast=int)
 
 GEMINI_API_KEY = config("GEMINI_API_KEY", default=None)
+GEMINI_API_BASE = config("GEMINI_API_BASE", default="https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = config("GEMINI_MODEL", default="models/gemini-2.5-flash-preview-05-20")
+GEMINI_CONNECT_TIMEOUT = config("GEMINI_CONNECT_TIMEOUT", default=3.05, cast=float)
+GEMINI_READ_TIMEOUT = config("GEMINI_READ_TIMEOUT", default=20, cast=float)
+GEMINI_MAX_CONCURRENCY = config("GEMINI_MAX_CONCURRENCY", default=8, cast=int)
+GEMINI_CACHE_TIMEOUT = config("GEMINI_CACHE_TIMEOUT", default=60 * 60 * 24, cast=int)
+# Hosts that queued title jobs may deliver results to; webhooks are off when empty.
+TITLE_JOB_WEBHOOK_HOSTS = config("TITLE_JOB_WEBHOOK_HOSTS", default="", cast=Csv())
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'posts.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'posts.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 
@@ -106,8 +187,17 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    # Adds the username/is_active claims StatelessJWTAuthentication trusts
+    'TOKEN_OBTAIN_SERIALIZER': 'posts.serializers.ClaimsTokenObtainPairSerializer',
 }
 
+# Full users loaded for requests that need more than the token's claims
+# (e.g. is_staff) are kept in a per-process LRU of this many entries, for
+# at most this many seconds. Saves evict locally; a deactivation is refused
+# everywhere at once through the shared cache.
+POSTS_AUTH_USER_CACHE_SIZE = config('POSTS_AUTH_USER_CACHE_SIZE', default=1024, cast=int)
+POSTS_AUTH_USER_CACHE_TTL = config('POSTS_AUTH_USER_CACHE_TTL', default=30, cast=int)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -151,4 +241,58 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'posts.User'
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Stream uploads to temporary files instead of buffering them in memory
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+# Home timelines (posts/services/timeline.py): authors with at least this many
+# followers are merged in on read instead of being fanned out on write.
+POSTS_FANOUT_THRESHOLD = config('POSTS_FANOUT_THRESHOLD', default=10000, cast=int)
+POSTS_TIMELINE_BACKFILL = config('POSTS_TIMELINE_BACKFILL', default=100, cast=int)
+
+# Like counters (posts/services/counters.py). 'buffered' collects like_count
+# deltas in the cache and leaves the row writes to `manage.py
+# flush_like_counts`, which must run at least every POSTS_LIKE_MAX_STALENESS
+# seconds; while it doesn't, likes fall back to direct writes.
+POSTS_LIKE_COUNTER = config('POSTS_LIKE_COUNTER', default='direct')
+POSTS_LIKE_MAX_STALENESS = config('POSTS_LIKE_MAX_STALENESS', default=10, cast=int)
+
+# Post image variants (posts/services/images.py). 'sync' builds them inline
+# in the upload request, once its writes are committed, so the response
+# waits for every encode; 'deferred' leaves them to
+# `manage.py process_post_images` and keeps uploads fast.
+POSTS_IMAGE_PROCESSING = config('POSTS_IMAGE_PROCESSING', default='sync')
+POSTS_IMAGE_VARIANTS = {
+    'thumbnail': 320,
+    'medium': 960,
+    'full': 2048,
+}
+
+# Request metrics (posts/middleware.py): share of requests instrumented,
+# and when a sampled request is logged as a warning.
+POSTS_METRICS_SAMPLE_RATE = config('POSTS_METRICS_SAMPLE_RATE', default=0.05, cast=float)
+POSTS_METRICS_SERVER_TIMING = config('POSTS_METRICS_SERVER_TIMING', default=True, cast=bool)
+POSTS_METRICS_SLOW_MS = config('POSTS_METRICS_SLOW_MS', default=500, cast=int)
+POSTS_METRICS_DUPLICATE_THRESHOLD = config('POSTS_METRICS_DUPLICATE_THRESHOLD', default=5, cast=int)
+
+# Exports (posts/services/export.py): rows fetched per round trip from the
+# server-side cursor.
+POSTS_EXPORT_CHUNK_SIZE = config('POSTS_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'posts.metrics': {
+            'handlers': ['console'],
+            'level': config('POSTS_METRICS_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+    },
+}
@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from posts.cache import get_cache
+from posts.models import TokenUser
+
+# Claims added to tokens by ClaimsTokenObtainPairSerializer
+USER_CLAIMS = ('username', 'is_active')
+
+
+class UserCache:
+    """
+    Bounded in-process LRU of full User rows, each kept for at most
+    POSTS_AUTH_USER_CACHE_TTL seconds, for requests that need more of the
+    user than the token's claims. Saving or deleting a user evicts it in
+    this process; other processes see the change once the entry expires.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def lookup(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return entry[1]
+
+    def store(self, user):
+        with self.lock:
+            self.entries[user.pk] = (time.monotonic() + settings.POSTS_AUTH_USER_CACHE_TTL, user)
+            self.entries.move_to_end(user.pk)
+            while len(self.entries) > settings.POSTS_AUTH_USER_CACHE_SIZE:
+                self.entries.popitem(last=False)
+        return user
+
+    def get(self, user_id):
+        """The user, from the cache or else one query; raises User.DoesNotExist."""
+        user = self.lookup(user_id)
+        if user is None:
+            user = self.store(get_user_model().objects.get(pk=user_id))
+        return user
+
+    async def aget(self, user_id):
+        user = self.lookup(user_id)
+        if user is None:
+            user = self.store(await get_user_model().objects.aget(pk=user_id))
+        return user
+
+    def evict(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+user_cache = UserCache()
+
+
+def _inactive_key(user_id):
+    return f'posts:auth:inactive:{user_id}'
+
+
+def mark_inactive(user_id):
+    """
+    Refuse tokens of a deactivated or deleted user in every process, until
+    the access tokens issued while it was active have expired.
+    """
+    timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+    get_cache().set(_inactive_key(user_id), True, timeout=timeout)
+
+
+def clear_inactive(user_id):
+    get_cache().delete(_inactive_key(user_id))
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that async views can await (see AsyncReadView).
+
+    `aauthenticate()` checks the token in-process like `authenticate()`,
+    then loads the user through the async ORM instead of blocking the
+    event loop on a query.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class StatelessJWTAuthentication(AsyncJWTAuthentication):
+    """
+    Trust the `username` and `is_active` claims signed into the token (see
+    ClaimsTokenObtainPairSerializer), so authenticating costs no query.
+
+    request.user is a TokenUser: a User with only the claims loaded, whose
+    other fields come from `user_cache` when read. Deactivated and deleted
+    users are refused through a marker in the shared cache (mark_inactive).
+    Tokens without the claims, or CHECK_REVOKE_TOKEN, which needs the
+    password hash, fall back to the full user from `user_cache`.
+    """
+
+    def get_user_id(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        # simplejwt signs the id as a string
+        return self.user_model._meta.pk.to_python(user_id)
+
+    def trusts_claims(self, validated_token):
+        return not api_settings.CHECK_REVOKE_TOKEN and all(claim in validated_token for claim in USER_CLAIMS)
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+    def build_user(self, user_id, validated_token, full_user):
+        if full_user is None:
+            user = TokenUser.from_claims(user_id, validated_token['username'], validated_token['is_active'])
+        else:
+            user = TokenUser.from_claims(full_user.pk, full_user.username, full_user.is_active)
+        self.check_user(full_user or user, validated_token)
+        return user
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        if get_cache().get(_inactive_key(user_id)):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        full_user = None
+        if not self.trusts_claims(validated_token):
+            try:
+                full_user = user_cache.get(user_id)
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self.build_user(user_id, validated_token, full_user)
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        if await get_cache().aget(_inactive_key(user_id)):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        full_user = None
+        if not self.trusts_claims(validated_token):
+            try:
+                full_user = await user_cache.aget(user_id)
+            except self.user_model.DoesNotExist as e:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        return self.build_user(user_id, validated_token, full_user)
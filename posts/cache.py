@@ -0,0 +1,240 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from rest_framework.response import Response
+
+from posts import routers
+
+# Feeds whose cached pages are invalidated together.
+FEED_POSTS = 'posts'
+FEED_STATS = 'posts_with_stats'
+
+# Version every cached response also depends on (see invalidate_accounts())
+ACCOUNTS = ('accounts', 'deleted')
+
+STATS_KEYS = {'hit': 'posts:cache:hits', 'miss': 'posts:cache:misses'}
+
+
+def get_cache():
+    return caches[settings.POSTS_CACHE_ALIAS]
+
+
+def _version_key(scope, name):
+    return f'posts:{scope}:{name}:version'
+
+
+def get_version(scope, name):
+    """
+    Current version of `scope`/`name`: the time, in nanoseconds, of its
+    last invalidation.
+    """
+    cache = get_cache()
+    key = _version_key(scope, name)
+    version = cache.get(key)
+    if version is None:
+        # An evicted version restarts at "now", which is never older than
+        # the data it stood for.
+        now = time.time_ns()
+        cache.add(key, now, timeout=None)
+        version = cache.get(key, now)
+    return version
+
+
+async def aget_version(scope, name):
+    """get_version() through the cache's async API."""
+    cache = get_cache()
+    key = _version_key(scope, name)
+    version = await cache.aget(key)
+    if version is None:
+        now = time.time_ns()
+        await cache.aadd(key, now, timeout=None)
+        version = await cache.aget(key, now)
+    return version
+
+
+def get_response_version(scope, name):
+    """Version of `scope`/`name`, or of the last account deletion if that's newer."""
+    return max(get_version(scope, name), get_version(*ACCOUNTS))
+
+
+async def aget_response_version(scope, name):
+    return max(await aget_version(scope, name), await aget_version(*ACCOUNTS))
+
+
+def bump_version(scope, name):
+    get_cache().set(_version_key(scope, name), time.time_ns(), timeout=None)
+
+
+def bump_versions(scope, names):
+    """bump_version() for many names with one cache write."""
+    now = time.time_ns()
+    get_cache().set_many({_version_key(scope, name): now for name in names}, timeout=None)
+
+
+def invalidate_post(post_id):
+    bump_version('post', post_id)
+
+
+def invalidate_comments(post_id):
+    bump_version('comments', post_id)
+
+
+def invalidate_accounts():
+    """
+    Invalidate every post, feed and comment list at once, for an account
+    deletion: the account's content may be cached under any of them.
+    """
+    bump_version(*ACCOUNTS)
+
+
+def invalidate_feeds(*feeds):
+    for feed in feeds or (FEED_POSTS, FEED_STATS):
+        bump_version('feed', feed)
+
+
+def record(outcome):
+    cache = get_cache()
+    key = STATS_KEYS[outcome]
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+
+async def arecord(outcome):
+    cache = get_cache()
+    key = STATS_KEYS[outcome]
+    if not await cache.aadd(key, 1, timeout=None):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            pass
+
+
+def get_stats():
+    cache = get_cache()
+    return {outcome: cache.get(key, 0) for outcome, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    get_cache().delete_many(STATS_KEYS.values())
+
+
+class CachedResponseMixin:
+    """
+    Serve anonymous GETs from the response cache.
+
+    Set `cache_feed` for list views; leave it unset on detail views, which
+    are then cached per `pk` and URL. Entries are keyed on the current
+    version of the feed or post (or of the last account deletion, if
+    newer), so a bump by the signal handlers orphans every stale entry at
+    once. Right after a bump the miss is read from the primary (see
+    routers.read_primary_after()), so a lagging replica can't fill the new
+    entry with the old rows.
+    """
+    cache_feed = None
+
+    def get_response_cache_scope(self):
+        if self.cache_feed is None:
+            return 'post', self.kwargs['pk']
+        return 'feed', self.cache_feed
+
+    def get_response_cache_key(self, request, version):
+        url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+        scope, name = self.get_response_cache_scope()
+        return f"posts:{scope}:{name}:{version}:{url_hash}"
+
+    def cached_response(self, data):
+        response = Response(data)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def get(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().get(request, *args, **kwargs)
+
+        cache = get_cache()
+        version = get_response_version(*self.get_response_cache_scope())
+        key = self.get_response_cache_key(request, version)
+        data = cache.get(key)
+        if data is not None:
+            record('hit')
+            return self.cached_response(data)
+
+        record('miss')
+        routers.read_primary_after(version)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.POSTS_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    async def aget(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return await super().aget(request, *args, **kwargs)
+
+        cache = get_cache()
+        version = await aget_response_version(*self.get_response_cache_scope())
+        key = self.get_response_cache_key(request, version)
+        data = await cache.aget(key)
+        if data is not None:
+            await arecord('hit')
+            return self.cached_response(data)
+
+        await arecord('miss')
+        routers.read_primary_after(version)
+        response = await super().aget(request, *args, **kwargs)
+        if response.status_code == 200:
+            await cache.aset(key, response.data, settings.POSTS_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Send an ETag on GETs and answer If-None-Match with 304 Not Modified.
+
+    The ETag comes from the version key of the post, feed or comment list
+    (see `get_validator_scope()`), so it costs one cache read: no query
+    runs and nothing is serialized. It also covers the user, because of
+    `liked_by_me`, and the full URL, because of paging and `?fields=`.
+    There is no Last-Modified: at one-second resolution, If-Modified-Since
+    would answer 304 after a second write within the same second.
+    """
+
+    def get_validator_scope(self):
+        if getattr(self, 'cache_feed', None) is None:
+            return 'post', self.kwargs['pk']
+        return 'feed', self.cache_feed
+
+    def get_etag(self, request, version):
+        user = request.user.pk if request.user.is_authenticated else ''
+        return 'W/"%s"' % hashlib.md5(f"{version}:{user}:{request.get_full_path()}".encode()).hexdigest()
+
+    def set_etag(self, response, etag):
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+    def get(self, request, *args, **kwargs):
+        version = get_response_version(*self.get_validator_scope())
+        etag = self.get_etag(request, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            routers.read_primary_after(version)
+            response = super().get(request, *args, **kwargs)
+        return self.set_etag(response, etag)
+
+    async def aget(self, request, *args, **kwargs):
+        version = await aget_response_version(*self.get_validator_scope())
+        etag = self.get_etag(request, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            routers.read_primary_after(version)
+            response = await super().aget(request, *args, **kwargs)
+        return self.set_etag(response, etag)
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from io import BytesIO
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from posts.management.commands.bench_routes import StubGeminiHandler
+from posts.models import Post, User
+
+
+class SlowGeminiHandler(StubGeminiHandler):
+    """The bench_routes stub, answering after `delay` seconds like a real model call."""
+    delay = 0.0
+
+    def do_POST(self):
+        time.sleep(self.delay)
+        super().do_POST()
+
+
+def call_wsgi(app, method, path, body, headers):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = value
+    status = []
+    result = app(environ, lambda code, response_headers, exc_info=None: status.append(int(code.split()[0])))
+    try:
+        b''.join(result)
+    finally:
+        getattr(result, 'close', lambda: None)()
+    return status[0]
+
+
+async def call_asgi(app, method, path, body, headers):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'content-type', b'application/json')]
+        + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+    }
+    sent = asyncio.Event()
+    status = []
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await sent.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+        elif not message.get('more_body'):
+            sent.set()
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare throughput and tail latency of the WSGI and ASGI deployments under concurrent load, "
+        "with a share of requests waiting on a slow (stubbed) AI call. Each interface runs in its own "
+        "process against the current database (see seed_bench); nothing is written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Timed requests per interface.')
+        parser.add_argument('--concurrency', type=int, default=64, help='Clients with a request in flight.')
+        parser.add_argument('--workers', type=int, default=8,
+                            help='WSGI worker threads (like gunicorn --threads); ASGI uses one event loop.')
+        parser.add_argument('--ai-share', type=float, default=0.2, help='Share of requests that ask for titles.')
+        parser.add_argument('--ai-delay', type=float, default=1.0, help='Seconds the AI stub takes to answer.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--interface', choices=['wsgi', 'asgi'], action='append',
+                            help='Repeatable; default both.')
+        parser.add_argument('--output', help='Also write the results as JSON to this file.')
+        parser.add_argument('--serve', choices=['wsgi', 'asgi'], help='Internal: run one interface in this process.')
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            if settings.SERVER_INTERFACE != options['serve']:
+                raise CommandError(f"Run with SERVER_INTERFACE={options['serve']} so the URLconf matches.")
+            self.stdout.write(json.dumps(self.serve(options)))
+            return
+
+        results = {}
+        for interface in options['interface'] or ['wsgi', 'asgi']:
+            results[interface] = self.spawn(interface, options)
+            result = results[interface]
+            self.stdout.write(
+                f"{interface}: {result['rps']:.0f} req/s, errors={result['errors']}; "
+                f"reads p50={result['read']['p50_ms']:.1f}ms p99={result['read']['p99_ms']:.1f}ms; "
+                f"ai p50={result['ai']['p50_ms']:.1f}ms p99={result['ai']['p99_ms']:.1f}ms"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2, sort_keys=True)
+                fh.write('\n')
+
+    def spawn(self, interface, options):
+        # The URLconf picks sync or async views at import, so each interface
+        # needs a fresh process.
+        argv = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'bench_asgi', '--serve', interface,
+            '--requests', str(options['requests']), '--concurrency', str(options['concurrency']),
+            '--workers', str(options['workers']), '--ai-share', str(options['ai_share']),
+            '--ai-delay', str(options['ai_delay']), '--seed', str(options['seed']),
+        ]
+        env = {**os.environ, 'SERVER_INTERFACE': interface}
+        completed = subprocess.run(argv, env=env, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f"{interface} run failed:\n{completed.stderr}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+    def plan(self, options):
+        post = Post.objects.order_by('-comment_count', '-id').first()
+        user = User.objects.order_by('id').first()
+        if post is None or user is None:
+            raise CommandError("No posts to benchmark against; run seed_bench first.")
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+        ai_path = reverse('title-suggestions-async' if options['serve'] == 'asgi' else 'title-suggestions')
+        reads = [
+            reverse('post_list_create'),
+            reverse('post_detail', args=[post.pk]),
+            reverse('posts_with_stats'),
+            reverse('comment_list_create', args=[post.pk]),
+        ]
+        rng = random.Random(options['seed'])
+        plan = []
+        for i in range(options['requests']):
+            if rng.random() < options['ai_share']:
+                # Distinct content, so no answer comes from the title cache
+                plan.append(('ai', 'POST', ai_path, json.dumps({'content': f'bench {i}'}).encode()))
+            else:
+                plan.append(('read', 'GET', reads[i % len(reads)], b''))
+        return plan, headers
+
+    def serve(self, options):
+        SlowGeminiHandler.delay = options['ai_delay']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), SlowGeminiHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        overrides = {
+            'ALLOWED_HOSTS': ['testserver'],
+            'GEMINI_API_BASE': f'http://127.0.0.1:{server.server_port}',
+            'GEMINI_MAX_CONCURRENCY': options['concurrency'],
+            'POSTS_METRICS_SAMPLE_RATE': 0,
+            # Reads hit the database rather than the response cache.
+            'CACHES': {**settings.CACHES, 'bench': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+            'POSTS_CACHE_ALIAS': 'bench',
+        }
+        try:
+            with override_settings(**overrides):
+                plan, headers = self.plan(options)
+                return asyncio.run(self.drive(options['serve'], plan, headers, options))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    async def drive(self, interface, plan, headers, options):
+        if interface == 'asgi':
+            app = get_asgi_application()
+
+            async def call(method, path, body):
+                return await call_asgi(app, method, path, body, headers)
+        else:
+            app = get_wsgi_application()
+            executor = ThreadPoolExecutor(options['workers'])
+            loop = asyncio.get_running_loop()
+
+            async def call(method, path, body):
+                return await loop.run_in_executor(executor, call_wsgi, app, method, path, body, headers)
+
+        # One untimed pass over each distinct request warms up imports and connections.
+        for _, method, path, body in {item[2]: item for item in plan}.values():
+            await call(method, path, body)
+
+        queue = list(reversed(plan))
+        timings = {'read': [], 'ai': []}
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            while queue:
+                kind, method, path, body = queue.pop()
+                started = time.perf_counter()
+                try:
+                    status = await call(method, path, body)
+                except Exception:
+                    status = 599
+                timings[kind].append((time.perf_counter() - started) * 1000)
+                if status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+
+        def summary(values):
+            if not values:
+                return {'count': 0, 'p50_ms': 0.0, 'p99_ms': 0.0}
+            values.sort()
+            return {
+                'count': len(values),
+                'p50_ms': round(statistics.median(values), 3),
+                'p99_ms': round(values[math.ceil(len(values) * 0.99) - 1], 3),
+            }
+
+        return {
+            'interface': interface,
+            'concurrency': options['concurrency'],
+            'workers': options['workers'] if interface == 'wsgi' else None,
+            'ai_delay_s': options['ai_delay'],
+            'seconds': round(elapsed, 3),
+            'rps': round(len(plan) / elapsed, 1),
+            'errors': errors,
+            'read': summary(timings['read']),
+            'ai': summary(timings['ai']),
+        }
@@ -0,0 +1,131 @@
+import json
+import math
+import statistics
+import threading
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+from django.db.backends.signals import connection_created
+
+BENCH_ALIAS = '__bench_connections__'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request database latency with a fresh connection per request, "
+        "persistent connections (CONN_MAX_AGE) and a psycopg pool (PostgreSQL, psycopg[pool]). "
+        "Each simulated request runs one query between the connection checks Django makes at "
+        "request start and finish, so connections are reused or closed as they are for real requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Simulated requests per mode.')
+        parser.add_argument('--threads', type=int, default=1, help='Concurrent request threads.')
+        parser.add_argument('--mode', choices=['fresh', 'persistent', 'pooled'], action='append',
+                            help='Repeatable; default all three.')
+        parser.add_argument('--query', default='SELECT 1', help='Statement run by each request.')
+        parser.add_argument('--output', help='Also write the results as JSON to this file.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in options['mode'] or ['fresh', 'persistent', 'pooled']:
+            try:
+                results[mode] = self.bench(mode, options['requests'], options['threads'], options['query'])
+            except ImproperlyConfigured as exc:
+                results[mode] = {'skipped': str(exc)}
+                self.stderr.write(self.style.WARNING(f"{mode}: skipped ({exc})"))
+                continue
+            self.stdout.write(
+                f"{mode:>10}: p50={results[mode]['p50_ms']:.2f}ms p99={results[mode]['p99_ms']:.2f}ms "
+                f"mean={results[mode]['mean_ms']:.2f}ms, {results[mode]['connects']} connection(s) opened"
+            )
+
+        baseline = results.get('fresh', {}).get('p50_ms')
+        for mode, result in results.items():
+            if mode != 'fresh' and baseline is not None and 'p50_ms' in result:
+                result['saved_p50_ms'] = round(baseline - result['p50_ms'], 3)
+                self.stdout.write(f"{mode:>10}: saves {result['saved_p50_ms']:.2f}ms per request at p50")
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump(results, fh, indent=2, sort_keys=True)
+                fh.write('\n')
+
+    def settings_for(self, mode):
+        base = connections['default'].settings_dict
+        options = {key: value for key, value in base['OPTIONS'].items() if key != 'pool'}
+        if mode == 'pooled':
+            if base['ENGINE'] != 'django.db.backends.postgresql':
+                raise ImproperlyConfigured("pooling needs the PostgreSQL backend")
+            options['pool'] = base['OPTIONS'].get('pool') or True
+        return {**base, 'OPTIONS': options, 'CONN_MAX_AGE': None if mode == 'persistent' else 0}
+
+    def bench(self, mode, requests, threads, query):
+        """Time `requests` simulated requests on a throwaway alias configured for `mode`."""
+        if threads < 1 or requests < threads:
+            raise CommandError("--requests must be at least --threads, and --threads at least 1.")
+        settings_dict = self.settings_for(mode)
+        backend = load_backend(settings_dict['ENGINE'])
+        latencies = []
+        connects = [0]
+        lock = threading.Lock()
+
+        def created(sender, connection, **kwargs):
+            if connection.alias == BENCH_ALIAS:
+                with lock:
+                    connects[0] += 1
+
+        def worker(count):
+            # Like `connections`, one wrapper per thread; it is kept out of
+            # `connections` so the app's own connections are left alone.
+            wrapper = backend.DatabaseWrapper(settings_dict, BENCH_ALIAS)
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                # What close_old_connections() does on request_started/finished
+                wrapper.close_if_unusable_or_obsolete()
+                try:
+                    with wrapper.cursor() as cursor:
+                        cursor.execute(query)
+                        cursor.fetchall()
+                finally:
+                    wrapper.close_if_unusable_or_obsolete()
+                timings.append((time.perf_counter() - started) * 1000)
+            wrapper.close()
+            with lock:
+                latencies.extend(timings)
+
+        connection_created.connect(created)
+        try:
+            # One warm-up request, so a pool is already open when timing starts.
+            worker(1)
+            latencies.clear()
+            connects[0] = 0
+            workers = [
+                threading.Thread(target=worker, args=(requests // threads + (i < requests % threads),))
+                for i in range(threads)
+            ]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+        finally:
+            connection_created.disconnect(created)
+            wrapper = backend.DatabaseWrapper(settings_dict, BENCH_ALIAS)
+            if getattr(wrapper, 'pool', None):
+                # Django "connects" on every checkout; count server connections instead.
+                connects[0] = wrapper.pool.get_stats().get('connections_num', 0)
+                wrapper.close_pool()
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'threads': threads,
+            'connects': connects[0],
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p99_ms': round(latencies[math.ceil(len(latencies) * 0.99) - 1], 3),
+            'mean_ms': round(statistics.fmean(latencies), 3),
+        }
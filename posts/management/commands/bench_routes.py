@@ -0,0 +1,229 @@
+import json
+import math
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from posts.models import Comment, Post, TitleSuggestionJob, User
+from posts.urls import urlpatterns
+
+BENCH_USERNAME = '__bench_routes__'
+BENCH_PASSWORD = 'bench-pass-8f2c'
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    """Answers generateContent locally so the AI routes never leave the machine."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = json.dumps({'candidates': [{'content': {'parts': [{'text': "1. One\n2. Two"}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every route in posts/urls.py against the current database (see seed_bench): "
+        "p50/p99 latency, queries and peak allocations per request, written as JSON. "
+        "Writes are rolled back. Pass --compare to diff against an earlier run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50, help='Timed requests per route.')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per route first.')
+        parser.add_argument('--routes', nargs='+', help='Only these route names.')
+        parser.add_argument('--use-cache', action='store_true', help='Keep the response cache enabled.')
+        parser.add_argument('--output', default='-', help="JSON results file, or '-' for stdout.")
+        parser.add_argument('--compare', help='Earlier results file to compare against.')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Relative p50 growth counted as a regression.')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeminiHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        overrides = {
+            'ALLOWED_HOSTS': ['testserver'],
+            'GEMINI_API_BASE': f'http://127.0.0.1:{server.server_port}',
+            'POSTS_METRICS_SAMPLE_RATE': 0,
+        }
+        if not options['use_cache']:
+            overrides['CACHES'] = {**settings.CACHES, 'bench': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+            overrides['POSTS_CACHE_ALIAS'] = 'bench'
+
+        try:
+            with override_settings(**overrides), transaction.atomic():
+                results = self.run(options)
+                transaction.set_rollback(True)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        report = {'meta': self.meta(options), 'routes': results}
+        payload = json.dumps(report, indent=2, sort_keys=True)
+        if options['output'] == '-':
+            self.stdout.write(payload)
+        else:
+            with open(options['output'], 'w') as fh:
+                fh.write(payload + '\n')
+            self.stderr.write(f"Wrote {options['output']}")
+
+        if options['compare']:
+            with open(options['compare']) as fh:
+                regressions = self.compare(json.load(fh)['routes'], results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} route(s) regressed: {', '.join(regressions)}")
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': sys.version.split()[0],
+            'requests': options['requests'],
+            'response_cache': options['use_cache'],
+            'rows': {model.__name__: model.objects.count() for model in (User, Post, Comment)},
+        }
+
+    def fixtures(self):
+        post = Post.objects.order_by('-comment_count', '-id').first()
+        if post is None:
+            raise CommandError("No posts to benchmark against; run seed_bench first.")
+        # Staff, so the admin-only routes can be measured too
+        user = User.objects.create_user(username=BENCH_USERNAME, password=BENCH_PASSWORD, is_staff=True)
+        other = User.objects.exclude(pk=user.pk).order_by('-follower_count', 'id').first()
+        comment = Comment.objects.create(post=post, user=user, content='bench')
+        job = TitleSuggestionJob.objects.create(content='bench', content_hash='bench', requested_by=user)
+        return {'user': user, 'post': post, 'other': other, 'comment': comment, 'job': job}
+
+    def scenarios(self, f):
+        """Route name -> (method, path, JSON body)."""
+        post = f['post'].pk
+        return {
+            'register': ('post', reverse('register'), {
+                'username': 'bench_new', 'email': 'bench_new@example.com',
+                'password': BENCH_PASSWORD, 'password2': BENCH_PASSWORD,
+            }),
+            'token_obtain_pair': ('post', reverse('token_obtain_pair'), {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD}),
+            'token_refresh': ('post', reverse('token_refresh'), {'refresh': str(RefreshToken.for_user(f['user']))}),
+            'account_delete': ('delete', reverse('account_delete'), None),
+            'post_list_create': ('get', reverse('post_list_create'), None),
+            'post_detail': ('get', reverse('post_detail', args=[post]), None),
+            'like_post': ('post', reverse('like_post', args=[post]), None),
+            'bulk_like': ('post', reverse('bulk_like'), {'like': [post]}),
+            'comment_list_create': ('get', reverse('comment_list_create', args=[post]), None),
+            'comment_threads': ('get', reverse('comment_threads', args=[post]), None),
+            'comment_delete': ('delete', reverse('comment_delete', args=[f['comment'].pk]), None),
+            'follow_user': ('post', reverse('follow_user', args=[f['other'].pk]), None),
+            'home_timeline': ('get', reverse('home_timeline'), None),
+            'posts_with_stats': ('get', reverse('posts_with_stats'), None),
+            'title-suggestions': ('post', reverse('title-suggestions'), {'content': 'bench'}),
+            'title-suggestions-async': ('post', reverse('title-suggestions-async'), {'content': 'bench'}),
+            'title-suggestion-jobs': ('post', reverse('title-suggestion-jobs'), {'content': 'bench job'}),
+            'title-suggestion-job-detail': ('get', reverse('title-suggestion-job-detail', args=[f['job'].pk]), None),
+            'export': ('get', reverse('export', args=['posts', 'ndjson']), None),
+            'request_metrics': ('get', reverse('request_metrics'), None),
+        }
+
+    def run(self, options):
+        fixtures = self.fixtures()
+        scenarios = self.scenarios(fixtures)
+        token = str(RefreshToken.for_user(fixtures['user']).access_token)
+        client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        names = options['routes'] or [pattern.name for pattern in urlpatterns]
+        results = {}
+        for name in names:
+            if name not in scenarios:
+                results[name] = {'skipped': 'no scenario'}
+                self.stderr.write(self.style.WARNING(f"{name}: no benchmark scenario"))
+                continue
+            method, path, body = scenarios[name]
+
+            def call():
+                # Each request runs in a savepoint that is rolled back, so
+                # writes neither pile up nor change later measurements.
+                with transaction.atomic():
+                    response = getattr(client, method)(path, data=body, content_type='application/json')
+                    # Streamed bodies are produced as they are read; time that too.
+                    content = response.getvalue()
+                    transaction.set_rollback(True)
+                return response, content
+
+            for _ in range(options['warmup']):
+                call()
+            timings = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                response, content = call()
+                timings.append((time.perf_counter() - started) * 1000)
+            # The test client resets connection.queries on request_started,
+            # so count statements with an execute wrapper instead.
+            queries = []
+            with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+                call()
+            tracemalloc.start()
+            call()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            timings.sort()
+            results[name] = {
+                'method': method.upper(),
+                'path': path,
+                'status': response.status_code,
+                'bytes': len(content),
+                'p50_ms': round(statistics.median(timings), 3),
+                'p99_ms': round(timings[math.ceil(len(timings) * 0.99) - 1], 3),
+                'mean_ms': round(statistics.fmean(timings), 3),
+                'queries': len(queries),
+                'peak_alloc_kib': round(peak / 1024, 1),
+            }
+            self.stderr.write(
+                f"{name:>28}: {response.status_code} p50={results[name]['p50_ms']:.2f}ms "
+                f"p99={results[name]['p99_ms']:.2f}ms queries={results[name]['queries']}"
+            )
+        return results
+
+    def compare(self, before, after, threshold):
+        regressions = []
+        for name, now in after.items():
+            then = before.get(name)
+            if not then or 'p50_ms' not in then or 'p50_ms' not in now:
+                continue
+            change = (now['p50_ms'] - then['p50_ms']) / then['p50_ms'] if then['p50_ms'] else 0.0
+            regressed = change > threshold or now['queries'] > then['queries']
+            if regressed:
+                regressions.append(name)
+            line = (
+                f"{name:>28}: p50 {then['p50_ms']:.2f} -> {now['p50_ms']:.2f}ms ({change:+.0%}), "
+                f"queries {then['queries']} -> {now['queries']}"
+            )
+            self.stderr.write(self.style.ERROR(line) if regressed else line)
+        return regressions
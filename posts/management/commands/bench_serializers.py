@@ -0,0 +1,94 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from posts.encoders import compile_encoder
+from posts.models import Comment, Post, User
+from posts.renderers import FastJSONRenderer
+from posts.serializers import CommentPreviewSerializer, CommentSerializer, PostWithStatsSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF serializers + JSONRenderer with the compiled row encoders + FastJSONRenderer "
+        "on in-memory rows, and check that both produce the same bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='Rows per rendered page.')
+        parser.add_argument('--repeat', type=int, default=50, help='Pages rendered per measurement.')
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        # No request in the context: URLs stay relative, so no host is needed
+        context = {}
+        posts, comments = self.build_rows(rows)
+
+        cases = [
+            (
+                'posts-with-stats',
+                lambda: PostWithStatsSerializer(posts, many=True, context=context).data,
+                lambda: self.encode_posts(posts, context),
+            ),
+            (
+                'comments',
+                lambda: CommentSerializer(comments, many=True, context=context).data,
+                lambda: self.encode(CommentSerializer(context=context), comments),
+            ),
+        ]
+        for name, slow, fast in cases:
+            baseline, baseline_bytes = self.measure(slow, JSONRenderer(), repeat)
+            encoded, encoded_bytes = self.measure(fast, FastJSONRenderer(), repeat)
+            if baseline_bytes != encoded_bytes:
+                raise CommandError(f"{name}: fast path output differs from the serializer output")
+            self.stdout.write(
+                f"{name:>17}: serializer {rows * repeat / baseline:,.0f} rows/s, "
+                f"encoder {rows * repeat / encoded:,.0f} rows/s ({baseline / encoded:.1f}x)"
+            )
+
+    def measure(self, build, renderer, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            content = renderer.render({'results': build()})
+        return time.perf_counter() - started, content
+
+    def encode(self, serializer, instances, overrides=None):
+        encode = compile_encoder(serializer, overrides)
+        return [encode(instance) for instance in instances]
+
+    def encode_posts(self, posts, context):
+        encode_comment = compile_encoder(CommentPreviewSerializer())
+        overrides = {'recent_comments': lambda post: [encode_comment(c) for c in post.recent_comments]}
+        return self.encode(PostWithStatsSerializer(context=context), posts, overrides)
+
+    def build_rows(self, count):
+        now = timezone.now()
+        author = User(id=1, username='author', email='author@example.com')
+        posts, comments = [], []
+        for i in range(count):
+            post = Post(
+                id=i + 1,
+                author=author,
+                title=f'Post number {i}',
+                content='Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 20,
+                image=f'post_images/{i}.jpg',
+                image_variants={
+                    'thumbnail': {'width': 320, 'height': 240, 'webp': f'post_images/variants/{i}/thumbnail.webp'},
+                    'medium': {'width': 960, 'height': 720, 'webp': f'post_images/variants/{i}/medium.webp'},
+                },
+                like_count=i * 3,
+                comment_count=3,
+                created_at=now - timedelta(minutes=i),
+            )
+            post.liked_by_me = i % 2 == 0
+            post.recent_comments = [
+                Comment(id=i * 3 + j, post=post, user=author, content='Nice post!', depth=0,
+                        created_at=now - timedelta(seconds=j))
+                for j in range(3)
+            ]
+            posts.append(post)
+            comments.extend(post.recent_comments)
+        return posts, comments[:count]
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import cache
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counts for the post and feed response cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing.')
+
+    def handle(self, *args, **options):
+        stats = cache.get_stats()
+        total = stats['hit'] + stats['miss']
+        ratio = stats['hit'] / total if total else 0.0
+        self.stdout.write(f"hits={stats['hit']} misses={stats['miss']} hit_ratio={ratio:.2%}")
+        if options['reset']:
+            cache.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
@@ -0,0 +1,129 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory
+
+from posts.models import User, Post, Like, Comment
+
+
+# Patterns that mark a full table scan in each backend's EXPLAIN output.
+SEQ_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING)'),
+}
+
+EXPLAIN_PREFIX = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on every query issued by the read endpoints and fail if "
+        "any of them sequentially scans a large table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Create this many throwaway posts (with comments and likes) before checking. '
+                 'Everything is rolled back afterwards.',
+        )
+        parser.add_argument(
+            '--tables',
+            nargs='+',
+            default=[Post._meta.db_table, Comment._meta.db_table, Like._meta.db_table],
+            help='Tables on which a sequential scan is an error.',
+        )
+        parser.add_argument(
+            '--natural',
+            action='store_true',
+            help='Let the PostgreSQL planner choose freely instead of disabling seq scans. '
+                 'Only meaningful against a realistically sized database.',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        vendor = connection.vendor
+        if vendor not in SEQ_SCAN_PATTERNS:
+            raise CommandError(f"Query plan checks are not supported on {vendor}.")
+
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            if vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                    if not options['natural']:
+                        # Any Seq Scan left in the plan then means no index fits the query.
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+
+            failures = self.check_endpoints(vendor, set(options['tables']))
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(
+                "Sequential scans found:\n" + "\n".join(
+                    f"  {route}: {table}\n    {sql}" for route, table, sql in failures
+                )
+            )
+        self.stdout.write(self.style.SUCCESS("No sequential scans on large tables."))
+
+    def seed(self, count):
+        user = User.objects.create_user(username='__query_plan_check__')
+        posts = Post.objects.bulk_create(
+            Post(title=f'Post {i}', content='Body', author=user) for i in range(count)
+        )
+        Comment.objects.bulk_create(
+            Comment(post=post, user=user, content='Comment') for post in posts for _ in range(3)
+        )
+        Like.objects.bulk_create(Like(post=post, user=user) for post in posts)
+
+    def get_routes(self):
+        post = Post.objects.order_by('-created_at', '-id').first()
+        if post is None:
+            raise CommandError("No posts to check against; pass --seed.")
+        return [
+            reverse('post_list_create'),
+            reverse('post_detail', kwargs={'pk': post.pk}),
+            reverse('comment_list_create', kwargs={'post_id': post.pk}),
+            reverse('comment_threads', kwargs={'post_id': post.pk}),
+            reverse('posts_with_stats'),
+        ]
+
+    def check_endpoints(self, vendor, tables):
+        pattern = SEQ_SCAN_PATTERNS[vendor]
+        factory = APIRequestFactory()
+        failures = []
+
+        # Bypass the response cache so every endpoint really hits the database.
+        caches = {**settings.CACHES, 'query_plans': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(ALLOWED_HOSTS=['testserver'], CACHES=caches, POSTS_CACHE_ALIAS='query_plans'):
+            for url in self.get_routes():
+                match = resolve(url)
+                with CaptureQueriesContext(connection) as ctx:
+                    response = match.func(factory.get(url), *match.args, **match.kwargs)
+                    response.render()
+                if response.status_code != 200:
+                    raise CommandError(f"GET {url} returned {response.status_code}.")
+
+                for query in ctx.captured_queries:
+                    sql = query['sql']
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    with connection.cursor() as cursor:
+                        cursor.execute(EXPLAIN_PREFIX[vendor] + sql)
+                        plan = "\n".join(str(row[-1]) for row in cursor.fetchall())
+                    if self.verbosity > 1:
+                        self.stdout.write(f"GET {url}\n  {sql}\n  " + plan.replace("\n", "\n  "))
+                    for table in pattern.findall(plan):
+                        if table in tables:
+                            failures.append((url, table, sql))
+        return failures
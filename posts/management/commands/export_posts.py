@@ -0,0 +1,53 @@
+import argparse
+import sys
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.services.export import EXPORTS, FORMATS, Export
+
+
+def timestamp(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise argparse.ArgumentTypeError(f"not an ISO 8601 date or datetime: {value!r}")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream posts, comments or likes to a file (or stdout) as NDJSON or CSV. "
+        "Rows are read through a server-side cursor, so memory use doesn't grow with the table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=list(EXPORTS), default='posts')
+        parser.add_argument('--format', choices=list(FORMATS), default='ndjson')
+        parser.add_argument('--author', type=int, help='Only rows by this user id.')
+        parser.add_argument('--since', type=timestamp, help='Only rows created at or after this time.')
+        parser.add_argument('--until', type=timestamp, help='Only rows created before this time.')
+        parser.add_argument('--gzip', action='store_true', help='Compress the output.')
+        parser.add_argument('--chunk-size', type=int, help='Rows per fetch (default: POSTS_EXPORT_CHUNK_SIZE).')
+        parser.add_argument('--output', default='-', help="File to write, or '-' for stdout.")
+
+    def handle(self, *args, **options):
+        export = Export(
+            options['kind'], options['format'],
+            author=options['author'], since=options['since'], until=options['until'],
+            compress=options['gzip'], chunk_size=options['chunk_size'],
+        )
+        if options['output'] == '-':
+            self.write(export, sys.stdout.buffer)
+            return
+        with open(options['output'], 'wb') as fh:
+            written = self.write(export, fh)
+        self.stderr.write(f"Wrote {written} bytes to {options['output']}")
+
+    def write(self, export, fh):
+        written = 0
+        for chunk in export:
+            fh.write(chunk)
+            written += len(chunk)
+        fh.flush()
+        return written
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.services.counters import flush_like_counts
+
+
+class Command(BaseCommand):
+    help = "Write buffered like count deltas to Post.like_count (POSTS_LIKE_COUNTER=buffered)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.POSTS_LIKE_MAX_STALENESS / 2,
+            help='Seconds between flushes; keep it below POSTS_LIKE_MAX_STALENESS.',
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Posts updated per statement.')
+        parser.add_argument('--once', action='store_true', help='Flush once and exit.')
+
+    def handle(self, *args, **options):
+        if options['interval'] >= settings.POSTS_LIKE_MAX_STALENESS and not options['once']:
+            self.stderr.write(self.style.WARNING(
+                "--interval is not below POSTS_LIKE_MAX_STALENESS; likes will keep falling back to direct writes."
+            ))
+        while True:
+            started = time.monotonic()
+            updated = flush_like_counts(options['batch_size'])
+            if updated or options['verbosity'] > 1:
+                self.stdout.write(f"Flushed like counts for {updated} posts.")
+            if options['once']:
+                break
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - started)))
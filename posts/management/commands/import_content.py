@@ -0,0 +1,351 @@
+import gzip
+import json
+import os
+import time
+from collections import Counter
+from functools import partial
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import cache
+from posts.models import Comment, ImportCheckpoint, ImportedObject, Like, Post, User
+from posts.services.bulk import can_copy, create_rows, insert_rows
+
+POST_FIELDS = ('author_id', 'title', 'content', 'image', 'image_variants', 'like_count', 'comment_count',
+               'created_at', 'updated_at')
+COMMENT_FIELDS = ('post_id', 'user_id', 'parent_id', 'root_id', 'depth', 'reply_count', 'content',
+                  'created_at', 'updated_at')
+MAPPING_FIELDS = ('source', 'kind', 'source_id', 'object_id')
+# Usernames kept in the lookup cache before it is emptied
+USER_CACHE_SIZE = 100_000
+# Skipped records reported individually before only being counted
+MAX_WARNINGS = 20
+
+
+def open_input(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+class Command(BaseCommand):
+    help = (
+        "Import posts, comments and likes from NDJSON files exported by another platform, one record "
+        "per line: {\"type\": \"post\", \"id\", \"author\", \"title\", \"content\", \"created_at\"}, "
+        "{\"type\": \"comment\", \"id\", \"post\", \"parent\", \"user\", \"content\", \"created_at\"} or "
+        "{\"type\": \"like\", \"post\", \"user\", \"created_at\"}. `author`/`user` are usernames; `post` "
+        "and `parent` are the other platform's ids, and must come before the records that use them. "
+        "Each chunk of lines commits with a checkpoint, so an interrupted import resumes where it stopped. "
+        "Imported posts are not pushed into home timelines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='NDJSON files, optionally gzipped (.gz).')
+        parser.add_argument('--source', default='legacy',
+                            help='Name of the platform imported from; ids are mapped per source.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Lines per transaction.')
+        parser.add_argument('--copy', action='store_true', help='Load rows with COPY (PostgreSQL).')
+        parser.add_argument('--create-users', action='store_true',
+                            help='Create users for unknown usernames (they cannot log in) instead of skipping.')
+        parser.add_argument('--restart', action='store_true',
+                            help='Start from the top of each file; records imported before are skipped.')
+        parser.add_argument('--no-recount', action='store_true',
+                            help="Don't recompute post counters afterwards (see recount_post_stats).")
+
+    def handle(self, *args, **options):
+        if options['copy'] and not can_copy():
+            raise CommandError("--copy needs PostgreSQL.")
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        self.options = options
+        self.source = options['source']
+        # username -> user id, filled with one query per chunk
+        self.users = {}
+        self.warnings = 0
+
+        imported = 0
+        for path in options['paths']:
+            imported += self.import_file(path)
+
+        if imported and not options['no_recount']:
+            call_command('recount_post_stats', stdout=self.stdout)
+        if imported:
+            cache.invalidate_feeds()
+
+    def import_file(self, path):
+        if not os.path.exists(path):
+            raise CommandError(f"No such file: {path}")
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=self.source, path=os.path.abspath(path))
+        if self.options['restart']:
+            checkpoint.offset = checkpoint.lines = 0
+            checkpoint.counts = {}
+            checkpoint.done = False
+        elif checkpoint.done:
+            self.stdout.write(f"{path}: already imported ({checkpoint.lines} lines); pass --restart to rerun.")
+            return 0
+        elif checkpoint.lines:
+            self.stdout.write(f"{path}: resuming at line {checkpoint.lines + 1}.")
+
+        imported = 0
+        started = time.perf_counter()
+        with open_input(path) as fh:
+            fh.seek(checkpoint.offset)
+            while True:
+                lines = []
+                while len(lines) < self.options['chunk_size']:
+                    line = fh.readline()
+                    if not line:
+                        break
+                    lines.append(line)
+                if not lines:
+                    break
+
+                with transaction.atomic():
+                    counts = self.import_chunk(lines, checkpoint.lines + 1)
+                    checkpoint.offset = fh.tell()
+                    checkpoint.lines += len(lines)
+                    checkpoint.counts = dict(Counter(checkpoint.counts) + counts)
+                    checkpoint.save()
+
+                imported += sum(counts[kind] for kind in ('posts', 'comments', 'likes'))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{path}: line {checkpoint.lines}, "
+                    + ', '.join(f"{kind} {count}" for kind, count in sorted(checkpoint.counts.items()))
+                    + f" ({imported / elapsed:.0f} rows/s)"
+                )
+
+        checkpoint.done = True
+        checkpoint.save()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{path}: imported {imported} rows in {elapsed:.1f}s ({imported / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+        return imported
+
+    def skip(self, counts, line_number, reason):
+        counts['skipped'] += 1
+        self.warnings += 1
+        if self.warnings <= MAX_WARNINGS:
+            self.stderr.write(self.style.WARNING(f"line {line_number}: skipped, {reason}"))
+        elif self.warnings == MAX_WARNINGS + 1:
+            self.stderr.write(self.style.WARNING("(further skipped lines are only counted)"))
+
+    def import_chunk(self, lines, first_line):
+        counts = Counter()
+        records = {'post': [], 'comment': [], 'like': []}
+        for number, line in enumerate(lines, first_line):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.skip(counts, number, "not valid JSON")
+                continue
+            kind = record.get('type') if isinstance(record, dict) else None
+            if kind not in records:
+                self.skip(counts, number, f"unknown type {kind!r}")
+                continue
+            records[kind].append((number, record))
+
+        self.resolve_users(
+            [record.get('author') for _, record in records['post']]
+            + [record.get('user') for _, record in records['comment'] + records['like']]
+        )
+        touched = set()
+        posts = self.import_posts(records['post'], counts)
+        self.import_comments(records['comment'], posts, counts, touched)
+        self.import_likes(records['like'], posts, counts, touched)
+
+        for post_id in touched:
+            transaction.on_commit(partial(cache.invalidate_post, post_id))
+            transaction.on_commit(partial(cache.invalidate_comments, post_id))
+        return counts
+
+    def resolve_users(self, usernames):
+        """Fill the username -> id cache for `usernames`, in one query."""
+        usernames = {name for name in usernames if isinstance(name, str)}
+        missing = usernames - self.users.keys()
+        if not missing:
+            return
+        if len(self.users) + len(missing) > USER_CACHE_SIZE:
+            self.users = {name: pk for name, pk in self.users.items() if name in usernames}
+        self.users.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+        unknown = missing - self.users.keys()
+        if unknown and self.options['create_users']:
+            # '!' is an unusable password hash
+            User.objects.bulk_create([User(username=name, password='!') for name in unknown], ignore_conflicts=True)
+            self.users.update(User.objects.filter(username__in=unknown).values_list('username', 'id'))
+
+    def mapped(self, kind, source_ids):
+        """Source id -> object id for records of `kind` imported earlier."""
+        source_ids = {str(source_id) for source_id in source_ids if source_id is not None}
+        if not source_ids:
+            return {}
+        return dict(
+            ImportedObject.objects.filter(source=self.source, kind=kind, source_id__in=source_ids)
+            .values_list('source_id', 'object_id')
+        )
+
+    def save_mappings(self, kind, pairs):
+        insert_rows(
+            ImportedObject, MAPPING_FIELDS,
+            [(self.source, kind, source_id, object_id) for source_id, object_id in pairs],
+            use_copy=self.options['copy'],
+        )
+
+    def timestamps(self, record):
+        created = self.timestamp(record.get('created_at')) or timezone.now()
+        return created, self.timestamp(record.get('updated_at')) or created
+
+    def timestamp(self, value):
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+        if parsed is not None and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    def import_posts(self, records, counts):
+        """Returns source id -> post id for every post this chunk can reference."""
+        posts = self.mapped(ImportedObject.Kind.POST, [record.get('id') for _, record in records])
+        rows, source_ids = [], []
+        for number, record in records:
+            source_id = None if record.get('id') is None else str(record['id'])
+            if source_id is not None and source_id in posts:
+                counts['duplicates'] += 1
+                continue
+            author = self.users.get(record.get('author'))
+            if author is None:
+                self.skip(counts, number, f"unknown author {record.get('author')!r}")
+                continue
+            created, updated = self.timestamps(record)
+            rows.append((author, record.get('title') or '', record.get('content') or '', None, {}, 0, 0,
+                         created, updated))
+            source_ids.append(source_id)
+            if source_id is not None:
+                posts[source_id] = None  # later duplicates in this chunk are skipped
+
+        ids = create_rows(Post, POST_FIELDS, self.copy_json(rows, 4), use_copy=self.options['copy'])
+        pairs = [(source_id, pk) for source_id, pk in zip(source_ids, ids) if source_id is not None]
+        self.save_mappings(ImportedObject.Kind.POST, pairs)
+        posts.update(pairs)
+        counts['posts'] += len(ids)
+        return posts
+
+    def copy_json(self, rows, index):
+        # COPY gets JSON text; bulk_insert() encodes the dict itself.
+        if not (self.options['copy'] and can_copy()):
+            return rows
+        return [row[:index] + (json.dumps(row[index]),) + row[index + 1:] for row in rows]
+
+    def import_comments(self, records, posts, counts, touched):
+        """
+        Inserted one reply level at a time, so a reply can point at a parent
+        from the same chunk. root, depth and reply_count are set here since
+        bulk inserts skip Comment.save().
+        """
+        if not records:
+            return
+        posts.update(self.mapped(ImportedObject.Kind.POST, {
+            record.get('post') for _, record in records if str(record.get('post')) not in posts
+        }))
+        own_ids = {str(record['id']) for _, record in records if record.get('id') is not None}
+        known = self.mapped(ImportedObject.Kind.COMMENT, own_ids | {
+            str(record['parent']) for _, record in records if record.get('parent') is not None
+        })
+        # source id -> (comment id, root id, depth)
+        positions = self.positions(known.values())
+        threads = {source_id: positions[pk] for source_id, pk in known.items() if pk in positions}
+
+        pending = []
+        for number, record in records:
+            source_id = None if record.get('id') is None else str(record['id'])
+            if source_id is not None and source_id in known:
+                counts['duplicates'] += 1
+                continue
+            post_id = posts.get(str(record.get('post')))
+            user_id = self.users.get(record.get('user'))
+            if post_id is None:
+                self.skip(counts, number, f"unknown post {record.get('post')!r}")
+            elif user_id is None:
+                self.skip(counts, number, f"unknown user {record.get('user')!r}")
+            else:
+                pending.append((number, source_id, record, post_id, user_id))
+
+        replies = Counter()
+        while pending:
+            level, waiting = [], []
+            for item in pending:
+                number, source_id, record, post_id, user_id = item
+                parent = None if record.get('parent') is None else str(record['parent'])
+                if parent is None:
+                    level.append((item, None, None, 0))
+                elif parent in threads:
+                    parent_pk, parent_root, parent_depth = threads[parent]
+                    level.append((item, parent_pk, parent_root or parent_pk, parent_depth + 1))
+                elif parent in own_ids:
+                    waiting.append(item)
+                else:
+                    self.skip(counts, number, f"unknown parent {parent!r}")
+            if not level:
+                for number, *_ in waiting:
+                    self.skip(counts, number, "parent comment never imported")
+                break
+
+            rows = []
+            for (number, source_id, record, post_id, user_id), parent_id, root_id, depth in level:
+                created, updated = self.timestamps(record)
+                rows.append((post_id, user_id, parent_id, root_id, depth, 0, record.get('content') or '',
+                             created, updated))
+            ids = create_rows(Comment, COMMENT_FIELDS, rows, use_copy=self.options['copy'])
+            pairs = []
+            for ((number, source_id, record, post_id, user_id), parent_id, root_id, depth), pk in zip(level, ids):
+                if source_id is not None:
+                    threads[source_id] = (pk, root_id, depth)
+                    pairs.append((source_id, pk))
+                if root_id is not None:
+                    replies[root_id] += 1
+                touched.add(post_id)
+            self.save_mappings(ImportedObject.Kind.COMMENT, pairs)
+            counts['comments'] += len(ids)
+            pending = waiting
+
+        by_count = {}
+        for root_id, count in replies.items():
+            by_count.setdefault(count, []).append(root_id)
+        for count, roots in by_count.items():
+            Comment.objects.filter(pk__in=roots).update(reply_count=F('reply_count') + count)
+
+    def positions(self, comment_ids):
+        """Comment id -> (id, root id, depth) of comments imported by earlier chunks."""
+        if not comment_ids:
+            return {}
+        return {
+            pk: (pk, root_id, depth)
+            for pk, root_id, depth in Comment.objects.filter(pk__in=list(comment_ids)).values_list('id', 'root_id', 'depth')
+        }
+
+    def import_likes(self, records, posts, counts, touched):
+        if not records:
+            return
+        posts.update(self.mapped(ImportedObject.Kind.POST, {
+            record.get('post') for _, record in records if str(record.get('post')) not in posts
+        }))
+        rows = {}
+        for number, record in records:
+            post_id = posts.get(str(record.get('post')))
+            user_id = self.users.get(record.get('user'))
+            if post_id is None:
+                self.skip(counts, number, f"unknown post {record.get('post')!r}")
+            elif user_id is None:
+                self.skip(counts, number, f"unknown user {record.get('user')!r}")
+            elif (user_id, post_id) in rows:
+                counts['duplicates'] += 1
+            else:
+                rows[user_id, post_id] = (user_id, post_id, self.timestamps(record)[0])
+                touched.add(post_id)
+        counts['likes'] += insert_rows(
+            Like, ('user_id', 'post_id', 'created_at'), rows.values(), use_copy=self.options['copy'],
+        )
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.models import Post
+from posts.services.images import process_post_image
+
+
+class Command(BaseCommand):
+    help = "Build resized WebP/AVIF variants for post images that don't have them yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Posts processed per pass.')
+        parser.add_argument('--all', action='store_true', help='Rebuild variants for every post with an image.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new uploads.')
+        parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep between passes.')
+
+    def handle(self, *args, **options):
+        pending = Post.objects.exclude(Q(image='') | Q(image__isnull=True))
+        if not options['all']:
+            pending = pending.filter(image_variants={})
+
+        processed = 0
+        last_id = 0
+        while True:
+            ids = list(
+                pending.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            for post_id in ids:
+                process_post_image(post_id)
+            processed += len(ids)
+
+            if ids:
+                last_id = ids[-1]
+                continue
+            if not options['loop']:
+                break
+            last_id = 0
+            time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} images."))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.services.purge import purge_deleted
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete soft-deleted posts and users together with their likes, comments, follows and "
+        "timeline entries, in short transactions of at most --batch-size rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches, to spare replicas and other writers.')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new deletions.')
+        parser.add_argument('--poll-interval', type=float, default=30.0, help='Seconds to sleep between passes.')
+
+    def handle(self, *args, **options):
+        while True:
+            purged = purge_deleted(options['batch_size'], options['pause'])
+            if purged or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Purged {purged['posts']} posts and {purged['users']} users ({purged['rows']} rows)."
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Post, Like, Comment
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count and Post.comment_count from the Like and Comment tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of posts (by id range) to update per transaction.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # Likes of soft-deleted accounts no longer count (see soft_delete_user)
+        likes = (
+            Like.objects.filter(post=OuterRef('pk'), user__deleted_at__isnull=True)
+            .order_by().values('post').annotate(n=Count('pk')).values('n')
+        )
+        comments = (
+            Comment.objects.filter(post=OuterRef('pk'))
+            .order_by().values('post').annotate(n=Count('pk')).values('n')
+        )
+
+        max_id = Post.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+        updated = 0
+        # Walk the table in id ranges so each UPDATE holds row locks briefly.
+        for start in range(0, max_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Post.objects.filter(
+                    id__gte=start, id__lt=start + batch_size
+                ).update(
+                    like_count=Coalesce(Subquery(likes), 0),
+                    comment_count=Coalesce(Subquery(comments), 0),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Recounted stats for {updated} posts."))
@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from posts import metrics
+
+
+class Command(BaseCommand):
+    help = "Show the per-route latency histograms collected by RequestMetricsMiddleware."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='Print the raw histograms as JSON.')
+        parser.add_argument('--sort', choices=['count', 'mean_ms', 'mean_queries'], default='mean_ms')
+        parser.add_argument('--reset', action='store_true', help='Clear the histograms after printing.')
+
+    def handle(self, *args, **options):
+        histograms = metrics.get_histograms()
+        if options['json']:
+            self.stdout.write(json.dumps(histograms, indent=2, sort_keys=True))
+        elif not histograms:
+            self.stdout.write("No sampled requests yet.")
+        else:
+            self.stdout.write(f"{'route':<50} {'count':>7} {'mean ms':>9} {'p50 ≤':>7} {'p99 ≤':>7} {'queries':>8}")
+            rows = sorted(histograms.items(), key=lambda item: item[1][options['sort']], reverse=True)
+            for route, stats in rows:
+                self.stdout.write(
+                    f"{route:<50} {stats['count']:>7} {stats['mean_ms']:>9.2f} "
+                    f"{stats['p50_ms_le']:>7} {stats['p99_ms_le']:>7} {stats['mean_queries']:>8.1f}"
+                )
+        if options['reset']:
+            metrics.reset_histograms()
+            self.stdout.write(self.style.SUCCESS("Histograms reset."))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.services.jobs import claim_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued AI title suggestion jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per poll.')
+        parser.add_argument('--rate', type=float, default=2.0, help='Maximum Gemini calls per second.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--max-attempts', type=int, default=3, help='Attempts before a job is marked failed.')
+        parser.add_argument('--stale-after', type=int, default=300, help='Seconds before a running job is reclaimed.')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+
+    def handle(self, *args, **options):
+        interval = 1.0 / options['rate'] if options['rate'] > 0 else 0
+        processed = 0
+        while True:
+            jobs = claim_jobs(options['batch_size'], options['stale_after'])
+            for job in jobs:
+                started = time.monotonic()
+                run_job(job, options['max_attempts'])
+                processed += 1
+                self.stdout.write(f"{job.id} {job.status}")
+                # Space out outbound calls to stay under the rate limit.
+                time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
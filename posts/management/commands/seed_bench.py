@@ -0,0 +1,272 @@
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Like, Post, TimelineEntry, User
+from posts.services.bulk import bulk_insert, can_copy, insert_rows
+
+USERNAME_PREFIX = 'bench_'
+WORDS = (
+    "django rest api cache index query latency feed post comment thread like follow timeline "
+    "python postgres redis worker queue image search token shard replica stream batch vector "
+    "the a of to and in is it that for on with as was at by this from be or an are"
+).split()
+
+
+def zipf_weights(count, exponent):
+    return [1.0 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def spread(total, weights, cap):
+    """Split `total` over `weights`, no share above `cap`."""
+    scale = total / sum(weights) if weights else 0
+    return [min(cap, int(weight * scale + 0.5)) for weight in weights]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a reproducible synthetic dataset (users, follows, posts, likes, threaded comments "
+        "and timelines) for benchmarks and load tests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--likes', type=int, default=100000, help='Total likes, Zipf-distributed over posts.')
+        parser.add_argument('--comments', type=int, default=50000, help='Total comments, Zipf-distributed over posts.')
+        parser.add_argument('--reply-ratio', type=float, default=0.6, help='Share of comments that are replies.')
+        parser.add_argument('--max-depth', type=int, default=4, help='Deepest reply level.')
+        parser.add_argument('--follows', type=int, default=30, help='Average accounts followed per user.')
+        parser.add_argument('--timeline-depth', type=int, default=20,
+                            help='Newest posts per followed author pushed into each timeline.')
+        parser.add_argument('--days', type=int, default=365, help='Period the posts are spread over.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; equal seeds give equal data.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--copy', action='store_true',
+                            help='Load likes, follows and timelines with COPY (PostgreSQL).')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated data first.')
+
+    def handle(self, *args, **options):
+        if options['copy'] and not can_copy():
+            raise CommandError("--copy needs PostgreSQL.")
+        if options['users'] < 2 and (options['likes'] or options['follows']):
+            raise CommandError("Need at least two users for likes and follows.")
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.batch_size = options['batch_size']
+        # Fixed epoch so equal seeds give byte-identical timestamps
+        self.end = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        self.start = self.end - timedelta(days=options['days'])
+
+        if options['clear']:
+            deleted, _ = User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            self.stdout.write(f"Deleted {deleted} rows of earlier bench data.")
+        elif User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError("Bench data already exists; pass --clear to replace it.")
+
+        users = self.create_users(options['users'])
+        followees = self.create_follows(users, options['follows'])
+        posts = self.create_posts(users, options['posts'])
+        self.create_likes(users, posts, options['likes'])
+        self.create_comments(users, posts, options['comments'])
+        self.create_timelines(posts, followees, options['timeline_depth'])
+
+        call_command('recount_post_stats', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Bench data ready."))
+
+    def report(self, label, count):
+        self.stdout.write(f"{label}: {count}")
+
+    def timestamp(self, after=None):
+        start = after or self.start
+        return start + (self.end - start) * self.rng.random()
+
+    def words(self, low, high):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(self.rng.randint(low, high)))
+
+    def create_users(self, count):
+        seed = self.options['seed']
+        users = [
+            # '!' is an unusable password hash: bench users cannot log in
+            User(username=f'{USERNAME_PREFIX}{seed}_{i}', email=f'{USERNAME_PREFIX}{i}@example.com', password='!')
+            for i in range(count)
+        ]
+        with transaction.atomic():
+            User.objects.bulk_create(users, batch_size=self.batch_size)
+        ids = list(
+            User.objects.filter(username__startswith=f'{USERNAME_PREFIX}{seed}_').order_by('id').values_list('id', flat=True)
+        )
+        self.report("users", len(ids))
+        return ids
+
+    def create_follows(self, users, per_user):
+        """Popular accounts attract most followers; returns followee -> followers."""
+        weights = zipf_weights(len(users), 1.0)
+        followers = {user_id: [] for user_id in users}
+        rows = []
+        for follower in users:
+            wanted = min(len(users) - 1, max(0, int(self.rng.expovariate(1 / per_user)))) if per_user else 0
+            chosen = set()
+            while len(chosen) < wanted:
+                for followee in self.rng.choices(users, weights, k=wanted - len(chosen)):
+                    if followee != follower:
+                        chosen.add(followee)
+            for followee in chosen:
+                followers[followee].append(follower)
+                rows.append((follower, followee, self.timestamp()))
+
+        with transaction.atomic():
+            self.report("follows", self.insert(Follow, ('follower_id', 'followee_id', 'created_at'), rows))
+            User.objects.bulk_update(
+                [User(pk=followee, follower_count=len(fans)) for followee, fans in followers.items() if fans],
+                ['follower_count'],
+                batch_size=self.batch_size,
+            )
+        return followers
+
+    def create_posts(self, users, count):
+        """Returns (id, author_id, created_at) for every post, oldest first."""
+        weights = zipf_weights(len(users), 0.8)
+        authors = self.rng.choices(users, weights, k=count)
+        times = sorted(self.timestamp() for _ in range(count))
+        for start in range(0, count, self.batch_size):
+            with transaction.atomic():
+                bulk_insert([
+                    Post(
+                        author_id=authors[i],
+                        title=self.words(3, 9).capitalize(),
+                        content=self.words(20, 400),
+                        created_at=times[i],
+                        updated_at=times[i],
+                    )
+                    for i in range(start, min(count, start + self.batch_size))
+                ], batch_size=self.batch_size)
+        posts = list(
+            Post.objects.filter(author__username__startswith=f"{USERNAME_PREFIX}{self.options['seed']}_")
+            .order_by('created_at', 'id')
+            .values_list('id', 'author_id', 'created_at')
+        )
+        self.report("posts", len(posts))
+        return posts
+
+    def popularity(self, posts, total, cap):
+        """Per-post counts, Zipf-distributed over a shuffled order of posts."""
+        order = list(range(len(posts)))
+        self.rng.shuffle(order)
+        counts = spread(total, zipf_weights(len(posts), 0.9), cap)
+        return sorted(zip(order, counts))
+
+    def create_likes(self, users, posts, total):
+        def rows():
+            for index, count in self.popularity(posts, total, len(users)):
+                post_id, _, created_at = posts[index]
+                for user_id in self.rng.sample(users, count):
+                    yield (user_id, post_id, self.timestamp(created_at))
+
+        self.report("likes", self.insert_batches(Like, ('user_id', 'post_id', 'created_at'), rows()))
+
+    def create_comments(self, users, posts, total):
+        """
+        Comments are inserted one level at a time so replies can point at
+        their parent's id; root, depth and reply_count are set directly
+        since bulk_insert() skips Comment.save().
+        """
+        plan = self.popularity(posts, total, total)
+        created = 0
+        for start in range(0, len(plan), self.batch_size):
+            batch = [(posts[index], count) for index, count in plan[start:start + self.batch_size] if count]
+            with transaction.atomic():
+                created += self.create_threads(users, batch)
+        self.report("comments", created)
+
+    def create_threads(self, users, batch):
+        reply_ratio, max_depth = self.options['reply_ratio'], self.options['max_depth']
+        level = []
+        replies_left = {}
+        for (post_id, _, created_at), count in batch:
+            replies = int(count * reply_ratio) if max_depth else 0
+            replies_left[post_id] = replies
+            for _ in range(max(1, count - replies)):
+                level.append(Comment(
+                    post_id=post_id, user_id=self.rng.choice(users), content=self.words(3, 60),
+                    depth=0, created_at=self.timestamp(created_at),
+                ))
+
+        created = 0
+        depth = 0
+        while level:
+            for comment in level:
+                comment.updated_at = comment.created_at
+            bulk_insert(level, batch_size=self.batch_size)
+            created += len(level)
+            depth += 1
+            if depth > max_depth:
+                break
+            # Each remaining reply answers a random comment of the level above.
+            by_post = {}
+            for comment in level:
+                by_post.setdefault(comment.post_id, []).append(comment)
+            next_level = []
+            for post_id, parents in by_post.items():
+                share = replies_left[post_id] if depth == max_depth else self.rng.randint(0, replies_left[post_id])
+                replies_left[post_id] -= share
+                for _ in range(share):
+                    parent = self.rng.choice(parents)
+                    root_id = parent.root_id or parent.pk
+                    next_level.append(Comment(
+                        post_id=post_id, user_id=self.rng.choice(users), content=self.words(3, 40),
+                        parent_id=parent.pk, root_id=root_id, depth=depth,
+                        created_at=self.timestamp(parent.created_at),
+                    ))
+            level = next_level
+
+        if depth > 1:
+            # One UPDATE for the batch; every thread of its posts was created above.
+            replies = (
+                Comment.objects.filter(root=OuterRef('pk'))
+                .order_by().values('root').annotate(n=Count('pk')).values('n')
+            )
+            Comment.objects.filter(post_id__in=[post_id for (post_id, _, _), _ in batch], parent__isnull=True).update(
+                reply_count=Coalesce(Subquery(replies), 0)
+            )
+        return created
+
+    def create_timelines(self, posts, followers, depth):
+        """Push each author's newest posts to their followers, as fan-out on write would."""
+        threshold = settings.POSTS_FANOUT_THRESHOLD
+        by_author = {}
+        for post_id, author_id, created_at in reversed(posts):
+            by_author.setdefault(author_id, []).append((post_id, created_at))
+
+        def rows():
+            for author_id, authored in by_author.items():
+                fans = followers.get(author_id, [])
+                recipients = [author_id] + (fans if len(fans) < threshold else [])
+                for post_id, created_at in authored[:depth]:
+                    for user_id in recipients:
+                        yield (user_id, post_id, created_at)
+
+        self.report("timeline entries", self.insert_batches(TimelineEntry, ('user_id', 'post_id', 'created_at'), rows()))
+
+    def insert(self, model, fields, rows):
+        return insert_rows(model, fields, rows, use_copy=self.options['copy'], batch_size=self.batch_size)
+
+    def insert_batches(self, model, fields, rows):
+        inserted = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size * 10:
+                with transaction.atomic():
+                    inserted += self.insert(model, fields, batch)
+                batch = []
+        if batch:
+            with transaction.atomic():
+                inserted += self.insert(model, fields, batch)
+        return inserted
@@ -0,0 +1,104 @@
+import statistics
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test.utils import override_settings
+
+from posts.models import Like, Post, User
+from posts.services.counters import adjust_like_counts, flush_like_counts
+
+LOCK_WAITS_SQL = "SELECT count(*) FROM pg_locks WHERE NOT granted AND locktype IN ('transactionid', 'tuple')"
+
+
+class Command(BaseCommand):
+    help = (
+        "Like one post from many users concurrently, once with direct and once with buffered "
+        "counters, and report latency and row-lock waits (PostgreSQL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--likes', type=int, default=500, help='Distinct users liking the post.')
+        parser.add_argument('--threads', type=int, default=16, help='Concurrent writers.')
+        parser.add_argument('--mode', choices=['direct', 'buffered'], action='append', help='Repeatable; default both.')
+
+    def handle(self, *args, **options):
+        for mode in options['mode'] or ['direct', 'buffered']:
+            result = self.stress(mode, options['likes'], options['threads'])
+            waits = 'n/a' if result['lock_waits'] is None else result['lock_waits']
+            self.stdout.write(
+                f"{mode:>8}: {result['likes']} likes in {result['seconds']:.2f}s, "
+                f"p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms, "
+                f"lock waits sampled={waits}, like_count={result['like_count']}"
+            )
+
+    def stress(self, mode, likes, threads):
+        """Run one round against a throwaway post and users; returns the measurements."""
+        tag = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create(
+            [User(username=f'stress-{tag}-{i}', password='!') for i in range(likes)]
+        )
+        author = users[0]
+        post = Post.objects.create(title=f'stress {tag}', content='stress', author=author)
+        try:
+            with override_settings(POSTS_LIKE_COUNTER=mode):
+                # Check the flusher in so buffering() holds for the whole run.
+                flush_like_counts()
+                result = self._run(post, users, threads)
+                flush_like_counts()
+            result['like_count'] = Post.objects.values_list('like_count', flat=True).get(pk=post.pk)
+            return result
+        finally:
+            post.delete()
+            User.objects.filter(username__startswith=f'stress-{tag}-').delete()
+
+    def _run(self, post, users, threads):
+        latencies = []
+        done = threading.Event()
+        waits = [0] if connection.vendor == 'postgresql' else None
+
+        def writer(chunk):
+            try:
+                for user in chunk:
+                    started = time.perf_counter()
+                    with transaction.atomic():
+                        Like.objects.create(user=user, post=post)
+                        adjust_like_counts([post.pk], 1)
+                    latencies.append(time.perf_counter() - started)
+            finally:
+                connections.close_all()
+
+        def sampler():
+            try:
+                with connection.cursor() as cursor:
+                    while not done.is_set():
+                        cursor.execute(LOCK_WAITS_SQL)
+                        waits[0] += cursor.fetchone()[0]
+                        time.sleep(0.002)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=writer, args=(users[i::threads],)) for i in range(threads)]
+        watcher = threading.Thread(target=sampler) if waits is not None else None
+        if watcher:
+            watcher.start()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        if watcher:
+            watcher.join()
+
+        latencies.sort()
+        return {
+            'likes': len(latencies),
+            'seconds': elapsed,
+            'p50_ms': statistics.median(latencies) * 1000,
+            'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+            'lock_waits': waits[0] if waits is not None else None,
+        }
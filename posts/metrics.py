@@ -0,0 +1,161 @@
+import hashlib
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from posts.cache import get_cache
+
+# Upper bounds, in milliseconds, of the per-route latency histogram buckets
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Number of routes registered; route n is stored under _route_key(n).
+ROUTES_KEY = 'posts:metrics:routes'
+
+_IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+
+def fingerprint(sql):
+    """Stable id for a statement, ignoring how many values an IN list has."""
+    return hashlib.md5(_IN_LIST.sub('(...)', sql).encode()).hexdigest()[:12]
+
+
+class QueryRecorder:
+    """`connection.execute_wrapper` that counts and times every statement."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            key = fingerprint(sql)
+            self.fingerprints[key] += 1
+            self.statements.setdefault(key, sql)
+
+    def duplicates(self, limit=3):
+        """The statements run more than once, most repeated first."""
+        return [
+            {'fingerprint': key, 'count': count, 'sql': self.statements[key][:200]}
+            for key, count in self.fingerprints.most_common(limit)
+            if count > 1
+        ]
+
+
+@contextmanager
+def timed(request, name):
+    """
+    Add the time spent in the block to `request`'s `name` timer, when the
+    request is sampled by RequestMetricsMiddleware.
+    """
+    timers = getattr(request, '_metrics', None)
+    if timers is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timers[name] += time.perf_counter() - started
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    return f"{request.method} /{match.route}" if match is not None else f"{request.method} <unresolved>"
+
+
+def _key(route, name):
+    return f'posts:metrics:{hashlib.md5(route.encode()).hexdigest()[:16]}:{name}'
+
+
+def _route_key(n):
+    return f'posts:metrics:route:{n}'
+
+
+def _next(cache, key):
+    """Atomically increment `key`, creating it if needed; returns the new value."""
+    while True:
+        if cache.add(key, 1, timeout=None):
+            return 1
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr(); try again.
+            continue
+
+
+def _add(cache, key, amount):
+    if not cache.add(key, amount, timeout=None):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            pass
+
+
+def observe(route, duration_ms, queries):
+    """Add one request to `route`'s histogram in the shared cache."""
+    cache = get_cache()
+    bucket = next((bound for bound in BUCKETS_MS if duration_ms <= bound), 'inf')
+    _add(cache, _key(route, 'count'), 1)
+    _add(cache, _key(route, 'us'), int(duration_ms * 1000))
+    _add(cache, _key(route, 'queries'), queries)
+    _add(cache, _key(route, f'le_{bucket}'), 1)
+
+    # The first request of a route takes the next slot; concurrent first
+    # requests of other routes can't overwrite each other's entry.
+    if cache.add(_key(route, 'registered'), 1, timeout=None):
+        cache.set(_route_key(_next(cache, ROUTES_KEY)), route, timeout=None)
+
+
+def get_routes(cache):
+    count = cache.get(ROUTES_KEY, 0)
+    return sorted(set(cache.get_many([_route_key(n) for n in range(1, count + 1)]).values()))
+
+
+def _quantile(buckets, count, q):
+    seen = 0
+    for bound, hits in buckets.items():
+        seen += hits
+        if seen >= q * count:
+            return bound
+    return 'inf'
+
+
+def get_histograms():
+    """
+    `{route: {...}}` with request count, mean latency and queries, bucket
+    counts and p50/p99 upper bounds read off the buckets.
+    """
+    cache = get_cache()
+    bounds = [*BUCKETS_MS, 'inf']
+    histograms = {}
+    for route in get_routes(cache):
+        names = ['count', 'us', 'queries'] + [f'le_{bound}' for bound in bounds]
+        values = cache.get_many([_key(route, name) for name in names])
+        stats = {name: values.get(_key(route, name), 0) for name in names}
+        count = stats['count']
+        if not count:
+            continue
+        buckets = {str(bound): stats[f'le_{bound}'] for bound in bounds}
+        histograms[route] = {
+            'count': count,
+            'mean_ms': round(stats['us'] / count / 1000, 2),
+            'mean_queries': round(stats['queries'] / count, 2),
+            'p50_ms_le': _quantile(buckets, count, 0.5),
+            'p99_ms_le': _quantile(buckets, count, 0.99),
+            'buckets_ms': buckets,
+        }
+    return histograms
+
+
+def reset_histograms():
+    cache = get_cache()
+    names = ['count', 'us', 'queries', 'registered'] + [f'le_{bound}' for bound in (*BUCKETS_MS, 'inf')]
+    slots = [_route_key(n) for n in range(1, cache.get(ROUTES_KEY, 0) + 1)]
+    cache.delete_many([_key(route, name) for route in get_routes(cache) for name in names] + slots + [ROUTES_KEY])
@@ -0,0 +1,176 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+from posts import metrics, routers
+
+logger = logging.getLogger('posts.metrics')
+
+
+class RequestMetricsMiddleware:
+    """
+    For a sample of requests (POSTS_METRICS_SAMPLE_RATE), record the query
+    count, DB time, repeated statements, serializer and render time and
+    response size.
+
+    Each sampled request gets a `Server-Timing` header, one JSON log line
+    on the `posts.metrics` logger (WARNING when slow or when a statement
+    repeats POSTS_METRICS_DUPLICATE_THRESHOLD times, a likely N+1), and a
+    sample in its route's histogram (see posts/metrics.py). Unsampled
+    requests pay for one random() call.
+
+    Serialize time covers the list and detail views turning rows into
+    response data (see metrics.timed()), sync or async; render time covers
+    turning that data into bytes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        rate = settings.POSTS_METRICS_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def record_queries(self, recorder):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        recorder = metrics.QueryRecorder()
+        request._metrics = {'serialize': 0.0, 'render': 0.0}
+        started = time.perf_counter()
+        with self.record_queries(recorder):
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        self.report(request, response, recorder, total)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+
+        recorder = metrics.QueryRecorder()
+        request._metrics = {'serialize': 0.0, 'render': 0.0}
+        started = time.perf_counter()
+        # Connections are per thread, and the ORM runs in the request's
+        # thread-sensitive sync thread, not on the event loop: install the
+        # wrappers on that thread's connections.
+        recording = await sync_to_async(self.record_queries, thread_sensitive=True)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(recording.close, thread_sensitive=True)()
+        total = time.perf_counter() - started
+
+        # Logging and the histogram update talk to the cache backend.
+        await sync_to_async(self.report)(request, response, recorder, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Runs right before DRF/template responses are rendered.
+        if hasattr(request, '_metrics'):
+            started = time.perf_counter()
+
+            def rendered(response):
+                request._metrics['render'] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, recorder, total):
+        route = metrics.route_of(request)
+        duplicates = recorder.duplicates()
+        record = {
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(total * 1000, 2),
+            'db_ms': round(recorder.duration * 1000, 2),
+            'serialize_ms': round(request._metrics['serialize'] * 1000, 2),
+            'render_ms': round(request._metrics['render'] * 1000, 2),
+            'queries': recorder.count,
+            'duplicates': duplicates,
+            'bytes': None if response.streaming else len(response.content),
+        }
+
+        if settings.POSTS_METRICS_SERVER_TIMING:
+            timings = [
+                f'db;dur={record["db_ms"]};desc="{recorder.count} queries"',
+                f'serialize;dur={record["serialize_ms"]}',
+                f'render;dur={record["render_ms"]}',
+                f'app;dur={record["duration_ms"]}',
+            ]
+            if duplicates:
+                timings.append(f'dup;desc="{duplicates[0]["count"]}x {duplicates[0]["fingerprint"]}"')
+            response['Server-Timing'] = ', '.join(timings)
+
+        slow = record['duration_ms'] >= settings.POSTS_METRICS_SLOW_MS
+        repeated = bool(duplicates) and duplicates[0]['count'] >= settings.POSTS_METRICS_DUPLICATE_THRESHOLD
+        logger.log(logging.WARNING if slow or repeated else logging.INFO, json.dumps(record), extra={'metrics': record})
+        metrics.observe(route, record['duration_ms'], recorder.count)
+
+
+class RequestRoutingMiddleware:
+    """
+    Read from a replica (settings.DATABASE_REPLICAS) for safe-method
+    requests to the posts views; see posts/routers.py.
+
+    After an authenticated user writes, their reads stay on the primary for
+    POSTS_REPLICA_STICKY_SECONDS, so they see their own post or comment
+    straight away whatever the replication lag.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = routers.RequestRouting(request)
+        token = routers.activate(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        if routing.wrote:
+            self.pin_writer(request)
+        return response
+
+    async def __acall__(self, request):
+        routing = routers.RequestRouting(request)
+        token = routers.activate(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        if routing.wrote:
+            # request.user may still be a lazy session lookup
+            await sync_to_async(self.pin_writer)(request)
+        return response
+
+    def pin_writer(self, request):
+        user = getattr(request, 'user', None)
+        if settings.DATABASE_REPLICAS and user is not None and user.is_authenticated:
+            routers.pin_to_primary(user.pk)
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_threads(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+
+    # Walk the trees one level at a time, starting with direct replies.
+    Comment.objects.filter(parent__isnull=False, parent__parent__isnull=True).update(root=F('parent'), depth=1)
+    parent_root = Comment.objects.filter(pk=OuterRef('parent_id')).values('root_id')
+    depth = 1
+    while Comment.objects.filter(parent__depth=depth, parent__parent__isnull=False).update(
+        root_id=Subquery(parent_root), depth=depth + 1
+    ):
+        depth += 1
+
+    replies = (
+        Comment.objects.filter(root=OuterRef('pk'))
+        .order_by().values('root').annotate(n=Count('pk')).values('n')
+    )
+    Comment.objects.filter(parent__isnull=True).update(reply_count=Coalesce(Subquery(replies), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_follow_timeline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='thread_comments', to='posts.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['root', 'created_at', 'id'], name='comment_root_created_idx'),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
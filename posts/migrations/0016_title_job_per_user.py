@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_soft_delete'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='titlesuggestionjob',
+            name='unique_active_title_job',
+        ),
+        migrations.AddConstraint(
+            model_name='titlesuggestionjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'failed'), _negated=True), fields=('requested_by', 'content_hash'), name='unique_active_title_job'),
+        ),
+    ]
@@ -1,11 +1,69 @@
-from django.db import models
+import uuid
+
+from django.db import DEFAULT_DB_ALIAS, models
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 
 class User(AbstractUser):
     # Future profile fields: bio, avatar, etc.
-    pass
+    following = models.ManyToManyField(
+        'self',
+        through='Follow',
+        through_fields=('follower', 'followee'),
+        symmetrical=False,
+        related_name='followers'
+    )
+    # Denormalized; decides fan-out-on-write vs fan-out-on-read for new posts
+    follower_count = models.PositiveIntegerField(default=0)
+    # Set by posts.services.purge.soft_delete_user; `manage.py purge_deleted`
+    # removes the account and everything it owns later.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+
+class TokenUser(User):
+    """
+    The user of a JWT-authenticated request, built from the token's claims
+    (see posts/authentication.py) with only `id`, `username` and
+    `is_active` loaded. Any other field is copied from the in-process user
+    cache on first access instead of costing a query per field; save()
+    writes only the fields that were loaded.
+    """
+
+    class Meta:
+        proxy = True
+
+    CLAIM_FIELDS = ('id', 'username', 'is_active')
+
+    @classmethod
+    def from_claims(cls, user_id, username, is_active):
+        return cls.from_db(DEFAULT_DB_ALIAS, cls.CLAIM_FIELDS, (user_id, username, is_active))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        concrete = {field.attname for field in self._meta.concrete_fields}
+        if fields is None or from_queryset is not None or not set(fields) <= concrete:
+            return super().refresh_from_db(using, fields, from_queryset)
+        from posts.authentication import user_cache
+
+        user = user_cache.get(self.pk)
+        for name in fields:
+            setattr(self, name, getattr(user, name))
+
+
+class PostManager(models.Manager):
+    def __init__(self, include_deleted=False):
+        super().__init__()
+        self.include_deleted = include_deleted
+
+    def get_queryset(self):
+        # The search vector is only ever read by the database itself.
+        queryset = super().get_queryset().defer('search_vector')
+        if self.include_deleted:
+            return queryset
+        # Soft-deleted posts stay hidden until `manage.py purge_deleted` removes them.
+        return queryset.filter(deleted_at__isnull=True)
 
 
 class Post(models.Model):
@@ -17,11 +75,38 @@ class Post(models.Model):
         related_name='posts'
     )
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)
+    # Resized WebP/AVIF renditions of `image`, built by posts.services.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Denormalized counters, kept in sync with F() updates by the like/comment
+    # views. Run `manage.py recount_post_stats` to repair any drift.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Weighted title (A) + content (B) tsvector, maintained by a database
+    # trigger on PostgreSQL (see migration 0008).
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # See posts.services.purge: set on delete, the row goes later.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = PostManager()
+    all_objects = PostManager(include_deleted=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Backs keyset pagination of the post feeds
+            models.Index(fields=['created_at', 'id'], name='post_created_id_idx'),
+            # Per-author feeds: WHERE author_id = ? ORDER BY created_at
+            models.Index(fields=['author', 'created_at', 'id'], name='post_author_created_idx'),
+            GinIndex(fields=['search_vector'], name='post_search_vector_idx'),
+            # Purge queue: only the few soft-deleted rows are indexed
+            models.Index(
+                fields=['deleted_at'],
+                condition=models.Q(deleted_at__isnull=False),
+                name='post_deleted_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -43,6 +128,10 @@ class Like(models.Model):
         constraints = [
             models.UniqueConstraint(fields=['user', 'post'], name='unique_like')
         ]
+        indexes = [
+            # unique_like leads with user; lookups scoped to a post need post first
+            models.Index(fields=['post', 'user'], name='like_post_user_idx'),
+        ]
         ordering = ['-created_at']
 
     def __str__(self):
@@ -68,11 +157,185 @@ class Comment(models.Model):
         blank=True,
         related_name='replies'
     )
+    # Materialized thread position: the top-level comment a reply belongs to
+    # (NULL for top-level comments) and its nesting level below it.
+    root = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        editable=False,
+        related_name='thread_comments'
+    )
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Replies anywhere in this thread; only maintained on top-level comments
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Whole threads: WHERE root_id IN (...) ORDER BY created_at
+            models.Index(fields=['root', 'created_at', 'id'], name='comment_root_created_idx'),
+            # Backs keyset pagination of a post's comments
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_id_idx'),
+            # Top-level threads only; replies are reached through parent_id
+            models.Index(
+                fields=['post', 'created_at', 'id'],
+                condition=models.Q(parent__isnull=True),
+                name='comment_post_toplevel_idx',
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.parent_id is not None:
+            parent = self.parent
+            self.root_id = parent.root_id or parent.pk
+            self.depth = parent.depth + 1
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Comment by {self.user} on {self.post}"
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='following_links'
+    )
+    followee = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='follower_links'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='unique_follow'),
+            models.CheckConstraint(condition=~models.Q(follower=models.F('followee')), name='no_self_follow'),
+        ]
+        indexes = [
+            # Fan-out: all followers of an author
+            models.Index(fields=['followee', 'follower'], name='follow_followee_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower} follows {self.followee}"
+
+
+class TimelineEntry(models.Model):
+    """A post pushed into one user's precomputed home timeline."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        db_index=False  # covered by timeline_user_created_idx
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    # Copy of post.created_at, so reading a timeline never touches posts_post
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_timeline_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'post'], name='timeline_user_created_idx'),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.post} in {self.user}'s timeline"
+
+
+class TitleSuggestionJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    content = models.TextField()
+    # sha256 of model + content; a user's identical drafts share one job
+    content_hash = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    suggestions = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    callback_url = models.URLField(blank=True)
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='title_jobs'
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['requested_by', 'content_hash'],
+                condition=~models.Q(status='failed'),
+                name='unique_active_title_job',
+            )
+        ]
+        indexes = [
+            # Worker claim query: WHERE status = 'pending' ORDER BY created_at
+            models.Index(fields=['status', 'created_at'], name='titlejob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Title job {self.id} ({self.status})"
+
+
+class ImportCheckpoint(models.Model):
+    """How far `manage.py import_content` got through one input file."""
+    source = models.CharField(max_length=100)
+    path = models.CharField(max_length=500)
+    # Bytes of the (decompressed) input committed so far; a rerun resumes here
+    offset = models.BigIntegerField(default=0)
+    lines = models.BigIntegerField(default=0)
+    counts = models.JSONField(default=dict, blank=True)
+    done = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'path'], name='unique_import_checkpoint')
+        ]
+
+    def __str__(self):
+        return f"{self.source}: {self.path} at line {self.lines}"
+
+
+class ImportedObject(models.Model):
+    """The post or comment a record from another platform was imported as."""
+
+    class Kind(models.TextChoices):
+        POST = 'post', 'Post'
+        COMMENT = 'comment', 'Comment'
+
+    source = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    source_id = models.CharField(max_length=64)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'kind', 'source_id'], name='unique_imported_object')
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.kind} {self.source_id} -> {self.object_id}"
@@ -0,0 +1,197 @@
+import base64
+import json
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Cursor pagination keyed on (created_at, id).
+
+    Each page is fetched with a `WHERE (created_at, id) < (cursor)` range
+    condition instead of an OFFSET, so deep pages cost the same as the first
+    one. The cursor token is an opaque url-safe base64 string.
+
+    A queryset explicitly ordered by other keys ending in a unique `id`
+    (e.g. search results ordered by rank) is paged on those keys instead.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, fetching through the async ORM."""
+        queryset = self.page_queryset(queryset, request)
+        return self.set_page([obj async for obj in queryset])
+
+    def page_queryset(self, queryset, request):
+        """The unevaluated query for the requested page, plus one row to detect a next page."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_ordering(queryset)
+
+        self.cursor = self.decode_cursor(request, queryset)
+        # A "previous" cursor walks the key range backwards, then flips back.
+        self.reverse = bool(self.cursor and self.cursor['r'])
+        ordering = [self.flip(key) for key in self.keys] if self.reverse else list(self.keys)
+
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(self.keyset_filter(ordering, self.cursor['v']))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.page = results
+        self.has_next = has_more if not self.reverse else self.cursor is not None
+        self.has_previous = self.cursor is not None if not self.reverse else has_more
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        order_by = tuple(queryset.query.order_by)
+        if order_by and all(isinstance(key, str) for key in order_by) \
+                and order_by[-1].lstrip('-') == 'id':
+            return order_by
+        # Otherwise follow the direction of Meta.ordering or OrderingFilter.
+        order_by = order_by or tuple(queryset.model._meta.ordering)
+        if order_by and order_by[0] == 'created_at':
+            return ('created_at', 'id')
+        return self.ordering
+
+    @staticmethod
+    def flip(key):
+        return key[1:] if key.startswith('-') else f'-{key}'
+
+    def keyset_filter(self, ordering, values):
+        # Row-value comparison spelled out: (a > x) OR (a = x AND b > y) ...
+        condition = Q()
+        for i, key in enumerate(ordering):
+            name = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_key, prev_value in zip(ordering[:i], values[:i]):
+                step &= Q(**{prev_key.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, instance, reverse):
+        values = [getattr(instance, key.lstrip('-')) for key in self.keys]
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+        payload = {'v': values, 'r': int(reverse)}
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+        return replace_query_param(self.base_url, self.cursor_query_param, token.decode().rstrip('='))
+
+    def decode_cursor(self, request, queryset):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            token += '=' * (-len(token) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+            values = payload['v']
+            if len(values) != len(self.keys):
+                raise ValueError('cursor does not match ordering')
+            return {
+                'v': [self.to_python(queryset.model, key, value) for key, value in zip(self.keys, values)],
+                'r': bool(payload.get('r', 0)),
+            }
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def to_python(self, model, key, value):
+        try:
+            field = model._meta.get_field(key.lstrip('-'))
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are plain JSON numbers.
+            if not isinstance(value, (int, float)):
+                raise ValueError(f'invalid cursor value for {key}')
+            return value
+        return field.to_python(value)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class TimelinePagination(KeysetCursorPagination):
+    """
+    Forward-only keyset pagination for feeds merged from several sources.
+
+    The view supplies rows through `get_page(cursor, limit)`, where `cursor`
+    is a `(created_at, id)` pair or None.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.ordering
+        self.reverse = False
+
+        cursor = self.decode_cursor(request, queryset)
+        if cursor is not None and cursor['r']:
+            raise NotFound(self.invalid_cursor_message)
+
+        results = view.get_page(tuple(cursor['v']) if cursor else None, self.page_size + 1)
+        self.has_next = len(results) > self.page_size
+        self.has_previous = False
+        self.page = results[:self.page_size]
+        return self.page
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # get_page() merges several sources in sync service code.
+        return await sync_to_async(self.paginate_queryset)(queryset, request, view)
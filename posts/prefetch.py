@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django.db.models import Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
+
+from .models import Comment, Like
+
+
+def latest_comments_prefetch(limit=3, to_attr='recent_comments', lookup='comments'):
+    """
+    Prefetch the newest `limit` comments of *each* post in a single query.
+
+    Comments are ranked with ROW_NUMBER() OVER (PARTITION BY post_id) and
+    only the top rows are kept, so the cost stays one query per page no
+    matter how many posts it holds. The comment author is joined in;
+    comments of soft-deleted accounts are left out.
+    """
+    queryset = (
+        Comment.objects
+        .filter(user__deleted_at__isnull=True)
+        .select_related('user')
+        .annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('post_id')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            )
+        )
+        .filter(row_number__lte=limit)
+        .order_by('post_id', '-created_at', '-id')
+    )
+    return Prefetch(lookup, queryset=queryset, to_attr=to_attr)
+
+
+def with_liked_by(queryset, user):
+    """
+    Annotate posts with `liked_by_me` for `user` through one EXISTS
+    subquery on the unique (user, post) index. Anonymous users get nothing
+    annotated; serializers then report False.
+    """
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        liked_by_me=Exists(Like.objects.filter(post=OuterRef('pk'), user=user))
+    )
+
+
+def attach_comment_threads(roots, max_depth):
+    """
+    Load the replies of every top-level comment in `roots` in one query and
+    hang them off each comment as `thread_replies`, oldest first.
+
+    Only replies up to `max_depth` levels below their root are loaded.
+    Replies of soft-deleted accounts are left out, and with them the
+    replies below them. The tree is assembled in a single O(n) pass over
+    the rows.
+    """
+    children = defaultdict(list)
+    if roots and max_depth > 0:
+        replies = (
+            Comment.objects
+            .filter(root__in=[root.pk for root in roots], depth__lte=max_depth, user__deleted_at__isnull=True)
+            .select_related('user')
+            .order_by('created_at', 'id')
+        )
+        for reply in replies:
+            children[reply.parent_id].append(reply)
+
+    stack = list(roots)
+    while stack:
+        comment = stack.pop()
+        comment.thread_replies = children.get(comment.pk, [])
+        stack.extend(comment.thread_replies)
+    return roots
@@ -0,0 +1,138 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from posts import cache
+
+# Routing for the request being handled; None outside RequestRoutingMiddleware.
+_routing = ContextVar('posts_db_routing', default=None)
+_undecided = object()
+
+
+class RequestRouting:
+    """
+    Where one request reads from, and whether it has written yet.
+
+    The replica is picked on the first read after URL resolution, once the
+    view is known: only safe-method requests to the posts views whose user
+    hasn't written within POSTS_REPLICA_STICKY_SECONDS get one.
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.wrote = False
+        self._replica = _undecided if request is not None else None
+
+    @property
+    def replica(self):
+        if self._replica is _undecided:
+            if getattr(self.request, 'resolver_match', None) is None:
+                return None
+            self._replica = self.choose()
+        return self._replica
+
+    @replica.setter
+    def replica(self, alias):
+        self._replica = alias
+
+    def choose(self):
+        request = self.request
+        if not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS:
+            return None
+        view = request.resolver_match.func
+        if getattr(view, 'view_class', view).__module__ != 'posts.views':
+            return None
+        if is_pinned(token_user_id(request)):
+            return None
+        return choose_replica()
+
+
+def activate(routing):
+    return _routing.set(routing)
+
+
+def deactivate(token):
+    _routing.reset(token)
+
+
+def current():
+    return _routing.get()
+
+
+def choose_replica():
+    replicas = settings.DATABASE_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+def read_primary_after(version):
+    """
+    Send the rest of the request's reads to the primary if `version` (a
+    posts.cache version, i.e. the time of the last write to what is being
+    read) is less than POSTS_REPLICA_STICKY_SECONDS old. A lagging replica
+    would return the rows from before that write, and they would be cached
+    and tagged under the new version until the next one.
+    """
+    routing = _routing.get()
+    if routing is not None and time.time_ns() - version < settings.POSTS_REPLICA_STICKY_SECONDS * 1_000_000_000:
+        routing.replica = None
+
+
+def _pin_key(user_id):
+    return f'posts:db:pinned:{user_id}'
+
+
+def pin_to_primary(user_id):
+    """Send `user_id`'s reads to the primary until replicas have caught up."""
+    cache.get_cache().set(_pin_key(user_id), True, timeout=settings.POSTS_REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user_id):
+    return user_id is not None and bool(cache.get_cache().get(_pin_key(user_id)))
+
+
+def token_user_id(request):
+    """The user id in the request's JWT, checked without a query; None if absent or invalid."""
+    jwt = JWTAuthentication()
+    header = jwt.get_header(request)
+    try:
+        raw = jwt.get_raw_token(header) if header is not None else None
+        if raw is None:
+            return None
+        return jwt.get_validated_token(raw).get(api_settings.USER_ID_CLAIM)
+    except AuthenticationFailed:
+        return None
+
+
+class ReplicaRouter:
+    """
+    Send reads to the replica chosen for the current request, if any (see
+    RequestRouting). Everything else (writes, management commands, other
+    apps) uses `default`. A write during a replica request sends the rest
+    of that request back to the primary too.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or routing.wrote:
+            return None
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        # Explicitly, or saving an instance read from a replica would write there.
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
@@ -1,6 +1,14 @@
 from rest_framework import serializers
-from .models import User, Post, Like, Comment
+from .models import User, Post, Like, Comment, TitleSuggestionJob
+from .services.images import VARIANT_FORMATS
+from .services.jobs import callback_allowed
 from django.contrib.auth.password_validation import validate_password
+from django.core.files.storage import default_storage
+from django.utils.text import Truncator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+# Characters of `content` shown in a post's `excerpt`, ellipsis included
+EXCERPT_LENGTH = 200
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -27,13 +35,120 @@ class RegisterSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
-class PostSerializer(serializers.ModelSerializer):
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Signs the user's `username` and `is_active` into the tokens, so
+    StatelessJWTAuthentication can authenticate without loading the user.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['username'] = user.username
+        token['is_active'] = user.is_active
+        return token
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Renders `Post.image_variants` as URLs, either per variant
+    (`{'thumbnail': {'width': 320, 'webp': url, ...}, ...}`) or, with
+    `srcset=True`, as one `srcset` string per format.
+    """
+
+    def __init__(self, srcset=False, **kwargs):
+        self.srcset = srcset
+        super().__init__(**kwargs)
+
+    def url(self, path):
+        url = default_storage.url(path)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def to_representation(self, value):
+        variants = {name: data for name, data in (value or {}).items() if isinstance(data, dict)}
+        if not self.srcset:
+            return {
+                name: {key: (self.url(item) if key in VARIANT_FORMATS else item) for key, item in data.items()}
+                for name, data in variants.items()
+            }
+        return {
+            fmt: ', '.join(f"{self.url(data[fmt])} {data['width']}w" for data in variants.values() if fmt in data)
+            for fmt in VARIANT_FORMATS
+            if any(fmt in data for data in variants.values())
+        }
+
+
+class SparseFieldsetMixin:
+    """
+    Let GET requests choose fields with `?fields=a,b` or drop them with
+    `?exclude=a,b`. `load_columns()` then names the model columns the
+    remaining fields read, for `QuerySet.only()`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        keep = self.sparse_fieldset(request.query_params)
+        for name in set(self.fields) - keep:
+            self.fields.pop(name)
+
+    def sparse_fieldset(self, params):
+        available = set(self.fields)
+        keep = available
+        for param in ('fields', 'exclude'):
+            names = {name.strip() for name in params.get(param, '').split(',') if name.strip()}
+            unknown = names - available
+            if unknown:
+                raise serializers.ValidationError({param: f"Unknown field(s): {', '.join(sorted(unknown))}"})
+            if names:
+                keep = keep & names if param == 'fields' else keep - names
+        return keep
+
+    def load_columns(self):
+        concrete = {field.name for field in self.Meta.model._meta.concrete_fields}
+        columns = set()
+        for field in self.fields.values():
+            if isinstance(field, serializers.Serializer):
+                # Nested object, joined through select_related()
+                columns.add(field.source)
+                columns.update(f'{field.source}__{child.source}' for child in field.fields.values())
+            elif field.source in concrete:
+                columns.add(field.source)
+        return columns
+
+
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
-    likes_count = serializers.IntegerField(read_only=True)
+    excerpt = serializers.SerializerMethodField()
+    likes_count = serializers.IntegerField(source='like_count', read_only=True)
+    image_variants = ImageVariantsField()
+    image_srcset = ImageVariantsField(srcset=True, source='image_variants')
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'title', 'content', 'author', 'image', 'likes_count', 'created_at']
+        fields = [
+            'id', 'title', 'content', 'excerpt', 'author', 'image', 'image_variants', 'image_srcset',
+            'likes_count', 'liked_by_me', 'created_at',
+        ]
+
+    def get_excerpt(self, obj):
+        return get_excerpt(obj)
+
+    def get_liked_by_me(self, obj):
+        # Annotated by with_liked_by(); absent for anonymous requests
+        return getattr(obj, 'liked_by_me', False)
+
+
+def get_excerpt(post):
+    # Views that defer `content` annotate just its head as `content_head`
+    text = getattr(post, 'content_head', None)
+    if text is None:
+        text = post.content
+    return Truncator(text).chars(EXCERPT_LENGTH)
 
 class LikeSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -49,8 +164,26 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'user', 'content', 'created_at']
-        read_only_fields = ['id', 'post', 'user', 'created_at']  
+        fields = ['id', 'post', 'user', 'parent', 'content', 'depth', 'reply_count', 'created_at']
+        read_only_fields = ['id', 'post', 'user', 'depth', 'reply_count', 'created_at']  
+
+    def validate_parent(self, value):
+        view = self.context.get('view')
+        if value is not None and view is not None and str(value.post_id) != str(view.kwargs.get('post_id')):
+            raise serializers.ValidationError("Parent comment belongs to a different post.")
+        return value
+
+
+class CommentThreadSerializer(CommentSerializer):
+    replies = serializers.SerializerMethodField()
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['replies']
+
+    def get_replies(self, obj):
+        # Filled in by attach_comment_threads(); never queries per comment
+        replies = getattr(obj, 'thread_replies', [])
+        return CommentThreadSerializer(replies, many=True, context=self.context).data
 
 
 class CommentPreviewSerializer(serializers.ModelSerializer):
@@ -60,11 +193,15 @@ class CommentPreviewSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ['id', 'user', 'content', 'created_at']
 
-class PostWithStatsSerializer(serializers.ModelSerializer):
+class PostWithStatsSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
+    excerpt = serializers.SerializerMethodField()
     like_count = serializers.IntegerField(read_only=True)
     comment_count = serializers.IntegerField(read_only=True)
     recent_comments = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
+    image_srcset = ImageVariantsField(srcset=True, source='image_variants')
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
@@ -72,14 +209,60 @@ class PostWithStatsSerializer(serializers.ModelSerializer):
             'id',
             'title',
             'content',
+            'excerpt',
             'author',
             'image',          
+            'image_variants',
+            'image_srcset',
             'like_count',
             'comment_count',
+            'liked_by_me',
             'recent_comments',
         ]
 
+    def get_excerpt(self, obj):
+        return get_excerpt(obj)
+
+    def get_liked_by_me(self, obj):
+        return getattr(obj, 'liked_by_me', False)
+
     def get_recent_comments(self, obj):
-        comments = obj.comments.order_by('-created_at')[:3]
+        # Use the per-post prefetch from latest_comments_prefetch() when present
+        comments = getattr(obj, 'recent_comments', None)
+        if comments is None:
+            comments = obj.comments.select_related('user').order_by('-created_at')[:3]
         return CommentPreviewSerializer(comments, many=True).data
 
+
+class TitleSuggestionJobSerializer(serializers.ModelSerializer):
+    content = serializers.CharField(write_only=True)
+
+    class Meta:
+        model = TitleSuggestionJob
+        fields = ['id', 'content', 'callback_url', 'status', 'suggestions', 'error', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'status', 'suggestions', 'error', 'created_at', 'updated_at']
+        extra_kwargs = {'callback_url': {'write_only': True}}
+
+    def validate_callback_url(self, value):
+        if value and not callback_allowed(value):
+            raise serializers.ValidationError("Callback host is not allowed.")
+        return value
+
+
+class BulkLikeSerializer(serializers.Serializer):
+    like = serializers.ListField(child=serializers.IntegerField(min_value=1), max_length=100, required=False, default=list)
+    unlike = serializers.ListField(child=serializers.IntegerField(min_value=1), max_length=100, required=False, default=list)
+
+    def validate(self, attrs):
+        if not attrs['like'] and not attrs['unlike']:
+            raise serializers.ValidationError("Provide post ids to like and/or unlike.")
+        if set(attrs['like']) & set(attrs['unlike']):
+            raise serializers.ValidationError("A post cannot be liked and unliked in the same request.")
+        return attrs
+
+
+class ExportFilterSerializer(serializers.Serializer):
+    """Query parameters of the export endpoint; `until` is exclusive."""
+    author = serializers.IntegerField(required=False, min_value=1)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
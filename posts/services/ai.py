@@ -1,58 +1,174 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-import json
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from posts.cache import get_cache
+
+PROMPT = (
+    "Suggest 5 catchy, numbered blog titles for this content. Respond with just the numbered list "
+    "and no extra text. If you cannot generate titles, respond with 'no-titles-generated':\n\n{content}"
+)
+
+_session = None
+_slots = None
+_executor = None
+_lock = threading.Lock()
+
+
+class TitleSuggestionError(Exception):
+    """Gemini could not be reached or returned no usable titles."""
+
+
+def get_session():
+    """
+    Shared keep-alive session for Gemini calls.
+
+    The connection pool and the concurrency limit are both sized by
+    GEMINI_MAX_CONCURRENCY; connection errors and 429/5xx responses are
+    retried with backoff, read timeouts are not.
+    """
+    global _session, _slots
+    if _session is None:
+        with _lock:
+            if _session is None:
+                retry = Retry(
+                    total=2,
+                    read=0,
+                    backoff_factor=0.5,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    allowed_methods=['POST'],
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=settings.GEMINI_MAX_CONCURRENCY,
+                    max_retries=retry,
+                )
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _slots = threading.BoundedSemaphore(settings.GEMINI_MAX_CONCURRENCY)
+                _session = session
+    return _session
+
+
+def content_hash(content: str):
+    return hashlib.sha256(f"{settings.GEMINI_MODEL}\n{content}".encode()).hexdigest()
+
+
+def generate_titles(content: str):
+    """Cached titles for `content`; raises TitleSuggestionError on failure."""
+    cache = get_cache()
+    key = f"posts:titles:{content_hash(content)}"
+    suggestions = cache.get(key)
+    if suggestions is not None:
+        return suggestions
+
+    suggestions = request_titles(content)
+    # Only real titles are cached; errors are retried on the next call.
+    cache.set(key, suggestions, settings.GEMINI_CACHE_TIMEOUT)
+    return suggestions
+
 
 def suggest_titles(content: str):
-    model = "models/gemini-2.5-flash-preview-05-20"
-    url = f"https://generativelanguage.googleapis.com/v1beta/{model}:generateContent?key={settings.GEMINI_API_KEY}"
+    try:
+        return generate_titles(content)
+    except TitleSuggestionError as err:
+        return [str(err)]
+
+
+def get_executor():
+    """
+    Threads for asuggest_titles(), as many as GEMINI_MAX_CONCURRENCY. The
+    event loop's default executor has only min(32, CPUs + 4) threads, so
+    slow calls would queue there long before the semaphore filled up.
+    """
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(settings.GEMINI_MAX_CONCURRENCY, thread_name_prefix='gemini')
+    return _executor
 
-    headers = {"Content-Type": "application/json"}
+
+async def asuggest_titles(content: str):
+    call = functools.partial(contextvars.copy_context().run, suggest_titles, content)
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), call)
+
+
+def request_titles(content: str):
+    url = f"{settings.GEMINI_API_BASE}/{settings.GEMINI_MODEL}:generateContent"
     payload = {
         "contents": [
             {
                 "parts": [
                     {
-                        "text": f"Suggest 5 catchy, numbered blog titles for this content. Respond with just the numbered list and no extra text. If you cannot generate titles, respond with 'no-titles-generated':\n\n{content}"
+                        "text": PROMPT.format(content=content)
                     }
                 ]
             }
         ],
         "generationConfig": {
             "temperature": 0.5,
-            "responseMimeType": "text/plain" 
+            "responseMimeType": "text/plain"
         }
     }
 
+    session = get_session()
+    if not _slots.acquire(timeout=settings.GEMINI_CONNECT_TIMEOUT):
+        raise TitleSuggestionError("Too many title suggestion requests in flight, please retry shortly.")
     try:
-        res = requests.post(url, headers=headers, json=payload)
+        res = session.post(
+            url,
+            headers={"x-goog-api-key": settings.GEMINI_API_KEY or ""},
+            json=payload,
+            timeout=(settings.GEMINI_CONNECT_TIMEOUT, settings.GEMINI_READ_TIMEOUT),
+        )
         res.raise_for_status()
-
         data = res.json()
+    except requests.exceptions.JSONDecodeError as parse_err:
+        raise TitleSuggestionError(f"Unexpected API response structure or parsing error: {parse_err}")
+    except requests.exceptions.RequestException as req_err:
+        raise TitleSuggestionError(f"Network or API request error: {req_err}")
+    finally:
+        _slots.release()
+
+    return parse_titles(data)
 
+
+def parse_titles(data):
+    try:
         if not data.get("candidates"):
-            return [f"Gemini API returned an empty response. Response data: {data}"]
+            raise TitleSuggestionError(f"Gemini API returned an empty response. Response data: {data}")
 
         candidate = data["candidates"][0]
 
         if "content" not in candidate:
-            return [f"Gemini API response blocked. Finish reason: {candidate.get('finishReason', 'N/A')}"]
+            raise TitleSuggestionError(
+                f"Gemini API response blocked. Finish reason: {candidate.get('finishReason', 'N/A')}"
+            )
 
         text_output = candidate["content"]["parts"][0]["text"]
+    except (AttributeError, KeyError, IndexError, TypeError) as parse_err:
+        raise TitleSuggestionError(
+            f"Unexpected API response structure or parsing error: {parse_err}. Response data: {data}"
+        )
 
-        if "no-titles-generated" in text_output.lower():
-            return ["The model could not generate titles for the provided content."]
+    if "no-titles-generated" in text_output.lower():
+        raise TitleSuggestionError("The model could not generate titles for the provided content.")
 
-        # Split into individual suggestions
-        suggestions = [line.strip(" -0123456789.") for line in text_output.split("\n") if line.strip()]
+    # Split into individual suggestions
+    suggestions = [line.strip(" -0123456789.") for line in text_output.split("\n") if line.strip()]
 
-        if not suggestions:
-            return ["No titles could be extracted from the API response."]
+    if not suggestions:
+        raise TitleSuggestionError("No titles could be extracted from the API response.")
 
-        return suggestions
-
-    except requests.exceptions.RequestException as req_err:
-        return [f"Network or API request error: {req_err}"]
-    except (KeyError, IndexError, json.JSONDecodeError) as parse_err:
-        return [f"Unexpected API response structure or parsing error: {parse_err}. Response data: {data}"]
-    except Exception as e:
-        return [f"An unexpected error occurred: {e}"]
+    return suggestions
@@ -0,0 +1,174 @@
+from io import StringIO
+
+from django.db import connection, connections, router
+from django.db.models import sql
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+
+def _prepare(objects, batch_size):
+    """
+    Fill in the empty auto_now/auto_now_add values of `objects` and return
+    (model, fields, database, batches) for inserting them as they are.
+    """
+    model = type(objects[0])
+    opts = model._meta
+    fields = [field for field in opts.concrete_fields if field is not opts.pk and not field.generated]
+    stamped = [field for field in fields if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    now = timezone.now()
+    for obj in objects:
+        for field in stamped:
+            if getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, now)
+
+    db = router.db_for_write(model)
+    batch_size = min(batch_size, max(connections[db].ops.bulk_batch_size(fields, objects), 1))
+    batches = [objects[start:start + batch_size] for start in range(0, len(objects), batch_size)]
+    return model, fields, db, batches
+
+
+def bulk_insert(objects, batch_size=5000):
+    """
+    INSERT unsaved model instances like bulk_create(), but with the values
+    they carry: no field's pre_save() runs, so the `created_at`/`updated_at`
+    they were given aren't overwritten by auto_now/auto_now_add (ones left
+    empty get the current time). The primary keys are set on `objects`.
+    Returns `objects`.
+    """
+    objects = list(objects)
+    if not objects:
+        return objects
+    model, fields, db, batches = _prepare(objects, batch_size)
+    for batch in batches:
+        # raw=True is what loaddata uses: values go in as they are.
+        rows = model._base_manager._insert(batch, fields=fields, raw=True, using=db, returning_fields=[model._meta.pk])
+        for obj, row in zip(batch, rows or ()):
+            obj.pk = row[0]
+            obj._state.adding, obj._state.db = False, db
+    return objects
+
+
+def bulk_insert_new(objects, batch_size=5000):
+    """
+    bulk_insert(), skipping objects that conflict with existing rows.
+    Returns the number of rows inserted; primary keys aren't set, since
+    the new rows can't be matched back to `objects`.
+    """
+    objects = list(objects)
+    if not objects:
+        return 0
+    model, fields, db, batches = _prepare(objects, batch_size)
+    inserted = 0
+    with connections[db].cursor() as cursor:
+        for batch in batches:
+            query = sql.InsertQuery(model, on_conflict=OnConflict.IGNORE)
+            query.insert_values(fields, batch, raw=True)
+            # The cursor's rowcount leaves out the skipped rows on every backend.
+            for statement, params in query.get_compiler(using=db).as_sql():
+                cursor.execute(statement, params)
+                inserted += cursor.rowcount
+    return inserted
+
+
+def can_copy():
+    return connection.vendor == 'postgresql'
+
+
+def copy_csv(rows):
+    """
+    `rows` as CSV for COPY, and how many there are. Every value is quoted
+    except None, which is left empty: COPY reads an unquoted empty field as
+    NULL but a quoted one ("") as an empty string, so blank titles and
+    contents aren't turned into NULLs.
+    """
+    buffer = StringIO()
+    count = 0
+    for row in rows:
+        buffer.write(','.join('' if value is None else '"%s"' % str(value).replace('"', '""') for value in row))
+        buffer.write('\n')
+        count += 1
+    buffer.seek(0)
+    return buffer, count
+
+
+def _copy(sql, buffer):
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def copy_rows(model, fields, rows, ignore_conflicts=False):
+    """
+    Stream `rows` (tuples of raw column values, in `fields` order) into
+    `model`'s table with PostgreSQL COPY. Returns the number of rows
+    inserted.
+
+    COPY can't skip conflicting rows, so with `ignore_conflicts` they are
+    copied into a temporary table and moved over with INSERT ... ON
+    CONFLICT DO NOTHING. Nothing is validated and no ids come back; use it
+    for leaf tables only.
+    """
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    buffer, count = copy_csv(rows)
+    if not ignore_conflicts:
+        _copy(f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+        return count
+
+    staging = quote(f'copy_{model._meta.db_table}')
+    with connection.cursor() as cursor:
+        # Left over if an earlier copy failed outside a transaction
+        cursor.execute(f'DROP TABLE IF EXISTS {staging}')
+        cursor.execute(f'CREATE TEMPORARY TABLE {staging} AS SELECT {columns} FROM {table} WITH NO DATA')
+    _copy(f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)', buffer)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {staging} ON CONFLICT DO NOTHING')
+        inserted = cursor.rowcount
+        cursor.execute(f'DROP TABLE {staging}')
+    return inserted
+
+
+def insert_rows(model, fields, rows, use_copy=False, batch_size=5000):
+    """
+    Insert `rows` into `model`, with COPY where asked for and supported,
+    else with bulk_insert_new() in batches, skipping rows that conflict
+    with existing ones. Returns the number of rows inserted.
+    """
+    rows = list(rows)
+    if use_copy and can_copy():
+        return copy_rows(model, fields, rows, ignore_conflicts=True)
+    return bulk_insert_new([model(**dict(zip(fields, row))) for row in rows], batch_size=batch_size)
+
+
+def reserve_ids(model, count):
+    """
+    Take `count` ids from `model`'s primary key sequence (PostgreSQL), for
+    rows that are loaded with COPY but must be referenced afterwards.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def create_rows(model, fields, rows, use_copy=False, batch_size=5000):
+    """
+    Like insert_rows(), but returns the new primary keys in `rows` order,
+    and a conflict is an error. COPY takes its ids from reserve_ids().
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+    if use_copy and can_copy():
+        ids = reserve_ids(model, len(rows))
+        copy_rows(model, ('id', *fields), ((pk, *row) for pk, row in zip(ids, rows)))
+        return ids
+    objects = bulk_insert([model(**dict(zip(fields, row))) for row in rows], batch_size=batch_size)
+    return [obj.pk for obj in objects]
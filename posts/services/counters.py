@@ -0,0 +1,205 @@
+import logging
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from posts import cache
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+SEQ_KEY = 'posts:likes:seq'
+CURSOR_KEY = 'posts:likes:cursor'
+HEARTBEAT_KEY = 'posts:likes:flusher'
+LOCK_KEY = 'posts:likes:flush-lock'
+# Seconds a flusher holds its lease; a crashed one is replaced after this.
+LOCK_TIMEOUT = 60
+# Flushes a missing dirty entry is looked for again before it is given up as evicted.
+MAX_RETRIES = 3
+
+
+def _delta_key(post_id):
+    return f'posts:likes:delta:{post_id}'
+
+
+def _dirty_key(n):
+    return f'posts:likes:dirty:{n}'
+
+
+def _incr(store, key, delta, timeout=None):
+    """Atomically add `delta` to `key`, creating it if needed; returns the new value."""
+    while True:
+        if store.add(key, delta, timeout=timeout):
+            return delta
+        try:
+            return store.incr(key, delta)
+        except ValueError:
+            # Expired or evicted between add() and incr(); try again.
+            continue
+
+
+def buffering():
+    """
+    Whether like counts are currently written behind.
+
+    Only while a flusher has checked in within POSTS_LIKE_MAX_STALENESS;
+    without one, deltas go straight to the row so they can never pile up
+    unflushed, and the writes drain what was buffered before.
+    """
+    return settings.POSTS_LIKE_COUNTER == 'buffered' and cache.get_cache().get(HEARTBEAT_KEY) is not None
+
+
+def adjust_like_counts(post_ids, delta):
+    """
+    Add `delta` to the like_count of every post in `post_ids`.
+
+    Writes the rows directly, or, in buffered mode, queues the delta once
+    the surrounding transaction commits so the hot post row is never
+    locked by the request. A direct write in buffered mode, made while no
+    flusher is running, also applies the post's delta left in the buffer.
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+    if not buffering():
+        Post.objects.filter(id__in=post_ids).update(like_count=F('like_count') + delta)
+        if settings.POSTS_LIKE_COUNTER == 'buffered':
+            transaction.on_commit(lambda: drain_deltas(post_ids))
+        return
+    transaction.on_commit(lambda: buffer_deltas(post_ids, delta))
+
+
+def buffer_deltas(post_ids, delta):
+    store = cache.get_cache()
+    for post_id in post_ids:
+        try:
+            _incr(store, _delta_key(post_id), delta)
+        except Exception:
+            # The like is committed; a cache outage mustn't turn it into a 500.
+            logger.warning("Could not buffer like delta for post %s; writing it directly", post_id, exc_info=True)
+            Post.objects.filter(id=post_id).update(like_count=F('like_count') + delta)
+            continue
+        try:
+            # Register the post for the flusher; re-registering is harmless.
+            # Kept as long as the delta itself, however long the flusher is away.
+            store.set(_dirty_key(_incr(store, SEQ_KEY, 1)), post_id, timeout=None)
+        except Exception:
+            # The delta is buffered and is flushed once the post is registered
+            # again; writing it directly as well would count it twice.
+            logger.warning("Could not register like delta for post %s", post_id, exc_info=True)
+
+
+def pending_delta(post_id):
+    return cache.get_cache().get(_delta_key(post_id), 0)
+
+
+def drain_deltas(post_ids):
+    """
+    Apply the buffered deltas of `post_ids` now, unless a flusher holds the
+    lease and is about to. Their dirty entries stay behind and find
+    nothing left to apply.
+    """
+    store = cache.get_cache()
+    try:
+        with _lease(store) as held:
+            if held:
+                _flush_batch(store, post_ids)
+    except Exception:
+        # The deltas stay buffered for the next flusher or write.
+        logger.warning("Could not drain like deltas for posts %s", post_ids, exc_info=True)
+
+
+@contextmanager
+def _lease(store):
+    """Hold the flusher lease for the block, if no one else does; yields whether it is held."""
+    token = uuid.uuid4().hex
+    if not store.add(LOCK_KEY, token, timeout=LOCK_TIMEOUT):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if store.get(LOCK_KEY) == token:
+            store.delete(LOCK_KEY)
+
+
+def flush_like_counts(batch_size=500):
+    """
+    Apply buffered like deltas to Post.like_count and return the number of
+    posts updated.
+
+    Reads the dirty entries registered since the last flush, takes each
+    post's delta out of the buffer and writes all of them with one UPDATE
+    per batch. Entries that a writer has reserved but not yet stored are
+    retried on the next few flushes. Returns 0 without flushing while
+    another flusher holds the lease, so overlapping runs can't apply the
+    same deltas twice.
+    """
+    store = cache.get_cache()
+    with _lease(store) as held:
+        if not held:
+            logger.debug("Another flusher holds the lease; skipping this flush")
+            return 0
+        return _flush(store, batch_size)
+
+
+def _flush(store, batch_size):
+    head = store.get(SEQ_KEY, 0)
+    state = store.get(CURSOR_KEY) or {'seq': 0, 'retry': {}}
+    if head < state['seq']:
+        # The sequence was evicted and restarted; every entry is a fresh one.
+        state = {'seq': 0, 'retry': {}}
+
+    wanted = list(state['retry']) + list(range(state['seq'] + 1, head + 1))
+    found = store.get_many([_dirty_key(n) for n in wanted])
+    retry = {}
+    for n in wanted:
+        if _dirty_key(n) not in found:
+            tries = state['retry'].get(n, 0) + 1
+            if tries <= MAX_RETRIES:
+                retry[n] = tries
+
+    post_ids = sorted(set(found.values()))
+    updated = 0
+    for start in range(0, len(post_ids), batch_size):
+        updated += _flush_batch(store, post_ids[start:start + batch_size])
+
+    store.delete_many(found.keys())
+    store.set(CURSOR_KEY, {'seq': head, 'retry': retry}, timeout=None)
+    store.set(HEARTBEAT_KEY, head, timeout=settings.POSTS_LIKE_MAX_STALENESS)
+    return updated
+
+
+def _flush_batch(store, post_ids):
+    deltas = {}
+    for key, delta in store.get_many([_delta_key(post_id) for post_id in post_ids]).items():
+        if delta:
+            # Subtract what we read rather than deleting, so increments that
+            # land in between stay buffered for the next flush.
+            store.decr(key, delta)
+            deltas[int(key.rsplit(':', 1)[1])] = delta
+    if not deltas:
+        return 0
+
+    try:
+        with transaction.atomic():
+            updated = Post.objects.filter(id__in=deltas).update(
+                like_count=F('like_count') + Case(
+                    *[When(id=post_id, then=Value(delta)) for post_id, delta in deltas.items()],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+    except Exception:
+        # Put the deltas back so a failed flush loses nothing.
+        for post_id, delta in deltas.items():
+            _incr(store, _delta_key(post_id), delta)
+        raise
+
+    for post_id in deltas:
+        cache.invalidate_post(post_id)
+    cache.invalidate_feeds()
+    return updated
@@ -0,0 +1,156 @@
+import csv
+import datetime
+import zlib
+from io import StringIO
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from posts.encoders import format_datetime
+from posts.models import Comment, Like, Post
+
+# Encoded bytes collected before a chunk is handed to the response or file;
+# small enough to keep memory flat, big enough that gzip and the socket
+# aren't flushed on every row.
+BUFFER_BYTES = 64 * 1024
+
+# kind -> (model, exported columns, column filtered by `author`, filter
+# leaving out rows of soft-deleted posts and comments of soft-deleted
+# accounts; Post's manager already hides deleted posts)
+EXPORTS = {
+    'posts': (
+        Post,
+        ('id', 'author_id', 'title', 'content', 'image', 'like_count', 'comment_count', 'created_at', 'updated_at'),
+        'author_id',
+        {},
+    ),
+    'comments': (
+        Comment,
+        ('id', 'post_id', 'user_id', 'parent_id', 'content', 'created_at', 'updated_at'),
+        'user_id',
+        {'post__deleted_at__isnull': True, 'user__deleted_at__isnull': True},
+    ),
+    'likes': (Like, ('id', 'post_id', 'user_id', 'created_at'), 'user_id', {'post__deleted_at__isnull': True}),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _value(value):
+    if isinstance(value, datetime.datetime):
+        return format_datetime(value)
+    return value
+
+
+class NDJSONWriter:
+    def __init__(self, columns):
+        self.columns = columns
+
+    def header(self):
+        return b''
+
+    def row(self, values):
+        return orjson.dumps({column: _value(value) for column, value in zip(self.columns, values)}) + b'\n'
+
+
+class CSVWriter:
+    def __init__(self, columns):
+        self.columns = columns
+        self.buffer = StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def encode(self, values):
+        self.writer.writerow(values)
+        line = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return line.encode()
+
+    def header(self):
+        return self.encode(self.columns)
+
+    def row(self, values):
+        return self.encode(['' if value is None else _value(value) for value in values])
+
+
+class StreamEncoder:
+    """Rows in, output chunks of about BUFFER_BYTES out."""
+
+    def __init__(self, writer, compress=False):
+        self.writer = writer
+        # wbits=31: a gzip container rather than a bare zlib stream
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        self.pending = [writer.header()]
+        self.size = len(self.pending[0])
+
+    def drain(self):
+        data = b''.join(self.pending)
+        self.pending.clear()
+        self.size = 0
+        return self.compressor.compress(data) if self.compressor is not None else data
+
+    def feed(self, values):
+        line = self.writer.row(values)
+        self.pending.append(line)
+        self.size += len(line)
+        return self.drain() if self.size >= BUFFER_BYTES else b''
+
+    def close(self):
+        data = self.drain()
+        return data + self.compressor.flush() if self.compressor is not None else data
+
+
+class Export:
+    """
+    One table streamed as NDJSON or CSV, optionally gzipped.
+
+    Rows are read as plain tuples with `.iterator()` (a server-side cursor
+    on PostgreSQL) in primary-key order, so only one fetch of
+    POSTS_EXPORT_CHUNK_SIZE rows and one output buffer are held in memory
+    at a time, however large the table is. Iterate it directly, or with
+    `async for` under ASGI.
+    """
+
+    def __init__(self, kind, fmt='ndjson', author=None, since=None, until=None, compress=False, chunk_size=None):
+        model, self.columns, author_column, live = EXPORTS[kind]
+        self.kind = kind
+        self.fmt = fmt
+        self.compress = compress
+        self.chunk_size = chunk_size or settings.POSTS_EXPORT_CHUNK_SIZE
+
+        queryset = model._default_manager.filter(**live).order_by('pk')
+        if author is not None:
+            queryset = queryset.filter(**{author_column: author})
+        if since is not None:
+            queryset = queryset.filter(created_at__gte=since)
+        if until is not None:
+            queryset = queryset.filter(created_at__lt=until)
+        # Pick the database now: a streamed response is read after the view
+        # returns, outside the request's replica routing.
+        self.queryset = queryset.using(queryset.db).values_list(*self.columns)
+
+    @property
+    def content_type(self):
+        return FORMATS[self.fmt]
+
+    def encoder(self):
+        return StreamEncoder(CSVWriter(self.columns) if self.fmt == 'csv' else NDJSONWriter(self.columns), self.compress)
+
+    def __iter__(self):
+        encoder = self.encoder()
+        for values in self.queryset.iterator(chunk_size=self.chunk_size):
+            data = encoder.feed(values)
+            if data:
+                yield data
+        yield encoder.close()
+
+    async def __aiter__(self):
+        # aiterator() runs a values_list() query on the event loop, so drive
+        # the sync stream from the (thread-sensitive) sync thread instead.
+        chunks = iter(self)
+        while (data := await sync_to_async(next)(chunks, None)) is not None:
+            yield data
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from posts import cache
+from posts.models import Post
+
+logger = logging.getLogger(__name__)
+
+# Output formats, best first; AVIF is skipped if Pillow was built without it.
+VARIANT_FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+# Keyed by Pillow format name, as passed to encode()
+ENCODER_OPTIONS = {
+    'AVIF': {'quality': 55, 'speed': 8},
+    'WEBP': {'quality': 80, 'method': 4},
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+}
+
+
+def schedule_image_processing(post):
+    """Build variants for a freshly uploaded image, unless that is deferred."""
+    if post.image and settings.POSTS_IMAGE_PROCESSING == 'sync':
+        transaction.on_commit(lambda: process_post_image(post.pk))
+
+
+def encode(image, fmt, icc_profile=None):
+    buffer = BytesIO()
+    options = dict(ENCODER_OPTIONS.get(fmt, {}))
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    # No exif/pnginfo is passed on, so every other metadata block is dropped.
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def encode_original(image, name, fmt, icc_profile=None):
+    """
+    Re-encode the capped original in its own format, or as PNG when Pillow
+    can read that format but not write it (PSD, for one). Returns the file
+    name to store it under and its bytes.
+    """
+    try:
+        return name, encode(image, fmt, icc_profile)
+    except (KeyError, OSError, ValueError) as err:
+        logger.info("Storing %s as PNG, %s can't be written: %s", name, fmt, err)
+        return posixpath.splitext(name)[0] + '.png', encode(image, 'PNG', icc_profile)
+
+
+def capped(image, size):
+    image = image.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    return image
+
+
+def process_post_image(post_id):
+    """
+    Replace a post's image with a metadata-free copy capped at the largest
+    variant size, and store each variant in every VARIANT_FORMATS format.
+    """
+    post = Post.objects.filter(pk=post_id).only('id', 'image', 'image_variants').first()
+    if post is None or not post.image:
+        return
+
+    source_name = post.image.name
+    storage = post.image.storage
+    try:
+        with post.image.open('rb') as fh, Image.open(fh) as source:
+            source_format = source.format or 'PNG'
+            icc_profile = source.info.get('icc_profile')
+            image = ImageOps.exif_transpose(source)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as err:
+        logger.warning("Could not process image for post %s: %s", post_id, err)
+        Post.objects.filter(pk=post_id, image=source_name).update(image_variants={'error': str(err)})
+        return
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+    if source_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    written = []
+    try:
+        variants = write_variants(storage, post_id, image, source_name, source_format, icc_profile, written)
+    except Exception as err:
+        # An encoder or storage failure must not fail the request that
+        # uploaded the image, nor leave half a set of files behind.
+        logger.exception("Could not store image variants for post %s", post_id)
+        for path in written:
+            storage.delete(path)
+        Post.objects.filter(pk=post_id, image=source_name).update(image_variants={'error': str(err)})
+        return
+
+    # Only publish if the image was not replaced while we were working.
+    updated = Post.objects.filter(pk=post_id, image=source_name).update(
+        image=written[0], image_variants=variants
+    )
+    if not updated:
+        stale, obsolete = written, []
+    else:
+        stale, obsolete = [], [source_name] + variant_paths(post.image_variants)
+        cache.invalidate_post(post_id)
+        cache.invalidate_feeds()
+    for path in stale + obsolete:
+        storage.delete(path)
+
+
+def write_variants(storage, post_id, image, source_name, source_format, icc_profile, written):
+    """
+    Store the capped original and every variant, appending each stored
+    path to `written` (the original first). Returns the variants map.
+    """
+    sizes = settings.POSTS_IMAGE_VARIANTS
+    original = capped(image, max(sizes.values()))
+    name, data = encode_original(original, source_name, source_format, icc_profile)
+    written.append(storage.save(name, ContentFile(data)))
+
+    token = hashlib.sha1(written[0].encode()).hexdigest()[:8]
+    directory = posixpath.join(posixpath.dirname(source_name), 'variants', str(post_id))
+    variants = {}
+    for name, size in sizes.items():
+        resized = capped(original, size)
+        variant = {'width': resized.width, 'height': resized.height}
+        for fmt in VARIANT_FORMATS:
+            path = storage.save(
+                posixpath.join(directory, f'{name}-{token}.{fmt}'),
+                ContentFile(encode(resized, fmt.upper(), icc_profile)),
+            )
+            written.append(path)
+            variant[fmt] = path
+        variants[name] = variant
+    return variants
+
+
+def variant_paths(variants):
+    return [
+        path
+        for variant in variants.values() if isinstance(variant, dict)
+        for fmt, path in variant.items() if fmt in VARIANT_FORMATS
+    ]
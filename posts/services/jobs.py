@@ -0,0 +1,104 @@
+import logging
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from posts.models import TitleSuggestionJob
+from posts.services.ai import TitleSuggestionError, content_hash, generate_titles
+
+logger = logging.getLogger(__name__)
+
+Status = TitleSuggestionJob.Status
+
+
+def callback_allowed(url):
+    return urlsplit(url).hostname in settings.TITLE_JOB_WEBHOOK_HOSTS
+
+
+def enqueue_title_job(content, user=None, callback_url=''):
+    """
+    Return `user`'s job for `content`, creating it if no live job exists yet.
+
+    Jobs are deduplicated per user by content hash: a pending, running or
+    finished job is reused, only a failed one is replaced. Other users get
+    their own job, so each caller's callback_url is delivered.
+    """
+    digest = content_hash(content)
+    live = TitleSuggestionJob.objects.exclude(status=Status.FAILED).filter(requested_by=user, content_hash=digest)
+    job = live.first()
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            job = TitleSuggestionJob.objects.create(
+                content=content,
+                content_hash=digest,
+                requested_by=user,
+                callback_url=callback_url,
+            )
+    except IntegrityError:
+        # Lost the race against an identical request.
+        return live.get(), False
+    return job, True
+
+
+def claim_jobs(batch_size, stale_after):
+    """
+    Mark up to `batch_size` jobs as running and return them.
+
+    Rows are locked with SKIP LOCKED so several workers can claim in
+    parallel. Running jobs whose worker vanished more than `stale_after`
+    seconds ago are picked up again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            TitleSuggestionJob.objects
+            .filter(
+                Q(status=Status.PENDING)
+                | Q(status=Status.RUNNING, started_at__lt=now - timedelta(seconds=stale_after))
+            )
+            .order_by('created_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        TitleSuggestionJob.objects.filter(id__in=ids).update(
+            status=Status.RUNNING,
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+    return list(TitleSuggestionJob.objects.filter(id__in=ids).order_by('created_at'))
+
+
+def run_job(job, max_attempts):
+    try:
+        job.suggestions = generate_titles(job.content)
+    except TitleSuggestionError as err:
+        job.error = str(err)
+        job.status = Status.PENDING if job.attempts < max_attempts else Status.FAILED
+    else:
+        job.error = ''
+        job.status = Status.DONE
+    job.save(update_fields=['suggestions', 'error', 'status', 'updated_at'])
+
+    if job.status in (Status.DONE, Status.FAILED) and job.callback_url:
+        deliver_callback(job)
+
+
+def deliver_callback(job):
+    payload = {
+        'id': str(job.id),
+        'status': job.status,
+        'suggestions': job.suggestions,
+        'error': job.error,
+    }
+    try:
+        requests.post(job.callback_url, json=payload, timeout=settings.GEMINI_CONNECT_TIMEOUT)
+    except requests.exceptions.RequestException as err:
+        # Polling still works; a lost webhook is not worth failing the job.
+        logger.warning("Title job %s webhook to %s failed: %s", job.id, job.callback_url, err)
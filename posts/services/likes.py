@@ -0,0 +1,93 @@
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from posts import cache
+from posts.models import Like, Post
+from posts.services.counters import adjust_like_counts
+
+
+def liked_post_ids(user, post_ids):
+    """The subset of `post_ids` that `user` has liked, in one indexed query."""
+    if not user.is_authenticated or not post_ids:
+        return set()
+    return set(Like.objects.filter(user=user, post_id__in=post_ids).values_list('post_id', flat=True))
+
+
+def insert_likes(user, post_ids):
+    """
+    INSERT a like by `user` of every post in `post_ids`, skipping ones that
+    already exist, and return the post ids that were actually inserted.
+
+    The row locks taken by apply_likes() can't cover likes that don't exist
+    yet, so a concurrent request may insert one first. On PostgreSQL and
+    SQLite, `ON CONFLICT DO NOTHING RETURNING` reports exactly our rows;
+    elsewhere the user's likes are read back and diffed, which can't tell
+    a concurrent insert that commits in between from ours.
+    """
+    if not post_ids:
+        return set()
+    connection = connections[router.db_for_write(Like)]
+    if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_rows_from_bulk_insert:
+        opts = Like._meta
+        created_at = opts.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+        sql = 'INSERT INTO {} ({}) VALUES {} ON CONFLICT DO NOTHING RETURNING {}'.format(
+            connection.ops.quote_name(opts.db_table),
+            ', '.join(connection.ops.quote_name(opts.get_field(name).column) for name in ('user', 'post', 'created_at')),
+            ', '.join(['(%s, %s, %s)'] * len(post_ids)),
+            connection.ops.quote_name(opts.get_field('post').column),
+        )
+        params = [value for post_id in post_ids for value in (user.pk, post_id, created_at)]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+    likes = Like.objects.filter(user=user, post_id__in=post_ids)
+    before = set(likes.values_list('post_id', flat=True))
+    Like.objects.bulk_create([Like(user=user, post_id=post_id) for post_id in post_ids], ignore_conflicts=True)
+    return set(likes.values_list('post_id', flat=True)) - before
+
+
+def apply_likes(user, like_ids, unlike_ids):
+    """
+    Like every post in `like_ids` and unlike every post in `unlike_ids` for
+    `user` with one INSERT and one DELETE, adjusting the post counters with
+    one UPDATE per direction.
+
+    Returns `{post_id: outcome}` where outcome is one of `liked`,
+    `already_liked`, `unliked`, `not_liked` or `not_found`.
+    """
+    like_ids, unlike_ids = set(like_ids), set(unlike_ids)
+    existing = set(Post.objects.filter(id__in=like_ids | unlike_ids).values_list('id', flat=True))
+    results = {post_id: 'not_found' for post_id in (like_ids | unlike_ids) - existing}
+    like_ids &= existing
+    unlike_ids &= existing
+
+    with transaction.atomic():
+        # Lock our existing like rows so concurrent toggles can't double count.
+        current = set(
+            Like.objects.select_for_update()
+            .filter(user=user, post_id__in=like_ids | unlike_ids)
+            .values_list('post_id', flat=True)
+        )
+
+        # Count only the rows this request inserted, not ones a concurrent
+        # request got in first.
+        new = insert_likes(user, sorted(like_ids - current))
+        adjust_like_counts(new, 1)
+
+        removed = unlike_ids & current
+        if removed:
+            Like.objects.filter(user=user, post_id__in=removed).delete()
+            adjust_like_counts(removed, -1)
+
+        if new:
+            # bulk_create sends no post_save, so invalidate cached reads here.
+            for post_id in new:
+                transaction.on_commit(lambda post_id=post_id: cache.invalidate_post(post_id))
+            transaction.on_commit(cache.invalidate_feeds)
+
+    results.update({post_id: 'liked' for post_id in new})
+    results.update({post_id: 'already_liked' for post_id in like_ids - new})
+    results.update({post_id: 'unliked' for post_id in removed})
+    results.update({post_id: 'not_liked' for post_id in unlike_ids - current})
+    return results
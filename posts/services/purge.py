@@ -0,0 +1,174 @@
+import time
+from collections import Counter
+from functools import partial
+
+from django.db import router, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from posts import cache
+from posts.models import Comment, Follow, Like, Post, TimelineEntry, User
+
+
+def soft_delete_post(post):
+    """
+    Hide `post` at once; its likes and comments are left for
+    purge_deleted(), so the request never waits on the cascade. Its
+    timeline rows go now: there are at most POSTS_FANOUT_THRESHOLD of them.
+    """
+    post.deleted_at = timezone.now()
+    post.save(update_fields=['deleted_at'])
+    TimelineEntry.objects.filter(post_id=post.pk).delete()
+    transaction.on_commit(partial(cache.invalidate_comments, post.pk))
+
+
+def soft_delete_user(user):
+    """
+    Deactivate `user`, hide their posts with one UPDATE and take their
+    likes off other posts' counts with another. Their comments are hidden
+    by the views; one version bump invalidates every cached response that
+    might show any of it, however much the user owns.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        user.is_active = False
+        user.deleted_at = now
+        user.save(update_fields=['is_active', 'deleted_at'])
+        Post.objects.filter(author_id=user.pk).update(deleted_at=now)
+        # purge_user() deletes these likes without counting them again
+        Post.all_objects.filter(
+            pk__in=Like.objects.filter(user_id=user.pk).values('post_id'),
+        ).update(like_count=F('like_count') - 1)
+        transaction.on_commit(cache.invalidate_accounts)
+        transaction.on_commit(cache.invalidate_feeds)
+
+
+def delete_ids(model, ids):
+    """
+    DELETE rows by primary key without loading them or sending signals.
+    Callers delete dependents first, so there is nothing to cascade.
+    """
+    if not ids:
+        return 0
+    return model._base_manager.filter(pk__in=ids)._raw_delete(router.db_for_write(model))
+
+
+def delete_in_batches(queryset, batch_size, pause=0.0):
+    """Delete `queryset`'s rows, at most `batch_size` per transaction, in its order."""
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            deleted += delete_ids(queryset.model, ids)
+        if len(ids) < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def decrement(queryset, field, counts):
+    """Subtract `counts[pk]` from `field` of each row, one UPDATE per distinct amount."""
+    by_amount = {}
+    for pk, amount in counts.items():
+        by_amount.setdefault(amount, []).append(pk)
+    for amount, pks in by_amount.items():
+        queryset.filter(pk__in=pks).update(**{field: F(field) - amount})
+
+
+def purge_post(post_id, batch_size, pause=0.0):
+    """Delete a soft-deleted post and everything hanging off it. Returns the rows deleted."""
+    deleted = delete_in_batches(TimelineEntry.objects.filter(post_id=post_id), batch_size, pause)
+    deleted += delete_in_batches(Like.objects.filter(post_id=post_id), batch_size, pause)
+    # Deepest replies first, so no batch removes a comment that still has replies
+    deleted += delete_in_batches(
+        Comment.objects.filter(post_id=post_id).order_by('-depth', '-id'), batch_size, pause,
+    )
+    with transaction.atomic():
+        post = Post.all_objects.filter(pk=post_id, deleted_at__isnull=False).first()
+        if post is not None:
+            # Nothing is left to cascade; the post_delete signal clears its caches.
+            post.delete()
+            deleted += 1
+    return deleted
+
+
+def comment_subtree(comment_ids):
+    """(id, post_id, root_id) of the comments and every reply below them, deepest first."""
+    rows = {}
+    queryset = Comment.objects.filter(pk__in=comment_ids)
+    while True:
+        found = [row for row in queryset.values_list('id', 'depth', 'post_id', 'root_id') if row[0] not in rows]
+        if not found:
+            break
+        rows.update((row[0], row) for row in found)
+        queryset = Comment.objects.filter(parent_id__in=[row[0] for row in found])
+    # Replies are one level below their parent, so by depth no parent goes before its replies.
+    return [(pk, post_id, root_id) for pk, _, post_id, root_id in sorted(rows.values(), key=lambda row: -row[1])]
+
+
+def purge_user_comments(user_id, batch_size, pause=0.0):
+    """
+    Delete `user_id`'s comments on other posts with the replies below them
+    (Comment.parent cascades), keeping comment and reply counts in step.
+    """
+    deleted = 0
+    while True:
+        seeds = list(Comment.objects.filter(user_id=user_id).values_list('id', flat=True)[:batch_size])
+        if not seeds:
+            return deleted
+        subtree = comment_subtree(seeds)
+        for start in range(0, len(subtree), batch_size):
+            rows = subtree[start:start + batch_size]
+            with transaction.atomic():
+                deleted += delete_ids(Comment, [pk for pk, _, _ in rows])
+                decrement(Post.all_objects, 'comment_count', Counter(post_id for _, post_id, _ in rows))
+                decrement(Comment.objects, 'reply_count', Counter(root_id for _, _, root_id in rows if root_id))
+                for post_id in {post_id for _, post_id, _ in rows}:
+                    transaction.on_commit(partial(cache.invalidate_comments, post_id))
+            time.sleep(pause)
+
+
+def purge_user(user_id, batch_size, pause=0.0):
+    """Delete a soft-deleted user and everything they own. Returns the rows deleted."""
+    # Posts created while the account was being deleted
+    Post.objects.filter(author_id=user_id).update(deleted_at=timezone.now())
+    deleted = 0
+    for post_id in list(Post.all_objects.filter(author_id=user_id).values_list('id', flat=True)):
+        deleted += purge_post(post_id, batch_size, pause)
+    deleted += purge_user_comments(user_id, batch_size, pause)
+
+    # soft_delete_user() already took these likes off the counts
+    deleted += delete_in_batches(Like.objects.filter(user_id=user_id), batch_size, pause)
+
+    while True:
+        with transaction.atomic():
+            follows = list(Follow.objects.filter(follower_id=user_id).values_list('pk', 'followee_id')[:batch_size])
+            deleted += delete_ids(Follow, [pk for pk, _ in follows])
+            User.objects.filter(pk__in=[followee for _, followee in follows]).update(follower_count=F('follower_count') - 1)
+        if len(follows) < batch_size:
+            break
+        time.sleep(pause)
+    deleted += delete_in_batches(Follow.objects.filter(followee_id=user_id), batch_size, pause)
+    deleted += delete_in_batches(TimelineEntry.objects.filter(user_id=user_id), batch_size, pause)
+
+    with transaction.atomic():
+        user = User.objects.filter(pk=user_id, deleted_at__isnull=False).first()
+        if user is not None:
+            user.delete()
+            deleted += 1
+    return deleted
+
+
+def purge_deleted(batch_size=1000, pause=0.0):
+    """
+    Remove every soft-deleted post, then every soft-deleted user, in
+    transactions of at most `batch_size` rows with `pause` seconds between
+    them. Returns counts of purged posts, users and rows.
+    """
+    purged = Counter()
+    for post_id in Post.all_objects.filter(deleted_at__isnull=False).order_by('deleted_at', 'id').values_list('id', flat=True):
+        purged['rows'] += purge_post(post_id, batch_size, pause)
+        purged['posts'] += 1
+    for user_id in User.objects.filter(deleted_at__isnull=False).order_by('deleted_at', 'id').values_list('id', flat=True):
+        purged['rows'] += purge_user(user_id, batch_size, pause)
+        purged['users'] += 1
+    return purged
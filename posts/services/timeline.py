@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.db.models import Q
+
+from posts.models import Follow, Post, TimelineEntry
+from posts.prefetch import with_liked_by
+
+FANOUT_BATCH_SIZE = 1000
+
+
+def pushes_on_write(author):
+    """Authors below the threshold push posts to followers; the rest are pulled on read."""
+    return author.follower_count < settings.POSTS_FANOUT_THRESHOLD
+
+
+def fan_out_post(post):
+    """Insert `post` into the timelines of its author and the author's followers."""
+    author = post.author
+    recipients = [author.pk]
+    if pushes_on_write(author):
+        recipients.extend(
+            Follow.objects.filter(followee=author).values_list('follower_id', flat=True).iterator()
+        )
+    for start in range(0, len(recipients), FANOUT_BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, post_id=post.pk, created_at=post.created_at)
+                for user_id in recipients[start:start + FANOUT_BATCH_SIZE]
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def backfill_timeline(follower, followee):
+    """Seed a new follower's timeline with the followee's recent posts."""
+    if not pushes_on_write(followee):
+        return
+    posts = (
+        Post.objects.filter(author=followee)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:settings.POSTS_TIMELINE_BACKFILL]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user=follower, post_id=post_id, created_at=created_at) for post_id, created_at in posts],
+        ignore_conflicts=True,
+    )
+
+
+def remove_from_timeline(follower, followee):
+    TimelineEntry.objects.filter(user=follower, post__author=followee).delete()
+
+
+def before(prefix, cursor):
+    if cursor is None:
+        return Q()
+    created_at, post_id = cursor
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, **{f'{prefix}__lt': post_id})
+
+
+def home_timeline(user, limit, cursor=None):
+    """
+    Up to `limit` posts for `user`'s home feed, newest first, older than
+    `cursor` (a `(created_at, post_id)` pair) when given.
+
+    Pushed posts come from one range scan over the user's timeline rows;
+    posts by high-follower authors are pulled from their own post index
+    and merged in. Timeline rows of soft-deleted posts stay until they are
+    purged, so posts that turn out to be deleted are dropped and the scan
+    goes on, reading twice as many rows each time, until the page is full.
+    """
+    pulled_authors = list(
+        Follow.objects
+        .filter(follower=user, followee__follower_count__gte=settings.POSTS_FANOUT_THRESHOLD)
+        .values_list('followee_id', flat=True)
+    )
+    page = []
+    size = limit
+    while True:
+        keys = set(
+            TimelineEntry.objects
+            .filter(before('post_id', cursor), user=user)
+            .order_by('-created_at', '-post_id')
+            .values_list('created_at', 'post_id')[:size]
+        )
+        if pulled_authors:
+            keys.update(
+                Post.objects
+                .filter(before('id', cursor), author_id__in=pulled_authors)
+                .order_by('-created_at', '-id')
+                .values_list('created_at', 'id')[:size]
+            )
+
+        batch = sorted(keys, reverse=True)[:size]
+        posts = with_liked_by(Post.objects.select_related('author'), user).in_bulk([post_id for _, post_id in batch])
+        page.extend(posts[post_id] for _, post_id in batch if post_id in posts)
+        if len(page) >= limit or len(batch) < size:
+            return page[:limit]
+        cursor = batch[-1]
+        size *= 2
@@ -0,0 +1,73 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache
+from .authentication import clear_inactive, mark_inactive, user_cache
+from .models import Post, Like, Comment, TokenUser, User
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_cache(sender, instance, **kwargs):
+    # Bump after commit so a concurrent read can't re-cache the old rows.
+    transaction.on_commit(partial(cache.invalidate_post, instance.pk))
+    transaction.on_commit(cache.invalidate_feeds)
+
+
+@receiver([post_save, post_delete], sender=Like)
+def invalidate_like_cache(sender, instance, **kwargs):
+    # like counts appear on the post detail and in both feeds
+    transaction.on_commit(partial(cache.invalidate_post, instance.post_id))
+    transaction.on_commit(cache.invalidate_feeds)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_comment_cache(sender, instance, **kwargs):
+    # comments show up in their post's comment list and in the stats feed
+    transaction.on_commit(partial(cache.invalidate_comments, instance.post_id))
+    transaction.on_commit(partial(cache.invalidate_feeds, cache.FEED_STATS))
+
+
+# User fields serialized into posts, comments and feeds (UserSerializer, str(user))
+EMBEDDED_USER_FIELDS = ('username', 'email')
+
+
+def invalidate_user_content(user_id):
+    """Bump every cached response that embeds the user's public fields."""
+    cache.bump_versions('post', Post.all_objects.filter(author_id=user_id).values_list('id', flat=True))
+    cache.bump_versions(
+        'comments', Comment.objects.filter(user_id=user_id).order_by().values_list('post_id', flat=True).distinct()
+    )
+    cache.invalidate_feeds()
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=TokenUser)
+def detect_embedded_user_changes(sender, instance, update_fields=None, **kwargs):
+    # Compare with the stored row; saves that can't touch these fields
+    # (last_login, is_active, ...) skip the query.
+    fields = [name for name in EMBEDDED_USER_FIELDS if update_fields is None or name in update_fields]
+    instance._embedded_fields_changed = False
+    if instance.pk is None or not fields:
+        return
+    stored = sender._base_manager.filter(pk=instance.pk).values_list(*fields).first()
+    instance._embedded_fields_changed = stored is not None and stored != tuple(getattr(instance, name) for name in fields)
+
+
+@receiver([post_save, post_delete], sender=User)
+@receiver([post_save, post_delete], sender=TokenUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # Tokens of deactivated or deleted users are refused in every process
+    # (see StatelessJWTAuthentication). QuerySet.update() skips this.
+    user_cache.evict(instance.pk)
+    transaction.on_commit(partial(user_cache.evict, instance.pk))
+    if kwargs.get('created'):
+        return
+    if getattr(instance, '_embedded_fields_changed', False):
+        transaction.on_commit(partial(invalidate_user_content, instance.pk))
+    if kwargs['signal'] is post_delete or not instance.is_active:
+        transaction.on_commit(partial(mark_inactive, instance.pk))
+    else:
+        transaction.on_commit(partial(clear_inactive, instance.pk))
@@ -1,3 +1,1400 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO, StringIO
+from unittest import addModuleCleanup, skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from PIL import Image
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import metrics
+from .authentication import user_cache
+from .cache import get_cache
+from .management.commands.import_content import Command as ImportContentCommand
+from .management.commands.stress_likes import Command as StressLikesCommand
+from .middleware import RequestMetricsMiddleware
+from .models import (
+    User, Post, Like, Comment, Follow, ImportCheckpoint, ImportedObject, TimelineEntry, TitleSuggestionJob, TokenUser,
+)
+from .services.ai import suggest_titles
+from .services.bulk import copy_csv, insert_rows
+from .prefetch import with_liked_by
+from .routers import ReplicaRouter, RequestRouting, activate, deactivate
+from .views import (
+    AsyncReadView, CommentListCreateAPIView, HomeTimelineView, PostDetailView, PostListCreateView,
+    PostListWithStatsAPIView,
+)
+from .serializers import EXCERPT_LENGTH, CommentSerializer, PostSerializer, PostWithStatsSerializer
+from .services.counters import HEARTBEAT_KEY, LOCK_KEY, LOCK_TIMEOUT, flush_like_counts, pending_delta
+from .services.export import Export
+from .services.purge import soft_delete_user
+from .services.timeline import home_timeline
+from .urls import urlpatterns
+
+
+def setUpModule():
+    # Sample no requests unless a test opts in, so runs are repeatable and
+    # print no metric lines
+    quiet = override_settings(POSTS_METRICS_SAMPLE_RATE=0.0)
+    quiet.enable()
+    addModuleCleanup(quiet.disable)
+
+
+class PostListWithStatsQueryTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.commenter = User.objects.create_user(username='reader', password='pass12345')
+
+    def make_posts(self, count, comments_per_post=5):
+        for i in range(count):
+            post = Post.objects.create(title=f'Post {i}', content='Body', author=self.author)
+            for j in range(comments_per_post):
+                Comment.objects.create(post=post, user=self.commenter, content=f'Comment {j}')
+
+    def test_query_count_is_constant_in_page_size(self):
+        url = reverse('posts_with_stats')
+        for count in (1, 10):
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.all().delete()
+                self.make_posts(count)
+            # posts + authors, then one windowed query for recent comments
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    def test_recent_comments_are_latest_three_per_post(self):
+        self.make_posts(2)
+        response = self.client.get(reverse('posts_with_stats'))
+        for item in response.data['results']:
+            expected = list(
+                Comment.objects.filter(post_id=item['id'])
+                .order_by('-created_at', '-id')
+                .values_list('id', flat=True)[:3]
+            )
+            self.assertEqual([c['id'] for c in item['recent_comments']], expected)
+            self.assertEqual(item['recent_comments'][0]['user']['username'], 'reader')
+
+
+class PostCounterTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(title='Counted', content='Body', author=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def counts(self):
+        self.post.refresh_from_db()
+        return self.post.like_count, self.post.comment_count
+
+    def test_like_and_unlike_adjust_like_count(self):
+        url = reverse('like_post', args=[self.post.pk])
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_comment_create_and_delete_adjust_comment_count(self):
+        url = reverse('comment_list_create', kwargs={'post_id': self.post.pk})
+        root = self.client.post(url, {'content': 'root'}, format='json').data['id']
+        reply = self.client.post(url, {'content': 'reply', 'parent': root}, format='json').data['id']
+        self.client.post(url, {'content': 'nested', 'parent': reply}, format='json')
+        self.assertEqual(self.counts(), (0, 3))
+
+        # Deleting a comment removes its replies with it
+        self.client.delete(reverse('comment_delete', kwargs={'pk': reply}))
+        self.assertEqual(self.counts(), (0, 1))
+        self.client.delete(reverse('comment_delete', kwargs={'pk': root}))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_recount_repairs_drifted_counts(self):
+        other = Post.objects.create(title='Untouched', content='Body', author=self.user)
+        Like.objects.create(user=self.user, post=self.post)
+        Comment.objects.create(post=self.post, user=self.user, content='one')
+        Comment.objects.create(post=self.post, user=self.user, content='two')
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=0)
+        Post.objects.filter(pk=other.pk).update(like_count=3, comment_count=5)
+
+        out = StringIO()
+        call_command('recount_post_stats', batch_size=1, stdout=out)
+        self.assertIn('Recounted stats for 2 posts', out.getvalue())
+        self.assertEqual(self.counts(), (1, 2))
+        self.assertEqual(Post.objects.filter(pk=other.pk).values_list('like_count', 'comment_count').get(), (0, 0))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        posts = [Post.objects.create(title=f'Post {i}', content='Body', author=self.author) for i in range(7)]
+        # Force ties on created_at so the id tie-breaker is exercised
+        Post.objects.filter(pk__in=[p.pk for p in posts[2:5]]).update(created_at=posts[2].created_at)
+
+    def collect(self, url):
+        ids, pages = [], []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids, pages
+
+    def test_walks_every_post_once_in_feed_order(self):
+        ids, pages = self.collect(reverse('post_list_create') + '?page_size=2')
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 4)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_previous_link_returns_prior_page(self):
+        _, pages = self.collect(reverse('post_list_create') + '?page_size=3')
+        response = self.client.get(pages[1]['previous'])
+        self.assertEqual(response.data['results'], pages[0]['results'])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get(reverse('post_list_create') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryPlanCheckTests(TestCase):
+    def test_read_endpoints_avoid_sequential_scans(self):
+        out = StringIO()
+        call_command('check_query_plans', seed=50, stdout=out)
+        self.assertIn('No sequential scans', out.getvalue())
+        # The seeded rows are rolled back
+        self.assertFalse(Post.objects.exists())
+
+
+class PostSearchTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        author = User.objects.create_user(username='author', password='pass12345')
+        self.in_title = Post.objects.create(title='Postgres indexing', content='Notes', author=author)
+        self.in_body = Post.objects.create(title='Notes', content='All about postgres', author=author)
+        Post.objects.create(title='Cooking', content='Pasta recipes', author=author)
+
+    def search(self, term):
+        response = self.client.get(reverse('post_list_create'), {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_search_filters_on_title_and_content(self):
+        self.assertCountEqual(self.search('postgres'), [self.in_title.id, self.in_body.id])
+
+    @skipUnless(connection.vendor == 'postgresql', 'full-text search requires PostgreSQL')
+    def test_title_matches_rank_above_content_matches(self):
+        self.assertEqual(self.search('postgres'), [self.in_title.id, self.in_body.id])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='author', password='pass12345')
+        self.post = Post.objects.create(title='Cached', content='Body', author=self.user)
+
+    def test_anonymous_detail_is_served_from_cache(self):
+        url = reverse('post_detail', kwargs={'pk': self.post.pk})
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['title'], 'Cached')
+
+    def test_like_invalidates_detail_and_feeds(self):
+        detail = reverse('post_detail', kwargs={'pk': self.post.pk})
+        feed = reverse('posts_with_stats')
+        self.client.get(detail)
+        self.client.get(feed)
+
+        liker = APIClient()
+        liker.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            liker.post(reverse('like_post', kwargs={'post_id': self.post.pk}))
+
+        response = self.client.get(detail)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['likes_count'], 1)
+        response = self.client.get(feed)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['like_count'], 1)
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    reply = "1. First title\n2. Second title"
+    delay = 0
+    calls = 0
+
+    def do_POST(self):
+        type(self).calls += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+        time.sleep(self.delay)
+        body = json.dumps({'candidates': [{'content': {'parts': [{'text': self.reply}]}}]}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # the client already gave up (timeout tests)
+
+    def log_message(self, *args):
+        pass
+
+
+class TitleSuggestionTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGeminiHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        get_cache().clear()
+        FakeGeminiHandler.calls = 0
+        FakeGeminiHandler.delay = 0
+        host, port = self.server.server_address
+        override = override_settings(GEMINI_API_BASE=f'http://{host}:{port}/v1beta', GEMINI_READ_TIMEOUT=0.5)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_identical_content_is_served_from_cache(self):
+        self.assertEqual(suggest_titles('draft'), ['First title', 'Second title'])
+        self.assertEqual(suggest_titles('draft'), ['First title', 'Second title'])
+        self.assertEqual(FakeGeminiHandler.calls, 1)
+
+    def test_slow_response_times_out(self):
+        FakeGeminiHandler.delay = 1
+        self.assertIn('Network or API request error', suggest_titles('slow draft')[0])
+        # errors are not cached
+        FakeGeminiHandler.delay = 0
+        self.assertEqual(suggest_titles('slow draft'), ['First title', 'Second title'])
+
+    def test_async_view_requires_jwt_and_returns_titles(self):
+        url = reverse('title-suggestions-async')
+        self.assertEqual(self.client.post(url, {'content': 'x'}, content_type='application/json').status_code, 401)
+
+        user = User.objects.create_user(username='writer', password='pass12345')
+        token = RefreshToken.for_user(user).access_token
+        response = self.client.post(
+            url, {'content': 'draft'}, content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'suggestions': ['First title', 'Second title']})
+
+    def test_queued_job_is_deduplicated_and_completed_by_worker(self):
+        user = User.objects.create_user(username='writer', password='pass12345')
+        client = APIClient()
+        client.force_authenticate(user)
+        url = reverse('title-suggestion-jobs')
+
+        first = client.post(url, {'content': 'queued draft'}, format='json')
+        second = client.post(url, {'content': 'queued draft'}, format='json')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data['id'], second.data['id'])
+        self.assertEqual(first.data['status'], 'pending')
+
+        call_command('run_title_jobs', once=True, rate=0, stdout=StringIO())
+
+        response = client.get(reverse('title-suggestion-job-detail', kwargs={'pk': first.data['id']}))
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(response.data['suggestions'], ['First title', 'Second title'])
+        self.assertEqual(FakeGeminiHandler.calls, 1)
+
+    @override_settings(TITLE_JOB_WEBHOOK_HOSTS=['hooks.example.com'])
+    def test_jobs_are_per_user(self):
+        url = reverse('title-suggestion-jobs')
+        clients = []
+        for name in ('alice', 'bob'):
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user(username=name, password='pass12345'))
+            clients.append(client)
+        ids = [
+            client.post(url, {'content': 'shared draft', 'callback_url': f'https://hooks.example.com/{n}'}, format='json').data['id']
+            for n, client in enumerate(clients)
+        ]
+        self.assertNotEqual(ids[0], ids[1])
+        self.assertEqual(
+            sorted(TitleSuggestionJob.objects.values_list('callback_url', flat=True)),
+            ['https://hooks.example.com/0', 'https://hooks.example.com/1'],
+        )
+
+        detail = reverse('title-suggestion-job-detail', kwargs={'pk': ids[0]})
+        self.assertEqual(clients[0].get(detail).status_code, 200)
+        self.assertEqual(clients[1].get(detail).status_code, 404)
+
+
+class PostImagePipelineTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(
+            MEDIA_ROOT=media_root,
+            POSTS_IMAGE_PROCESSING='sync',
+            POSTS_IMAGE_VARIANTS={'thumbnail': 40, 'full': 100},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username='author', password='pass12345'))
+
+    def photo(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        buffer = BytesIO()
+        Image.new('RGB', (400, 200), 'red').save(buffer, format='JPEG', exif=exif)
+        return SimpleUploadedFile('photo.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def upload(self, image=None):
+        image = image or self.photo()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('post_list_create'), {'title': 'Photo', 'content': 'Body', 'image': image},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 201)
+        return Post.objects.get(pk=response.data['id'])
+
+    def test_upload_is_stripped_capped_and_gets_variants(self):
+        post = self.upload()
+        with post.image.open('rb') as fh, Image.open(fh) as original:
+            self.assertEqual(original.size, (100, 50))
+            self.assertNotIn('exif', original.info)
+
+        thumbnail = post.image_variants['thumbnail']
+        self.assertEqual((thumbnail['width'], thumbnail['height']), (40, 20))
+        self.assertIn('webp', thumbnail)
+
+        response = self.client.get(reverse('post_detail', kwargs={'pk': post.pk}))
+        srcset = response.data['image_srcset']['webp']
+        self.assertIn(' 40w, ', srcset)
+        self.assertTrue(srcset.endswith(' 100w'))
+
+    def test_variants_use_the_configured_encoder_options(self):
+        with patch.object(Image.Image, 'save', autospec=True, side_effect=Image.Image.save) as save:
+            self.upload()
+        webp = [call.kwargs for call in save.call_args_list if call.kwargs.get('format') == 'WEBP']
+        self.assertTrue(webp)
+        self.assertTrue(all(options['quality'] == 80 and options['method'] == 4 for options in webp))
+
+    def test_source_format_pillow_cannot_write_is_stored_as_png(self):
+        image = self.photo()
+        # Register every plugin first, so restoring SAVE doesn't drop lazily loaded ones
+        Image.init()
+        with patch.dict(Image.SAVE):
+            del Image.SAVE['JPEG']
+            post = self.upload(image)
+        self.assertTrue(post.image.name.endswith('.png'))
+        with post.image.open('rb') as fh, Image.open(fh) as original:
+            self.assertEqual((original.format, original.size), ('PNG', (100, 50)))
+        self.assertIn('webp', post.image_variants['full'])
+
+    def test_storage_failure_keeps_the_upload_and_cleans_up(self):
+        storage = Post._meta.get_field('image').storage
+        save = storage.save
+        saved = []
+
+        def flaky(name, content, *args, **kwargs):
+            if 'variants' in name and 'full' in name:
+                raise OSError('disk full')
+            saved.append(save(name, content, *args, **kwargs))
+            return saved[-1]
+
+        with patch.object(storage, 'save', side_effect=flaky), patch('posts.services.images.logger'):
+            post = self.upload()
+        self.assertEqual(post.image_variants, {'error': 'disk full'})
+        # The upload stays; the capped copy and thumbnail written before the failure don't
+        self.assertTrue(storage.exists(post.image.name))
+        self.assertTrue(saved)
+        self.assertFalse([path for path in saved if path != post.image.name and storage.exists(path)])
+
+
+class HomeTimelineTests(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.writer = User.objects.create_user(username='writer', password='pass12345')
+        self.celebrity = User.objects.create_user(username='celebrity', password='pass12345')
+        self.stranger = User.objects.create_user(username='stranger', password='pass12345')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+        for user in (self.writer, self.celebrity):
+            response = self.client.post(reverse('follow_user', kwargs={'user_id': user.pk}))
+            self.assertEqual(response.status_code, 201)
+
+    def publish(self, author, title):
+        author.refresh_from_db()
+        client = APIClient()
+        client.force_authenticate(author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post(reverse('post_list_create'), {'title': title, 'content': 'Body'})
+        return response.data['id']
+
+    @override_settings(POSTS_FANOUT_THRESHOLD=5)
+    def test_merges_pushed_and_pulled_posts_newest_first(self):
+        User.objects.filter(pk=self.celebrity.pk).update(follower_count=5)
+        pushed = self.publish(self.writer, 'pushed')
+        pulled = self.publish(self.celebrity, 'pulled')
+        self.publish(self.stranger, 'unrelated')
+        own = self.publish(self.reader, 'own')
+
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.reader).values_list('post_id', flat=True)),
+            [own, pushed],
+        )
+        ids, url = [], reverse('home_timeline') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, [own, pulled, pushed])
+
+    def test_unfollow_removes_pushed_posts(self):
+        self.publish(self.writer, 'pushed')
+        self.client.delete(reverse('follow_user', kwargs={'user_id': self.writer.pk}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+        self.writer.refresh_from_db()
+        self.assertEqual(self.writer.follower_count, 0)
+
+
+class CommentThreadTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(title='Thread', content='Body', author=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def comment(self, parent=None):
+        url = reverse('comment_list_create', kwargs={'post_id': self.post.pk})
+        response = self.client.post(url, {'content': 'text', 'parent': parent}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_threads_load_in_constant_queries(self):
+        roots = [self.comment() for _ in range(3)]
+        for root in roots:
+            reply = self.comment(root)
+            self.comment(self.comment(reply))
+
+        url = reverse('comment_threads', kwargs={'post_id': self.post.pk})
+        self.client.force_authenticate(None)
+        # one query for the page of threads, one for all of their replies
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+
+        threads = response.data['results']
+        self.assertEqual([t['id'] for t in threads], roots[::-1])
+        self.assertEqual(threads[0]['reply_count'], 3)
+        reply = threads[0]['replies'][0]
+        self.assertEqual(reply['depth'], 1)
+        self.assertEqual(reply['replies'][0]['replies'][0]['depth'], 3)
+
+        shallow = self.client.get(url, {'depth': 1}).data['results']
+        self.assertEqual(shallow[0]['replies'][0]['replies'], [])
+
+    def test_deleting_a_reply_updates_thread_count(self):
+        root = self.comment()
+        reply = self.comment(root)
+        self.comment(reply)
+        self.client.delete(reverse('comment_delete', kwargs={'pk': reply}))
+        self.assertEqual(Comment.objects.get(pk=root).reply_count, 0)
+
+    def test_parent_must_belong_to_same_post(self):
+        other = Post.objects.create(title='Other', content='Body', author=self.user)
+        foreign = Comment.objects.create(post=other, user=self.user, content='elsewhere')
+        url = reverse('comment_list_create', kwargs={'post_id': self.post.pk})
+        response = self.client.post(url, {'content': 'text', 'parent': foreign.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkLikeTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.posts = [Post.objects.create(title=f'Post {i}', content='Body', author=self.user) for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_like_and_unlike(self):
+        a, b, c = (post.pk for post in self.posts)
+        Like.objects.create(user=self.user, post_id=b)
+        Post.objects.filter(pk=b).update(like_count=1)
+
+        response = self.client.post(reverse('bulk_like'), {'like': [a, b, 999], 'unlike': [c]}, format='json')
+        self.assertEqual(response.data, {str(a): 'liked', str(b): 'already_liked', '999': 'not_found', str(c): 'not_liked'})
+
+        response = self.client.post(reverse('bulk_like'), {'unlike': [a, b]}, format='json')
+        self.assertEqual(response.data, {str(a): 'unliked', str(b): 'unliked'})
+        self.assertEqual(list(Post.objects.order_by('id').values_list('like_count', flat=True)), [0, 0, 0])
+
+    def test_like_lost_to_a_concurrent_request_is_not_counted(self):
+        a, b, _ = (post.pk for post in self.posts)
+
+        def concurrent_like():
+            # Another request likes `a` after our row locks were read
+            Like.objects.create(user=self.user, post_id=a)
+            Post.objects.filter(pk=a).update(like_count=1)
+            return Like.objects.none()
+
+        with patch.object(Like.objects, 'select_for_update', side_effect=concurrent_like):
+            response = self.client.post(reverse('bulk_like'), {'like': [a, b]}, format='json')
+        self.assertEqual(response.data, {str(a): 'already_liked', str(b): 'liked'})
+        self.assertEqual(list(Post.objects.order_by('id').values_list('like_count', flat=True)), [1, 1, 0])
+        self.assertEqual(Like.objects.count(), 2)
+
+    def test_liked_by_me_on_feeds(self):
+        liked = self.posts[0].pk
+        Like.objects.create(user=self.user, post_id=liked)
+
+        for name in ('post_list_create', 'posts_with_stats'):
+            response = self.client.get(reverse(name))
+            flags = {item['id']: item['liked_by_me'] for item in response.data['results']}
+            self.assertEqual(flags, {post.pk: post.pk == liked for post in self.posts})
+
+        response = self.client.get(reverse('bulk_like'), {'ids': f'{liked},{self.posts[1].pk}'})
+        self.assertEqual(response.data, {str(liked): True, str(self.posts[1].pk): False})
+
+
+@override_settings(POSTS_LIKE_COUNTER='buffered')
+class LikeCounterBufferTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.post = Post.objects.create(title='Viral', content='Body', author=self.author)
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='pass12345') for i in range(3)]
+
+    def like(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return client.post(reverse('like_post', args=[self.post.pk]))
+
+    def test_likes_are_written_behind(self):
+        flush_like_counts()
+        with CaptureQueriesContext(connection) as ctx:
+            for fan in self.fans:
+                self.assertEqual(self.like(fan).status_code, 201)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "posts_post"')])
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+        self.assertEqual(flush_like_counts(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 3)
+        self.assertEqual(flush_like_counts(), 0)
+
+    def test_falls_back_to_direct_writes_without_a_flusher(self):
+        self.like(self.fans[0])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_overlapping_flush_is_skipped(self):
+        flush_like_counts()
+        self.like(self.fans[0])
+        get_cache().add(LOCK_KEY, 'other flusher', timeout=LOCK_TIMEOUT)
+        self.assertEqual(flush_like_counts(), 0)
+        self.assertEqual(pending_delta(self.post.pk), 1)
+
+        get_cache().delete(LOCK_KEY)
+        self.assertEqual(flush_like_counts(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+    def test_direct_writes_drain_what_was_buffered(self):
+        flush_like_counts()
+        self.like(self.fans[0])
+        self.assertEqual(pending_delta(self.post.pk), 1)
+        # The flusher stops checking in; the next like is written directly
+        get_cache().delete(HEARTBEAT_KEY)
+        self.like(self.fans[1])
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, pending_delta(self.post.pk)), (2, 0))
+
+        # A flusher that comes back finds nothing left to apply
+        self.assertEqual(flush_like_counts(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+    def test_cache_outage_writes_the_count_directly(self):
+        flush_like_counts()
+        with patch('posts.services.counters._incr', side_effect=ConnectionError('cache down')):
+            self.assertEqual(self.like(self.fans[0]).status_code, 201)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'row-lock waits are sampled from pg_locks')
+class LikeCounterStressTests(TransactionTestCase):
+    def test_buffered_counters_wait_less_on_the_hot_row(self):
+        get_cache().clear()
+        command = StressLikesCommand()
+        direct = command.stress('direct', likes=200, threads=16)
+        buffered = command.stress('buffered', likes=200, threads=16)
+        self.assertEqual(direct['like_count'], 200)
+        self.assertEqual(buffered['like_count'], 200)
+        self.assertLessEqual(buffered['lock_waits'], direct['lock_waits'])
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', email='a@example.com', password='pass12345')
+        self.post = Post.objects.create(title='Long', content='word ' * 100, author=self.author)
+        Comment.objects.create(post=self.post, user=self.author, content='First')
+
+    def test_fields_limit_response_and_columns(self):
+        for name in ('post_list_create', 'posts_with_stats'):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(reverse(name), {'fields': 'id,title,excerpt'})
+            self.assertEqual(response.status_code, 200)
+            item = response.data['results'][0]
+            self.assertEqual(set(item), {'id', 'title', 'excerpt'})
+            self.assertTrue(item['excerpt'].endswith('…'))
+            self.assertEqual(len(item['excerpt']), EXCERPT_LENGTH)
+
+            sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+            self.assertNotRegex(sql, r'"posts_post"\."content"(, "| FROM)')
+            self.assertNotIn('posts_user', sql)
+            self.assertNotIn('posts_comment', sql)
+
+    def test_exclude_and_unknown_fields(self):
+        response = self.client.get(reverse('posts_with_stats'), {'exclude': 'content,recent_comments'})
+        item = response.data['results'][0]
+        self.assertNotIn('content', item)
+        self.assertNotIn('recent_comments', item)
+        self.assertEqual(item['author']['email'], 'a@example.com')
+        self.assertEqual(item['comment_count'], 0)
+
+        response = self.client.get(reverse('post_list_create'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EncodedListContractTests(TestCase):
+    """The fast list path must render exactly what the serializers render."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='zoë', email='z@example.com', password='pass12345')
+        self.client.force_authenticate(self.user)
+        for i in range(4):
+            post = Post.objects.create(
+                title=f'Post {i} ✓', content=('line\u2028break "quoted" ' * 20) if i % 2 else 'short', author=self.user
+            )
+            parent = Comment.objects.create(post=post, user=self.user, content='top ü')
+            Comment.objects.create(post=post, user=self.user, parent=parent, content='reply\u2029')
+        Post.objects.filter(pk=post.pk).update(
+            image='post_images/a.jpg',
+            image_variants={'thumbnail': {'width': 320, 'height': 200, 'webp': 'post_images/variants/a.webp'}},
+            like_count=1,
+        )
+        Like.objects.create(user=self.user, post=post)
+
+    def expected(self, response, serializer_class, instances):
+        context = {'request': Request(response.wsgi_request)}
+        data = dict(response.data, results=serializer_class(instances, many=True, context=context).data)
+        return JSONRenderer().render(data)
+
+    def test_posts_with_stats(self):
+        for params in ({}, {'fields': 'id,excerpt,author,recent_comments'}, {'exclude': 'content'}):
+            response = self.client.get(reverse('posts_with_stats'), params)
+            posts = with_liked_by(Post.objects.order_by('-created_at', '-id'), self.user)
+            self.assertEqual(response.content, self.expected(response, PostWithStatsSerializer, posts))
+
+    def test_comments(self):
+        post = Post.objects.latest('id')
+        response = self.client.get(reverse('comment_list_create', args=[post.pk]))
+        comments = Comment.objects.filter(post=post).order_by('-created_at', '-id')
+        self.assertEqual(response.content, self.expected(response, CommentSerializer, comments))
+        self.assertIn(b'\\u2029', response.content)
+
+
+class AsyncReadViewTests(TestCase):
+    """Under ASGI the read endpoints are async views; they must answer exactly like the DRF views."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(username='reader', password='pass12345')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        for i in range(3):
+            self.post = Post.objects.create(title=f'Post {i}', content='Body ' * 60, author=self.user)
+            Comment.objects.create(post=self.post, user=self.user, content=f'Comment {i}')
+        Like.objects.create(user=self.user, post=self.post)
+        TimelineEntry.objects.create(user=self.user, post=self.post, created_at=self.post.created_at)
+
+    async def fetch(self, view_class, path, method='get', data=None, headers=None, **url_kwargs):
+        view = AsyncReadView.as_view(api_view=view_class)
+        factory = AsyncRequestFactory()
+        if method == 'get':
+            request = factory.get(path, data, headers=headers)
+        else:
+            request = getattr(factory, method)(path, data, content_type='application/json', headers=headers)
+        return await view(request, **url_kwargs)
+
+    async def test_reads_match_the_drf_views(self):
+        cases = [
+            (PostListCreateView, reverse('post_list_create'), {'page_size': 2}, {}),
+            (PostDetailView, reverse('post_detail', args=[self.post.pk]), None, {'pk': self.post.pk}),
+            (PostDetailView, reverse('post_detail', args=[0]), None, {'pk': 0}),
+            (PostListWithStatsAPIView, reverse('posts_with_stats'), {'fields': 'id,excerpt,liked_by_me'}, {}),
+            (CommentListCreateAPIView, reverse('comment_list_create', args=[self.post.pk]), None, {'post_id': self.post.pk}),
+            (HomeTimelineView, reverse('home_timeline'), None, {}),
+        ]
+        for view_class, path, params, url_kwargs in cases:
+            for headers in ({}, self.auth):
+                with self.subTest(path=path, authenticated=bool(headers)):
+                    expected = await self.async_client.get(path, params, headers=headers)
+                    response = await self.fetch(view_class, path, data=params, headers=headers, **url_kwargs)
+                    self.assertEqual(response.status_code, expected.status_code)
+                    self.assertEqual(response.content, expected.content)
+                    for header in ('Content-Type', 'ETag', 'Vary', 'WWW-Authenticate'):
+                        self.assertEqual(response.get(header), expected.get(header), header)
+
+    async def test_revalidation_and_writes(self):
+        path = reverse('post_detail', args=[self.post.pk])
+        first = await self.fetch(PostDetailView, path, headers=self.auth, pk=self.post.pk)
+        self.assertIs(json.loads(first.content)['liked_by_me'], True)
+        headers = {**self.auth, 'If-None-Match': first['ETag']}
+        response = await self.fetch(PostDetailView, path, headers=headers, pk=self.post.pk)
+        self.assertEqual(response.status_code, 304)
+
+        # Writes and the browsable API are handed to the sync view
+        comments = reverse('comment_list_create', args=[self.post.pk])
+        response = await self.fetch(
+            CommentListCreateAPIView, comments, method='post', data={'content': 'Async'}, headers=self.auth,
+            post_id=self.post.pk,
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await self.fetch(CommentListCreateAPIView, comments, headers={'Accept': 'text/html'}, post_id=self.post.pk)
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.post = Post.objects.create(title='Hello', content='Body', author=self.author)
+
+    def test_detail_and_feeds_revalidate_without_queries(self):
+        for url in (reverse('post_detail', args=[self.post.pk]), reverse('post_list_create'), reverse('posts_with_stats')):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], first['ETag'])
+            # Second-resolution dates can't tell two writes in one second apart
+            self.assertFalse(first.has_header('Last-Modified'))
+
+        etag = self.client.get(reverse('post_detail', args=[self.post.pk]))['ETag']
+        liker = APIClient()
+        liker.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            liker.post(reverse('like_post', args=[self.post.pk]))
+        response = self.client.get(reverse('post_detail', args=[self.post.pk]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['likes_count'], 1)
+
+    def test_comment_list_changes_with_new_comments(self):
+        url = reverse('comment_list_create', args=[self.post.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        commenter = APIClient()
+        commenter.force_authenticate(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            commenter.post(url, {'content': 'First'}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_renaming_the_author_changes_embedding_responses(self):
+        reader = User.objects.create_user(username='reader', password='pass12345')
+        Comment.objects.create(post=self.post, user=reader, content='Hi')
+        urls = [
+            reverse('post_detail', args=[self.post.pk]), reverse('post_list_create'),
+            reverse('comment_list_create', args=[self.post.pk]),
+        ]
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        # Saves that leave the embedded fields alone keep the validators
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save(update_fields=['last_login'])
+            reader.first_name = 'Rea'
+            reader.save()
+        self.assertEqual([self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code for url, etag in zip(urls, etags)], [304] * 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+            reader.username = 'reader2'
+            reader.save(update_fields=['username'])
+        responses = [self.client.get(url, HTTP_IF_NONE_MATCH=etag) for url, etag in zip(urls, etags)]
+        self.assertEqual([response.status_code for response in responses], [200] * 3)
+        self.assertEqual(responses[0].data['author']['username'], 'renamed')
+        self.assertEqual(responses[2].data['results'][0]['user'], 'reader2')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BenchmarkSuiteTests(TestCase):
+    def test_seed_and_benchmark_every_route(self):
+        call_command(
+            'seed_bench', users=8, posts=20, likes=40, comments=60, follows=3, stdout=StringIO(),
+        )
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(Comment.objects.filter(parent__isnull=False, depth=0).count(), 0)
+        for post in Post.objects.all():
+            self.assertEqual(post.like_count, post.likes.count())
+        for root in Comment.objects.filter(parent__isnull=True):
+            self.assertEqual(root.reply_count, Comment.objects.filter(root=root).count())
+        # Seeded timestamps are kept, without switching auto_now off for the process
+        self.assertLess(Post.objects.latest('created_at').created_at.year, 2025)
+        self.assertTrue(Post._meta.get_field('created_at').auto_now_add)
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command('bench_routes', requests=2, warmup=0, output=output.name, stderr=StringIO())
+            with open(output.name) as fh:
+                routes = json.load(fh)['routes']
+        self.assertEqual(set(routes), {pattern.name for pattern in urlpatterns})
+        for name, result in routes.items():
+            self.assertLess(result['status'], 400, name)
+            self.assertGreater(result['queries'], 0, name)
+        # Everything the benchmark wrote was rolled back
+        self.assertFalse(User.objects.filter(username='__bench_routes__').exists())
+
+
+class ConnectionBenchmarkTests(TestCase):
+    def test_persistent_connections_are_reused(self):
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            call_command(
+                'bench_connections', requests=20, threads=2, mode=['fresh', 'persistent'],
+                output=output.name, stdout=StringIO(),
+            )
+            with open(output.name) as fh:
+                results = json.load(fh)
+        self.assertEqual(results['persistent']['requests'], 20)
+        # One connection per thread, however many requests it serves
+        self.assertEqual(results['persistent']['connects'], 2)
+        self.assertIn('saved_p50_ms', results['persistent'])
+        if connection.vendor != 'sqlite':  # in-memory SQLite ignores close()
+            self.assertEqual(results['fresh']['connects'], 20)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_1'], POSTS_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(title='Hello', content='Body', author=self.author)
+
+    def client_for(self, user):
+        token = RefreshToken.for_user(user).access_token
+        return APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def reads(self, client, path):
+        """The aliases the router picked for each read of a GET to `path`."""
+        picked = []
+        route = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            picked.append(route(router, model, **hints))
+            return None  # there is no replica_1 here; run the query on default
+
+        with patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=spy):
+            self.assertEqual(client.get(path).status_code, 200)
+        return set(picked)
+
+    def settled(self):
+        """Replicas have caught up with every write (pins set earlier still hold)."""
+        return override_settings(POSTS_REPLICA_STICKY_SECONDS=0)
+
+    def test_router_reads_from_replica_until_the_request_writes(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        routing = RequestRouting()
+        routing.replica = 'replica_1'
+        token = activate(routing)
+        try:
+            self.assertEqual(router.db_for_read(Post), 'replica_1')
+            self.assertEqual(router.db_for_write(Post), 'default')
+            self.assertIsNone(router.db_for_read(Post))
+        finally:
+            deactivate(token)
+        self.assertFalse(router.allow_migrate('replica_1', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+
+    def test_authors_read_their_writes_from_the_primary(self):
+        comments = reverse('comment_list_create', args=[self.post.pk])
+        author = self.client_for(self.author)
+        with self.settled():
+            self.assertEqual(self.reads(author, comments), {'replica_1'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = author.post(comments, {'content': 'First!'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        with self.settled():
+            self.assertEqual(self.reads(author, comments), {None})
+            self.assertEqual(self.reads(self.client_for(self.reader), comments), {'replica_1'})
+            self.assertEqual(self.reads(APIClient(), reverse('post_list_create')), {'replica_1'})
+
+    def test_reads_right_after_a_write_skip_the_replica(self):
+        feed = reverse('post_list_create')
+        with self.settled():
+            self.assertEqual(self.reads(APIClient(), feed), {'replica_1'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(title='Fresh', content='Body', author=self.author)
+        # The miss that fills the new version's cache entry, and its ETag, reads the primary
+        self.assertEqual(self.reads(APIClient(), feed), {None})
+        self.assertEqual(self.reads(APIClient(), reverse('post_detail', args=[self.post.pk])), {None})
+        with self.settled():
+            self.assertEqual(self.reads(self.client_for(self.reader), feed), {'replica_1'})
+
+
+@override_settings(POSTS_METRICS_SAMPLE_RATE=1.0, POSTS_METRICS_DUPLICATE_THRESHOLD=3)
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        # Sampled requests not checked with assertLogs() stay out of the test output
+        quiet = patch.object(logging.getLogger('posts.metrics'), 'handlers', [logging.NullHandler()])
+        quiet.start()
+        self.addCleanup(quiet.stop)
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        for i in range(4):
+            post = Post.objects.create(title=f'Post {i}', content='Body', author=self.author)
+            Comment.objects.create(post=post, user=self.author, content='Hi')
+
+    def test_server_timing_logs_and_histogram(self):
+        with self.assertLogs('posts.metrics', level='INFO') as logs:
+            response = self.client.get(reverse('posts_with_stats'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", serialize;dur=[\d.]+, render;dur=[\d.]+, app;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['route'], 'GET /api/posts-with-stats/')
+        self.assertGreater(record['serialize_ms'], 0)
+        self.assertEqual(record['bytes'], len(response.content))
+        self.assertEqual(record['duplicates'], [])
+
+        histograms = metrics.get_histograms()
+        self.assertEqual(histograms['GET /api/posts-with-stats/']['count'], 1)
+        self.assertEqual(histograms['GET /api/posts-with-stats/']['mean_queries'], record['queries'])
+
+        out = StringIO()
+        call_command('request_metrics', stdout=out)
+        self.assertIn('GET /api/posts-with-stats/', out.getvalue())
+
+    def test_repeated_queries_are_flagged(self):
+        # Without the prefetch every post loads its comments separately
+        with patch('posts.views.latest_comments_prefetch', return_value='comments'), \
+                patch('posts.views.PostListWithStatsAPIView.get_encoder_overrides', return_value={}), \
+                self.assertLogs('posts.metrics', level='WARNING') as logs:
+            response = self.client.get(reverse('posts_with_stats'))
+        record = logs.records[0].metrics
+        self.assertEqual(record['duplicates'][0]['count'], 4)
+        self.assertIn('dup;desc="4x', response['Server-Timing'])
+
+    async def test_async_requests_count_their_queries(self):
+        async def view(request):
+            return HttpResponse(str(await Post.objects.acount()))
+
+        response = await RequestMetricsMiddleware(view)(AsyncRequestFactory().get('/api/posts/'))
+        self.assertEqual(response.content, b'4')
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    async def test_async_views_time_serialization(self):
+        post = await Post.objects.alatest('id')
+        detail = AsyncReadView.as_view(api_view=PostDetailView)
+
+        async def view(request):
+            return await detail(request, pk=post.pk)
+
+        with patch.object(PostDetailView, 'serialize_object', autospec=True, side_effect=lambda view, obj: time.sleep(0.02) or {}):
+            response = await RequestMetricsMiddleware(view)(AsyncRequestFactory().get(f'/api/posts/{post.pk}/'))
+        self.assertGreaterEqual(float(re.search(r'serialize;dur=([\d.]+)', response['Server-Timing'])[1]), 20)
+
+    def test_histogram_endpoint_is_admin_only(self):
+        self.client.get(reverse('post_list_create'))
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 403)
+        User.objects.filter(pk=self.author.pk).update(is_staff=True)
+        self.author.refresh_from_db()
+        self.client.force_authenticate(self.author)
+        self.assertIn('GET /api/posts/', self.client.get(reverse('request_metrics')).data)
+
+        # GET has no side effects; DELETE clears the histograms
+        self.client.get(reverse('request_metrics'), {'reset': 1})
+        self.assertIn('GET /api/posts/', metrics.get_histograms())
+        self.assertEqual(self.client.delete(reverse('request_metrics')).status_code, 204)
+        # Only the DELETE itself, sampled after the reset, is left
+        self.assertEqual(metrics.get_routes(get_cache()), ['DELETE /api/metrics/'])
+        self.client.get(reverse('post_list_create'))
+        self.assertEqual(list(metrics.get_histograms()), ['DELETE /api/metrics/', 'GET /api/posts/'])
+
+
+class StatelessJWTAuthTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        user_cache.clear()
+        self.user = User.objects.create_user(username='author', password='pass12345')
+        response = APIClient().post(reverse('token_obtain_pair'), {'username': 'author', 'password': 'pass12345'}, format='json')
+        self.access = response.data['access']
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def user_queries(self, path, method='get', data=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, method)(path, data)
+        return response, [q['sql'] for q in ctx.captured_queries if 'FROM "posts_user"' in q['sql']]
+
+    def test_claims_authenticate_without_loading_the_user(self):
+        response, queries = self.user_queries(reverse('home_timeline'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+        response, queries = self.user_queries(reverse('post_list_create'), 'post', {'title': 'Hi', 'content': 'Body'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.objects.get().author, self.user)
+
+    def test_other_fields_load_once_through_the_user_cache(self):
+        user = TokenUser.from_claims(self.user.pk, 'author', True)
+        self.assertFalse(user.is_staff)
+        self.assertFalse(TokenUser.from_claims(self.user.pk, 'author', True).is_superuser)
+        self.assertEqual(list(user_cache.entries), [self.user.pk])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('request_metrics')).status_code, 403)
+
+    def test_deactivated_user_is_refused(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(reverse('home_timeline')).status_code, 401)
+
+        self.user.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(reverse('home_timeline')).status_code, 200)
+
+    def test_tokens_without_claims_use_the_cached_user(self):
+        self.client = APIClient(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(self.client.get(reverse('home_timeline')).status_code, 200)
+        response, queries = self.user_queries(reverse('home_timeline'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+        self.assertIn(self.user.pk, user_cache.entries)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='pass12345', is_staff=True)
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.posts = [
+            Post.objects.create(title=f'Post {i}', content='Body, "quoted"', author=self.author if i % 2 else self.admin)
+            for i in range(5)
+        ]
+        Comment.objects.create(post=self.posts[0], user=self.author, content='Hi')
+        Like.objects.create(post=self.posts[0], user=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_posts_stream_as_ndjson(self):
+        with patch('posts.services.export.BUFFER_BYTES', 1):
+            response = self.client.get(reverse('export', args=['posts', 'ndjson']))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [post.pk for post in self.posts])
+        detail = PostSerializer(self.posts[0]).data
+        self.assertEqual(rows[0]['created_at'], detail['created_at'])
+        self.assertEqual(rows[0]['content'], 'Body, "quoted"')
+        self.assertEqual(len(chunks), len(rows) + 1)
+
+    def test_filters_csv_and_gzip(self):
+        response = self.client.get(
+            reverse('export', args=['posts', 'csv']),
+            {'author': self.author.pk, 'since': '2000-01-01'},
+            HTTP_ACCEPT_ENCODING='gzip, deflate',
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        rows = list(csv.reader(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'author_id', 'title'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [post.pk for post in self.posts if post.author == self.author])
+        self.assertEqual(rows[1][3], 'Body, "quoted"')
+
+        response = self.client.get(reverse('export', args=['likes', 'ndjson']), {'until': '2000-01-01'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+    def test_admin_only_and_validation(self):
+        self.assertEqual(self.client.get(reverse('export', args=['users', 'csv'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export', args=['posts', 'csv']), {'since': 'soon'}).status_code, 400)
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(reverse('export', args=['posts', 'csv'])).status_code, 403)
+
+    def test_command_writes_gzipped_file(self):
+        path = os.path.join(tempfile.mkdtemp(), 'comments.ndjson.gz')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('export_posts', '--kind', 'comments', '--gzip', '--chunk-size', '1', '--output', path, stderr=StringIO())
+        with gzip.open(path) as fh:
+            rows = [json.loads(line) for line in fh]
+        self.assertEqual([(row['post_id'], row['user_id'], row['content']) for row in rows], [(self.posts[0].pk, self.author.pk, 'Hi')])
+
+
+class ImportContentTests(TestCase):
+    RECORDS = [
+        {'type': 'post', 'id': 'p1', 'author': 'alice', 'title': 'Old', 'content': 'From before', 'created_at': '2019-05-01T10:00:00Z'},
+        {'type': 'post', 'id': 'p2', 'author': 'ghost', 'title': 'Orphan', 'content': 'x'},
+        {'type': 'comment', 'id': 'c1', 'post': 'p1', 'user': 'bob', 'content': 'First', 'created_at': '2019-05-02T10:00:00Z'},
+        {'type': 'comment', 'id': 'c2', 'post': 'p1', 'parent': 'c1', 'user': 'alice', 'content': 'Reply'},
+        {'type': 'comment', 'id': 'c3', 'post': 'p1', 'parent': 'c2', 'user': 'bob', 'content': 'Nested'},
+        {'type': 'like', 'post': 'p1', 'user': 'bob', 'created_at': '2019-05-03T10:00:00Z'},
+        {'type': 'like', 'post': 'p1', 'user': 'bob'},
+        {'type': 'like', 'post': 'p2', 'user': 'bob'},
+    ]
+
+    def setUp(self):
+        get_cache().clear()
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        self.path = os.path.join(tempfile.mkdtemp(), 'legacy.ndjson.gz')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.path))
+        with gzip.open(self.path, 'wt') as fh:
+            for record in self.RECORDS[:4]:
+                fh.write(json.dumps(record) + '\n')
+            fh.write('not json\n')
+            for record in self.RECORDS[4:]:
+                fh.write(json.dumps(record) + '\n')
+
+    def run_import(self, *args):
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_content', self.path, '--chunk-size', '3', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def assert_imported(self):
+        post = Post.objects.get()
+        self.assertEqual((post.author, post.title), (self.alice, 'Old'))
+        self.assertEqual(post.created_at.isoformat(), '2019-05-01T10:00:00+00:00')
+        self.assertEqual((post.like_count, post.comment_count), (1, 3))
+
+        first, reply, nested = Comment.objects.order_by('id')
+        self.assertEqual(first.created_at.isoformat(), '2019-05-02T10:00:00+00:00')
+        self.assertEqual((reply.parent, reply.root, reply.depth), (first, first, 1))
+        self.assertEqual((nested.parent, nested.root, nested.depth), (reply, first, 2))
+        self.assertEqual(first.reply_count, 2)
+        self.assertEqual(Like.objects.get().user, self.bob)
+        self.assertEqual(ImportedObject.objects.count(), 4)
+
+    def test_import_remaps_references_and_keeps_timestamps(self):
+        out = self.run_import()
+        self.assertIn('rows/s', out)
+        self.assert_imported()
+        checkpoint = ImportCheckpoint.objects.get()
+        self.assertTrue(checkpoint.done)
+        self.assertEqual(checkpoint.lines, 9)
+        self.assertEqual(checkpoint.counts, {'posts': 1, 'comments': 3, 'likes': 1, 'skipped': 3, 'duplicates': 1})
+        self.assertIn('already imported', self.run_import())
+
+    def test_interrupted_import_resumes_from_checkpoint(self):
+        original = ImportContentCommand.import_chunk
+        calls = []
+
+        def flaky(command, lines, first_line):
+            calls.append(first_line)
+            if len(calls) == 2:
+                raise RuntimeError('connection lost')
+            return original(command, lines, first_line)
+
+        with patch.object(ImportContentCommand, 'import_chunk', autospec=True, side_effect=flaky):
+            with self.assertRaises(RuntimeError):
+                self.run_import()
+        self.assertEqual(ImportCheckpoint.objects.get().lines, 3)
+        self.assertEqual(Comment.objects.count(), 1)
+
+        self.assertIn('resuming at line 4', self.run_import())
+        self.assert_imported()
+        # A rerun from the top skips everything already imported
+        self.run_import('--restart')
+        self.assert_imported()
+
+    def test_create_users(self):
+        self.run_import('--create-users')
+        ghost = User.objects.get(username='ghost')
+        self.assertFalse(ghost.has_usable_password())
+        self.assertEqual(Post.objects.filter(author=ghost).count(), 1)
+        self.assertEqual(Like.objects.count(), 2)
+
+
+    def test_insert_rows_counts_only_new_rows(self):
+        post = Post.objects.create(title='Liked', content='Body', author=self.alice)
+        rows = [(self.bob.pk, post.pk), (self.alice.pk, post.pk)]
+        self.assertEqual(insert_rows(Like, ('user_id', 'post_id'), rows[:1]), 1)
+        self.assertEqual(insert_rows(Like, ('user_id', 'post_id'), rows, batch_size=1), 1)
+        self.assertEqual(Like.objects.count(), 2)
+
+    def test_copy_csv_keeps_blanks_apart_from_nulls(self):
+        buffer, count = copy_csv([(1, '', None), (2, 'say "hi"', 'a,b')])
+        self.assertEqual(count, 2)
+        self.assertEqual(buffer.read(), '"1","",\n"2","say ""hi""","a,b"\n')
+
+
+class SoftDeleteTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        user_cache.clear()
+        self.author = User.objects.create_user(username='author', password='pass12345')
+        self.reader = User.objects.create_user(username='reader', password='pass12345')
+        self.post = Post.objects.create(title='Doomed', content='Body', author=self.author)
+        self.other = Post.objects.create(title='Stays', content='Body', author=self.reader)
+        self.client = APIClient()
+
+    def thread(self, post, users, replies):
+        """A top-level comment with `replies` nested replies below it, alternating users."""
+        parent = Comment.objects.create(post=post, user=users[0], content='Top')
+        top = parent
+        for i in range(replies):
+            parent = Comment.objects.create(post=post, user=users[(i + 1) % len(users)], content='Re', parent=parent)
+        Post.objects.filter(pk=post.pk).update(comment_count=replies + 1)
+        Comment.objects.filter(pk=top.pk).update(reply_count=replies)
+        return top
+
+    def delete_post(self):
+        self.client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('post_detail', args=[self.post.pk]))
+        self.assertEqual(response.status_code, 204)
+        return len(ctx.captured_queries)
+
+    def test_deleting_a_post_hides_it_without_touching_dependents(self):
+        self.thread(self.post, [self.reader, self.author], 5)
+        Like.objects.create(post=self.post, user=self.reader)
+        queries = self.delete_post()
+        self.assertLessEqual(queries, 4)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 6)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(reverse('post_detail', args=[self.post.pk])).status_code, 404)
+        self.assertEqual([post['id'] for post in self.client.get(reverse('post_list_create')).data['results']], [self.other.pk])
+        self.assertEqual(self.client.get(reverse('comment_list_create', args=[self.post.pk])).data['results'], [])
+
+        out = StringIO()
+        call_command('purge_deleted', '--batch-size', '2', stdout=out)
+        self.assertIn('Purged 1 posts and 0 users (8 rows)', out.getvalue())
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Like.objects.exists())
+
+    def test_deleted_posts_leave_feeds_and_exports(self):
+        Post.objects.filter(pk=self.other.pk).update(created_at=self.post.created_at - timedelta(minutes=1))
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user=self.reader, post=post, created_at=Post.objects.get(pk=post.pk).created_at)
+            for post in (self.post, self.other)
+        ])
+        Comment.objects.create(post=self.post, user=self.reader, content='Gone')
+        Like.objects.create(post=self.post, user=self.reader)
+        Like.objects.create(post=self.other, user=self.author)
+        self.delete_post()
+
+        self.assertFalse(TimelineEntry.objects.filter(post=self.post).exists())
+        self.assertEqual(home_timeline(self.reader, 1), [self.other])
+        self.assertEqual(b''.join(Export('comments')), b'')
+        rows = [json.loads(line) for line in b''.join(Export('likes')).splitlines()]
+        self.assertEqual([row['post_id'] for row in rows], [self.other.pk])
+
+    def test_feed_skips_posts_of_deleted_accounts(self):
+        gone = [Post.objects.create(title=f'Gone {i}', content='Body', author=self.author) for i in range(4)]
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user=self.reader, post=post, created_at=post.created_at) for post in [self.post, self.other, *gone]
+        ])
+        with self.captureOnCommitCallbacks(execute=True):
+            soft_delete_user(self.author)
+        # The rows stay until the purge; reads step over them without a join
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 6)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(home_timeline(self.reader, 1), [self.other])
+        self.assertNotIn('posts_post', ctx.captured_queries[1]['sql'].split('FROM')[1].split('WHERE')[0])
+
+    def test_deleting_an_account_purges_everything_it_owns(self):
+        Follow.objects.create(follower=self.author, followee=self.reader)
+        User.objects.filter(pk=self.reader.pk).update(follower_count=1)
+        Like.objects.create(post=self.other, user=self.author)
+        Post.objects.filter(pk=self.other.pk).update(like_count=1)
+        # The author's comment on the other post, a reply to it by the reader, and the reader's own thread
+        top = self.thread(self.other, [self.reader], 0)
+        mine = Comment.objects.create(post=self.other, user=self.author, content='Mine', parent=top)
+        Comment.objects.create(post=self.other, user=self.reader, content='Re', parent=mine)
+        Post.objects.filter(pk=self.other.pk).update(comment_count=3)
+        Comment.objects.filter(pk=top.pk).update(reply_count=2)
+
+        # Cached and conditional responses that show the account's likes and comments
+        detail = reverse('post_detail', args=[self.other.pk])
+        self.assertEqual(self.client.get(detail).data['likes_count'], 1)
+        comments = reverse('comment_list_create', args=[self.other.pk])
+        etag = self.client.get(comments)['ETag']
+        for i in range(5):
+            Post.objects.create(title=f'More {i}', content='Body', author=self.author)
+
+        token = RefreshToken.for_user(self.author).access_token
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.delete(reverse('account_delete')).status_code, 204)
+        self.assertLessEqual(len(ctx.captured_queries), 6)
+        self.assertEqual(client.get(reverse('home_timeline')).status_code, 401)
+        self.assertEqual(self.client.get(reverse('post_detail', args=[self.post.pk])).status_code, 404)
+
+        # Hidden and uncounted right away, before any purge
+        self.assertEqual(self.client.get(detail).data['likes_count'], 0)
+        response = self.client.get(comments, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Mine', [comment['content'] for comment in response.data['results']])
+        threads = self.client.get(reverse('comment_threads', args=[self.other.pk])).data['results']
+        self.assertEqual([(thread['id'], thread['replies']) for thread in threads], [(top.pk, [])])
+        self.assertNotIn(b'Mine', b''.join(Export('comments')))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_deleted', '--batch-size', '1', stdout=StringIO())
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.other.refresh_from_db()
+        self.assertEqual((self.other.like_count, self.other.comment_count), (0, 1))
+        top.refresh_from_db()
+        self.assertEqual(top.reply_count, 0)
+        self.reader.refresh_from_db()
+        self.assertEqual(self.reader.follower_count, 0)
@@ -1,35 +1,70 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import get_title_suggestions
+from .views import get_title_suggestions, get_title_suggestions_async
 
 from .views import (
     RegisterView,
+    AccountDeleteView,
     PostListCreateView,
     PostDetailView,
     LikePostAPIView,
+    BulkLikeAPIView,
     CommentListCreateAPIView,
+    CommentThreadListAPIView,
     CommentDeleteAPIView,
-    PostListWithStatsAPIView
+    PostListWithStatsAPIView,
+    FollowUserAPIView,
+    HomeTimelineView,
+    TitleSuggestionJobCreateView,
+    TitleSuggestionJobDetailView,
+    RequestMetricsView,
+    ExportView,
+    AsyncReadView,
 )
 
+
+def read_view(view_class):
+    """The view's GETs natively async under ASGI (postify/asgi.py), the plain DRF view under WSGI."""
+    if settings.SERVER_INTERFACE == 'asgi':
+        return AsyncReadView.as_view(api_view=view_class)
+    return view_class.as_view()
+
+
 urlpatterns = [
     # Authentication
     path('auth/register/', RegisterView.as_view(), name='register'),
     path('auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/account/', AccountDeleteView.as_view(), name='account_delete'),
 
     # Posts
-    path('posts/', PostListCreateView.as_view(), name='post_list_create'),
-    path('posts/<int:pk>/', PostDetailView.as_view(), name='post_detail'),
+    path('posts/', read_view(PostListCreateView), name='post_list_create'),
+    path('posts/<int:pk>/', read_view(PostDetailView), name='post_detail'),
     path('posts/<int:post_id>/like/', LikePostAPIView.as_view(), name='like_post'),
-    path('posts/<int:post_id>/comments/', CommentListCreateAPIView.as_view(), name='comment_list_create'),
+    path('posts/likes/', BulkLikeAPIView.as_view(), name='bulk_like'),
+    path('posts/<int:post_id>/comments/', read_view(CommentListCreateAPIView), name='comment_list_create'),
+    path('posts/<int:post_id>/comments/threads/', CommentThreadListAPIView.as_view(), name='comment_threads'),
 
     # Comments
     path('comments/<int:pk>/delete/', CommentDeleteAPIView.as_view(), name='comment_delete'),
 
+    # Follows and home timeline
+    path('users/<int:user_id>/follow/', FollowUserAPIView.as_view(), name='follow_user'),
+    path('timeline/', read_view(HomeTimelineView), name='home_timeline'),
+
     # Stats
-    path('posts-with-stats/', PostListWithStatsAPIView.as_view(), name='posts_with_stats'),
+    path('posts-with-stats/', read_view(PostListWithStatsAPIView), name='posts_with_stats'),
+
+    # Streaming exports (admin only), e.g. export/posts.ndjson, export/likes.csv
+    path('export/<str:kind>.<str:fmt>', ExportView.as_view(), name='export'),
+
+    # Request metrics (admin only)
+    path('metrics/', RequestMetricsView.as_view(), name='request_metrics'),
 
     # Ai suggestions
     path("title-suggestions/", get_title_suggestions, name="title-suggestions"),
+    path("title-suggestions/async/", get_title_suggestions_async, name="title-suggestions-async"),
+    path("title-suggestions/jobs/", TitleSuggestionJobCreateView.as_view(), name="title-suggestion-jobs"),
+    path("title-suggestions/jobs/<uuid:pk>/", TitleSuggestionJobDetailView.as_view(), name="title-suggestion-job-detail"),
 ]
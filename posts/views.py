@@ -1,64 +1,314 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
 from django.shortcuts import get_object_or_404
-from django.db.models import Prefetch
-from rest_framework import generics, permissions, viewsets, filters, status
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Left
+from rest_framework import exceptions, generics, permissions, viewsets, filters, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.parsers import MultiPartParser, FormParser
-from .services.ai import suggest_titles
+from .services.ai import suggest_titles, asuggest_titles
+from .services.counters import adjust_like_counts
+from .services.export import EXPORTS, FORMATS, Export
+from .services.images import schedule_image_processing
+from .services.purge import soft_delete_post, soft_delete_user
+from .services.jobs import enqueue_title_job
+from .services.likes import apply_likes, liked_post_ids
+from .services.timeline import backfill_timeline, fan_out_post, home_timeline, remove_from_timeline
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import api_view, permission_classes
+from .authentication import StatelessJWTAuthentication
 
 
-from .models import Post, Like, Comment
+from .models import User, Post, Like, Comment, Follow, TitleSuggestionJob
 from .serializers import (
     RegisterSerializer,
     PostSerializer,
     LikeSerializer,
     CommentSerializer,
-    PostWithStatsSerializer
+    CommentThreadSerializer,
+    CommentPreviewSerializer,
+    PostWithStatsSerializer,
+    TitleSuggestionJobSerializer,
+    BulkLikeSerializer,
+    ExportFilterSerializer,
+    EXCERPT_LENGTH,
 )
+from .cache import CachedResponseMixin, ConditionalGetMixin, FEED_POSTS, FEED_STATS
+from .encoders import compile_encoder
+from .filters import PostSearchFilter
+from .metrics import get_histograms, reset_histograms, timed
+from .pagination import KeysetCursorPagination, TimelinePagination
 from .permissions import IsAuthorOrReadOnly
+from .prefetch import attach_comment_threads, latest_comments_prefetch, with_liked_by
 
 # User Registration
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
 
+
+class AccountDeleteView(APIView):
+    """Delete your own account: it is deactivated and hidden now, and purged later."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def delete(self, request):
+        soft_delete_user(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class SparseQuerysetMixin:
+    """
+    Load only the columns that the serializer's fields read once
+    `?fields=` / `?exclude=` have been applied, so unused columns such as
+    `content` are never fetched. The keyset cursor always needs `id` and
+    `created_at`.
+    """
+
+    def get_fieldset_serializer(self):
+        if not hasattr(self, '_fieldset_serializer'):
+            self._fieldset_serializer = self.get_serializer()
+        return self._fieldset_serializer
+
+    def get_serializer_fields(self):
+        return self.get_fieldset_serializer().fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        fields = self.get_serializer_fields()
+        columns = self.get_fieldset_serializer().load_columns()
+        if 'excerpt' in fields and 'content' not in columns:
+            queryset = queryset.annotate(content_head=Left('content', EXCERPT_LENGTH + 1))
+        # Drop joins whose fields were not asked for; only() rejects them.
+        related = {column.split('__')[0] for column in columns if '__' in column}
+        queryset = queryset.select_related(None)
+        if related:
+            queryset = queryset.select_related(*related)
+        return queryset.only('id', 'created_at', *columns)
+
+
+class TimedListMixin:
+    """
+    list() with the page turned into data by `serialize_page()`, timed as
+    `serialize` in the request metrics (see RequestMetricsMiddleware).
+    """
+
+    def serialize_page(self, rows):
+        return self.get_serializer(rows, many=True).data
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        with timed(request, 'serialize'):
+            data = self.serialize_page(queryset if page is None else page)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+
+class TimedRetrieveMixin:
+    """retrieve() with serialization timed like TimedListMixin's."""
+
+    def serialize_object(self, obj):
+        return self.get_serializer(obj).data
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        with timed(request, 'serialize'):
+            return Response(self.serialize_object(instance))
+
+
+class EncodedListMixin(TimedListMixin):
+    """
+    Render list pages through a compiled row encoder (see encoders.py)
+    instead of `serializer.data`. The JSON is identical, but the per-field
+    overhead DRF pays on every row is paid only once per request.
+    """
+
+    def get_encoder_overrides(self, serializer):
+        return {}
+
+    def serialize_page(self, rows):
+        serializer = self.get_serializer()
+        encode = compile_encoder(serializer, self.get_encoder_overrides(serializer))
+        return [encode(obj) for obj in rows]
+
+
+class AsyncListMixin(TimedListMixin):
+    """
+    `aget()` for AsyncReadView: list() with the page fetched through the
+    async ORM. Views must use one of the keyset paginators.
+    """
+
+    async def aget(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        with timed(request, 'serialize'):
+            data = self.serialize_page(page)
+        return self.get_paginated_response(data)
+
+
+class AsyncRetrieveMixin(TimedRetrieveMixin):
+    """`aget()` for AsyncReadView: retrieve() with the object fetched through the async ORM."""
+
+    async def aget(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        with timed(request, 'serialize'):
+            return Response(self.serialize_object(instance))
+
+    async def aget_object(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncReadView(View):
+    """
+    Serve GETs of a DRF view (`api_view`, which provides `aget()`) as a
+    native async view, for ASGI deployments; see read_view() in urls.py.
+
+    Content negotiation, authentication, permissions, throttles, exception
+    handling and finalize_response() all come from the DRF view, so the
+    response is the same; only the database and cache calls are awaited.
+    Other methods, and GETs that negotiate the browsable API, are passed to
+    the sync DRF view.
+    """
+    api_view = None
+    sync_view = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        initkwargs.setdefault('sync_view', initkwargs['api_view'].as_view())
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def get(self, request, *args, **kwargs):
+        view = self.api_view()
+        view.setup(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        view.format_kwarg = view.get_format_suffix(**kwargs)
+        drf_request = view.request = view.initialize_request(request, *args, **kwargs)
+        try:
+            drf_request.accepted_renderer, drf_request.accepted_media_type = view.perform_content_negotiation(drf_request)
+            if drf_request.accepted_renderer.format != 'json':
+                return await self.delegate(request, *args, **kwargs)
+            drf_request.version, drf_request.versioning_scheme = view.determine_version(drf_request, *args, **kwargs)
+            await self.authenticate(drf_request)
+            view.check_permissions(drf_request)
+            view.check_throttles(drf_request)
+            response = await view.aget(drf_request, *args, **kwargs)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+
+        response = view.finalize_response(drf_request, response, *args, **kwargs)
+        if not isinstance(response, Response):
+            return response
+        # Rendered here, or the handler would render it in a worker thread.
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    async def authenticate(self, request):
+        """Request._authenticate(), awaiting authenticators that offer aauthenticate()."""
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth = await authenticator.aauthenticate(request)
+                else:
+                    user_auth = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth
+                return
+        request._not_authenticated()
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    post = put = patch = delete = options = delegate
+
+
+class LikedByMeMixin(SparseQuerysetMixin):
+    """Annotate the view's posts with `liked_by_me` for the requesting user."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == 'GET' and 'liked_by_me' not in self.get_serializer_fields():
+            return queryset
+        return with_liked_by(queryset, self.request.user)
+
+
 # Posts
-class PostListCreateView(generics.ListCreateAPIView):
-    queryset = Post.objects.all()
+class PostListCreateView(ConditionalGetMixin, CachedResponseMixin, LikedByMeMixin, AsyncListMixin, generics.ListCreateAPIView):
+    queryset = Post.objects.select_related('author')
     serializer_class = PostSerializer
     parser_classes = [MultiPartParser, FormParser] 
+    pagination_class = KeysetCursorPagination
+    filter_backends = [PostSearchFilter]
+    search_fields = ['title', 'content']
+    cache_feed = FEED_POSTS
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        schedule_image_processing(post)
+        transaction.on_commit(lambda: fan_out_post(post))
 
 
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all()
+class PostDetailView(ConditionalGetMixin, CachedResponseMixin, LikedByMeMixin, AsyncRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Post.objects.select_related('author')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def perform_update(self, serializer):
+        if 'image' not in serializer.validated_data:
+            serializer.save()
+            return
+        # A new image invalidates the old variants until they are rebuilt
+        post = serializer.save(image_variants={})
+        schedule_image_processing(post)
+
+    def perform_destroy(self, instance):
+        soft_delete_post(instance)
+
 
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all().order_by('-created_at')
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
     parser_classes = [MultiPartParser, FormParser]   
+    pagination_class = KeysetCursorPagination
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, PostSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'author__username']
     search_fields = ['title', 'content']
-    ordering_fields = ['created_at', 'title']
-    queryset = Post.objects.all().order_by('-created_at')
-    serializer_class = PostSerializer
-    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    # Keyset pagination needs a (created_at, id) order; only its direction can vary.
+    ordering_fields = ['created_at']
 
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'author__username']
-    search_fields = ['title', 'content']
-    ordering_fields = ['created_at', 'title']
+    def perform_destroy(self, instance):
+        soft_delete_post(instance)
 
 # Likes
 class LikePostAPIView(APIView):
@@ -66,32 +316,142 @@ class LikePostAPIView(APIView):
 
     def post(self, request, post_id):
         post = get_object_or_404(Post, id=post_id)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(user=request.user, post=post)
+            if created:
+                adjust_like_counts([post.pk], 1)
         if not created:
             return Response({'detail': 'Already liked'}, status=status.HTTP_400_BAD_REQUEST)
         return Response(LikeSerializer(like).data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, post_id):
-        post = get_object_or_404(Post, id=post_id)
-        like_qs = Like.objects.filter(user=request.user, post=post)
-        if like_qs.exists():
-            like_qs.delete()
+        # No existence check needed: a missing post simply has no like to remove
+        with transaction.atomic():
+            deleted, _ = Like.objects.filter(user=request.user, post_id=post_id).delete()
+            if deleted:
+                adjust_like_counts([post_id], -deleted)
+        if deleted:
             return Response({'detail': 'Unliked'}, status=status.HTTP_204_NO_CONTENT)
         return Response({'detail': 'Like not found'}, status=status.HTTP_404_NOT_FOUND)
 
+
+class BulkLikeAPIView(APIView):
+    """
+    GET `?ids=1,2,3` reports which of the posts the user has liked; POST
+    `{"like": [...], "unlike": [...]}` applies many toggles at once and
+    returns an outcome per post id.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    max_ids = 100
+
+    def get(self, request):
+        try:
+            ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value]
+        except ValueError:
+            return Response({'detail': 'ids must be a comma-separated list of integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.max_ids:
+            return Response({'detail': f'At most {self.max_ids} ids per request'}, status=status.HTTP_400_BAD_REQUEST)
+        liked = liked_post_ids(request.user, ids)
+        return Response({str(post_id): post_id in liked for post_id in ids})
+
+    def post(self, request):
+        serializer = BulkLikeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_likes(request.user, serializer.validated_data['like'], serializer.validated_data['unlike'])
+        return Response({str(post_id): outcome for post_id, outcome in results.items()})
+
+# Follows
+class FollowUserAPIView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, user_id):
+        followee = get_object_or_404(User, id=user_id)
+        if followee.pk == request.user.pk:
+            return Response({'detail': 'You cannot follow yourself'}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(follower=request.user, followee=followee)
+            if created:
+                User.objects.filter(pk=followee.pk).update(follower_count=F('follower_count') + 1)
+                backfill_timeline(request.user, followee)
+        if not created:
+            return Response({'detail': 'Already following'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': 'Followed'}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, user_id):
+        followee = get_object_or_404(User, id=user_id)
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=request.user, followee=followee).delete()
+            if deleted:
+                User.objects.filter(pk=followee.pk).update(follower_count=F('follower_count') - deleted)
+                remove_from_timeline(request.user, followee)
+        if deleted:
+            return Response({'detail': 'Unfollowed'}, status=status.HTTP_204_NO_CONTENT)
+        return Response({'detail': 'Not following'}, status=status.HTTP_404_NOT_FOUND)
+
+
+# Home timeline
+class HomeTimelineView(AsyncListMixin, generics.ListAPIView):
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimelinePagination
+
+    def get_queryset(self):
+        # Rows come from get_page(); the queryset only types the cursor.
+        return Post.objects.none()
+
+    def get_page(self, cursor, limit):
+        return home_timeline(self.request.user, limit, cursor)
+
 # Comments
-class CommentListCreateAPIView(generics.ListCreateAPIView):
+class CommentListCreateAPIView(ConditionalGetMixin, EncodedListMixin, AsyncListMixin, generics.ListCreateAPIView):
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetCursorPagination
 
     def get_queryset(self):
-        return Comment.objects.filter(post_id=self.kwargs['post_id'])
+        return Comment.objects.filter(
+            post_id=self.kwargs['post_id'], post__deleted_at__isnull=True, user__deleted_at__isnull=True,
+        ).select_related('user')
+
+    def get_validator_scope(self):
+        return 'comments', self.kwargs['post_id']
 
     def perform_create(self, serializer):
-        serializer.save(
-            post_id=self.kwargs['post_id'],
-            user=self.request.user  
-        )
+        post = get_object_or_404(Post, id=self.kwargs['post_id'])
+        with transaction.atomic():
+            comment = serializer.save(post=post, user=self.request.user)
+            Post.objects.filter(pk=post.pk).update(comment_count=F('comment_count') + 1)
+            if comment.root_id:
+                Comment.objects.filter(pk=comment.root_id).update(reply_count=F('reply_count') + 1)
+
+
+class CommentThreadListAPIView(TimedListMixin, generics.ListAPIView):
+    """
+    Top-level comments of a post, paginated by thread, each with its reply
+    tree down to `?depth=` levels (default 3).
+    """
+    serializer_class = CommentThreadSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetCursorPagination
+    default_depth = 3
+    max_depth = 10
+
+    def get_queryset(self):
+        return Comment.objects.filter(
+            post_id=self.kwargs['post_id'], post__deleted_at__isnull=True, user__deleted_at__isnull=True,
+            parent__isnull=True,
+        ).select_related('user')
+
+    def get_depth(self):
+        try:
+            depth = int(self.request.query_params.get('depth', self.default_depth))
+        except ValueError:
+            depth = self.default_depth
+        return max(0, min(depth, self.max_depth))
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        return attach_comment_threads(page, self.get_depth())
 
 
 class CommentDeleteAPIView(generics.DestroyAPIView):
@@ -99,28 +459,80 @@ class CommentDeleteAPIView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        # ensures only the user's own comment AND matches post_id
-        return Comment.objects.filter(
-            user=self.request.user,
-            post_id=self.kwargs['post_id']
-        )
+        # ensures only the user's own comment can be deleted
+        return Comment.objects.filter(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            # Replies cascade, so decrement by every comment actually removed.
+            _, deleted = instance.delete()
+            removed = deleted.get(Comment._meta.label, 0)
+            Post.objects.filter(pk=instance.post_id).update(
+                comment_count=F('comment_count') - removed
+            )
+            if instance.root_id:
+                Comment.objects.filter(pk=instance.root_id).update(
+                    reply_count=F('reply_count') - removed
+                )
 
 # Posts with Stats
-class PostListWithStatsAPIView(generics.ListAPIView):
+class PostListWithStatsAPIView(ConditionalGetMixin, CachedResponseMixin, EncodedListMixin, LikedByMeMixin, AsyncListMixin, generics.ListAPIView):
+    queryset = Post.objects.select_related('author')
     serializer_class = PostWithStatsSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetCursorPagination
+    cache_feed = FEED_STATS
 
     def get_queryset(self):
-        # Prefetch only latest 3 comments globally (not per post)
-        recent_comments_qs = Comment.objects.order_by('-created_at')[:3]
-        return (
-            Post.objects
-            .all()
-            .prefetch_related(
-                Prefetch('comments', queryset=recent_comments_qs, to_attr='recent_comments')
-            )
-            .select_related('author')
-        )
+        queryset = super().get_queryset()
+        if 'recent_comments' not in self.get_serializer_fields():
+            return queryset
+        # Latest 3 comments per post, fetched in one windowed query
+        return queryset.prefetch_related(latest_comments_prefetch(limit=3))
+
+    def get_encoder_overrides(self, serializer):
+        if 'recent_comments' not in serializer.fields:
+            return {}
+        encode_comment = compile_encoder(CommentPreviewSerializer())
+        return {'recent_comments': lambda post: [encode_comment(comment) for comment in post.recent_comments]}
+
+class RequestMetricsView(APIView):
+    """
+    GET the per-route latency histograms from RequestMetricsMiddleware;
+    DELETE clears them. Admins only.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_histograms())
+
+    def delete(self, request):
+        reset_histograms()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class ExportView(APIView):
+    """
+    Stream every post, comment or like as NDJSON or CSV (see
+    services/export.py), gzipped when the client accepts it; admins only.
+    `?author=` (user id), `?since=` and `?until=` narrow the rows down.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, kind, fmt):
+        if kind not in EXPORTS or fmt not in FORMATS:
+            raise Http404
+        params = ExportFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        compress = bool(re_accepts_gzip.search(request.headers.get('Accept-Encoding', '')))
+        export = Export(kind, fmt, compress=compress, **params.validated_data)
+        # Django would buffer a sync iterator under ASGI, and an async one under WSGI.
+        content = export.__aiter__() if settings.SERVER_INTERFACE == 'asgi' else iter(export)
+        response = StreamingHttpResponse(content, content_type=export.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        return response
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
@@ -130,4 +542,57 @@ def get_title_suggestions(request):
         return Response({"error": "Content is required"}, status=400)
 
     titles = suggest_titles(content)
-    return Response({"suggestions": titles})
\ No newline at end of file
+    return Response({"suggestions": titles})
+
+
+# Queued AI suggestions
+class TitleSuggestionJobCreateView(generics.CreateAPIView):
+    serializer_class = TitleSuggestionJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job, created = enqueue_title_job(
+            serializer.validated_data['content'],
+            user=request.user,
+            callback_url=serializer.validated_data.get('callback_url', ''),
+        )
+        response_status = status.HTTP_202_ACCEPTED if job.status != TitleSuggestionJob.Status.DONE else status.HTTP_200_OK
+        return Response(self.get_serializer(job).data, status=response_status)
+
+
+class TitleSuggestionJobDetailView(generics.RetrieveAPIView):
+    serializer_class = TitleSuggestionJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # only the user's own jobs; anyone else's id is a 404
+        return TitleSuggestionJob.objects.filter(requested_by=self.request.user)
+
+
+@csrf_exempt
+@require_POST
+async def get_title_suggestions_async(request):
+    """
+    Async twin of get_title_suggestions for ASGI deployments: the event loop
+    keeps serving other requests while Gemini responds.
+    """
+    try:
+        auth = await StatelessJWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed as exc:
+        detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+        return JsonResponse(detail, status=401)
+    if auth is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        data = request.POST
+    content = data.get("content", "") if isinstance(data, dict) else ""
+    if not content:
+        return JsonResponse({"error": "Content is required"}, status=400)
+
+    titles = await asuggest_titles(content)
+    return JsonResponse({"suggestions": titles})